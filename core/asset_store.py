@@ -0,0 +1,96 @@
+import os
+import hashlib
+
+# Extensões aceitas no armazenamento; outras são gravadas sem extensão
+ASSET_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.svg')
+
+
+def asset_digest(data):
+    """Identificador de conteúdo usado pelo armazenamento e pelo envio (SHA-256 em hexadecimal)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssetStore:
+    """
+    Armazenamento de imagens endereçado por conteúdo: cada arquivo fica em
+    <raiz>/<2 primeiros dígitos>/<sha256><extensão>. A mesma imagem usada em
+    vários projetos (o logotipo, por exemplo) é guardada uma única vez.
+    """
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @property
+    def root(self):
+        if self._root is None:
+            from core.config_manager import ConfigManager
+            self._root = os.path.join(ConfigManager().config_dir, 'assets')
+        return self._root
+
+    def path_for(self, digest, extension=''):
+        return os.path.join(self.root, digest[:2], digest + extension.lower())
+
+    def put(self, data, extension=''):
+        """Guarda o conteúdo (se ainda não existir). Retorna (digest, caminho)."""
+        digest = asset_digest(data)
+        extension = extension.lower() if extension.lower() in ASSET_EXTENSIONS else ''
+        path = self.path_for(digest, extension)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            partial = f'{path}.{os.getpid()}.tmp'
+            with open(partial, 'wb') as f:
+                f.write(data)
+            os.replace(partial, path)
+        return digest, path
+
+    def import_file(self, file_path):
+        """Copia um arquivo para o armazenamento. Retorna (digest, caminho armazenado)."""
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        return self.put(data, os.path.splitext(file_path)[1])
+
+
+class AssetIndex:
+    """
+    Índice em disco de um cache derivado (imagem otimizada, imagem personalizada):
+    cada chave aponta para um texto curto, em geral "<digest><extensão>" do
+    resultado guardado no AssetStore. O conteúdo fica uma vez só no armazenamento.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='ascii') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def put(self, key, entry):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Outro envio pode ler o índice ao mesmo tempo: nunca expõe um arquivo pela metade
+        partial = f'{path}.{os.getpid()}.tmp'
+        with open(partial, 'w', encoding='ascii') as f:
+            f.write(entry)
+        os.replace(partial, path)
+
+
+def split_entry(entry):
+    """Separa "<digest><extensão>" de uma entrada do índice."""
+    return entry[:64], entry[64:]
+
+
+_default_store = None
+
+
+def default_asset_store():
+    """Armazenamento compartilhado, na pasta de configuração."""
+    global _default_store
+    if _default_store is None:
+        _default_store = AssetStore()
+    return _default_store
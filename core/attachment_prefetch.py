@@ -0,0 +1,64 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AttachmentPrefetcher:
+    """
+    Lê e codifica os anexos individuais dos próximos destinatários em threads de
+    segundo plano enquanto as mensagens atuais estão sendo enviadas.
+
+    A janela de antecipação (lookahead) é limitada, então a memória ocupada por
+    anexos já codificados não cresce com o tamanho da lista.
+    Iterar produz (destinatário, partes MIME, erro ou None), na ordem original.
+    """
+
+    def __init__(self, recipients, attachments_by_recipient, build_part, max_workers=4, lookahead=16):
+        self._recipients = recipients
+        self._attachments = attachments_by_recipient or {}
+        self._build_part = build_part
+        self._max_workers = max_workers
+        self._lookahead = max(1, lookahead)
+
+    def _paths_for(self, recipient):
+        paths = self._attachments.get(recipient.strip().lower(), [])
+        return [paths] if isinstance(paths, str) else list(paths)
+
+    def _load(self, recipient):
+        # Executado nas threads de segundo plano
+        parts = []
+        for path in self._paths_for(recipient):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Anexo não encontrado: {path}")
+            parts.append(self._build_part(path))
+        return parts
+
+    def __iter__(self):
+        recipients = iter(self._recipients)
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='attachment-prefetch')
+
+        def fill():
+            while len(pending) < self._lookahead:
+                recipient = next(recipients, None)
+                if recipient is None:
+                    return
+                if recipient.strip() and self._paths_for(recipient):
+                    pending.append((recipient, executor.submit(self._load, recipient)))
+                else:
+                    pending.append((recipient, None))
+
+        try:
+            fill()
+            while pending:
+                recipient, future = pending.popleft()
+                fill()
+                if future is None:
+                    yield recipient, [], None
+                    continue
+                try:
+                    yield recipient, future.result(), None
+                except Exception as e:
+                    yield recipient, [], str(e)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -5,6 +5,27 @@ import base64
 from cryptography.fernet import Fernet
 from core.resource_path import get_resource_path
 
+
+def write_private_file(path, text):
+    """
+    Grava um segredo (token, chave) legível só pelo usuário: o arquivo já nasce
+    com permissão 0600, em vez de ser criado com a umask e restringido depois.
+    """
+    partial = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # Substitui de uma vez: um arquivo antigo com outras permissões não é reaproveitado
+        os.replace(partial, path)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+
+
 class ConfigManager:
     def __init__(self):
         # Determinar o diretório base para armazenar configurações
@@ -19,6 +40,7 @@ class ConfigManager:
         self.config_dir = self.app_data_dir
         self.config_file = os.path.join(self.config_dir, 'email_config.json')
         self.key_file = os.path.join(self.config_dir, 'key.bin')
+        self.settings_file = os.path.join(self.config_dir, 'settings.json')
         
         # Garantir que o diretório de configuração existe
         try:
@@ -32,6 +54,7 @@ class ConfigManager:
             self.config_dir = self.app_data_dir
             self.config_file = os.path.join(self.config_dir, 'email_config.json')
             self.key_file = os.path.join(self.config_dir, 'key.bin')
+            self.settings_file = os.path.join(self.config_dir, 'settings.json')
             if not os.path.exists(self.config_dir):
                 os.makedirs(self.config_dir)
         
@@ -102,6 +125,29 @@ class ConfigManager:
                 'password': ""
             }
     
+    def load_settings(self):
+        """Carrega as preferências gerais do aplicativo (não sensíveis)"""
+        if not os.path.exists(self.settings_file):
+            return {}
+        try:
+            with open(self.settings_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Erro ao carregar preferências: {e}")
+            return {}
+    
+    def save_settings(self, **settings):
+        """Atualiza as preferências gerais informadas, mantendo as demais"""
+        current = self.load_settings()
+        current.update(settings)
+        with open(self.settings_file, 'w') as f:
+            json.dump(current, f)
+        return True
+    
+    def get_suppression_dir(self):
+        """Diretório da lista local de supressão"""
+        return os.path.join(self.config_dir, 'suppression')
+    
     def _update_env_file(self, email, password):
         """Atualiza o arquivo .env com as novas configurações"""
         env_path = os.path.join(self.app_data_dir, '.env')
@@ -0,0 +1,178 @@
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+
+from core.html_compiler import etree, parse_fragment, serialize_fragment, remove_keep_tail, warn_without_lxml
+
+# Pseudo-classes que dependem da interação do leitor: não podem ir para o atributo style
+_DYNAMIC_PSEUDO_CLASSES = frozenset(['hover', 'active', 'focus', 'focus-within', 'visited', 'link', 'target'])
+
+
+class _Stylesheet:
+    """Regras de um bloco <style> já compiladas: o que pode ser inlinado e o que deve ficar no bloco."""
+
+    def __init__(self, css):
+        import tinycss2
+        import cssselect2
+
+        self.matcher = cssselect2.Matcher()
+        self.declarations = []
+        residual = []
+        rules = tinycss2.parse_stylesheet(css, skip_whitespace=True, skip_comments=True)
+        for rule in rules:
+            # @media, @font-face etc. continuam no <style> para os clientes que os entendem
+            if rule.type != 'qualified-rule' or not self._inlinable(rule.prelude):
+                residual.append(tinycss2.serialize([rule]).strip())
+                continue
+            try:
+                selectors = cssselect2.compile_selector_list(rule.prelude)
+            except cssselect2.SelectorError as e:
+                print(f"Seletor CSS ignorado ({e}): {tinycss2.serialize(rule.prelude).strip()}")
+                residual.append(tinycss2.serialize([rule]).strip())
+                continue
+
+            declarations = _parse_declarations(rule.content)
+            kept = []
+            for selector in selectors:
+                # O seletor universal aplicaria a regra a todos os elementos; fica no bloco
+                if selector.pseudo_element is not None or selector.specificity == (0, 0, 0):
+                    kept.append(selector)
+                    continue
+                self.matcher.add_selector(selector, len(self.declarations))
+            if len(kept) < len(selectors):
+                self.declarations.append(declarations)
+            if kept:
+                residual.append(tinycss2.serialize([rule]).strip())
+        self.residual_css = '\n'.join(residual)
+
+    @staticmethod
+    def _inlinable(prelude):
+        tokens = [t for t in prelude if t.type != 'whitespace']
+        for previous, token in zip(tokens, tokens[1:]):
+            if previous == ':' and getattr(token, 'lower_value', None) in _DYNAMIC_PSEUDO_CLASSES:
+                return False
+        return True
+
+
+def _parse_declarations(content):
+    import tinycss2
+
+    declarations = []
+    for item in tinycss2.parse_blocks_contents(content, skip_whitespace=True, skip_comments=True):
+        if item.type == 'declaration':
+            declarations.append((item.lower_name, tinycss2.serialize(item.value).strip(), item.important))
+    return declarations
+
+
+@lru_cache(maxsize=32)
+def _compile_stylesheet(css):
+    return _Stylesheet(css)
+
+
+@lru_cache(maxsize=4096)
+def _parse_inline_style(style):
+    return tuple(_parse_declarations(style))
+
+
+def _cascade(rule_declarations, inline_style):
+    """
+    Combina as declarações das regras (já em ordem de especificidade) com o estilo inline,
+    seguindo a precedência do CSS: regra < inline < regra !important < inline !important.
+    """
+    normal, important = {}, {}
+    for declarations in rule_declarations:
+        for name, value, is_important in declarations:
+            (important if is_important else normal)[name] = value
+    inline_normal, inline_important = {}, {}
+    for name, value, is_important in _parse_inline_style(inline_style):
+        (inline_important if is_important else inline_normal)[name] = value
+
+    result = {}
+    for name, value in normal.items():
+        result[name] = value
+    for name, value in inline_normal.items():
+        result[name] = value
+    flagged = set()
+    for layer in (important, inline_important):
+        for name, value in layer.items():
+            result[name] = value
+            flagged.add(name)
+    return '; '.join(f"{name}: {value} !important" if name in flagged else f"{name}: {value}" for name, value in result.items())
+
+
+class CssInliner:
+    """
+    Move as regras dos blocos <style> para o atributo style de cada elemento.
+    Muitos clientes de email descartam o <style>; o que não pode ser inlinado
+    (pseudo-classes dinâmicas, @media, seletor universal) continua no bloco.
+
+    Os seletores de cada folha de estilo são compilados uma única vez e indexados
+    por tag/classe/atributo (cssselect2.Matcher), e a árvore é percorrida uma vez só.
+    O resultado é guardado por template, então reenviar ou visualizar o mesmo corpo
+    não repete o trabalho.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+
+    def inline(self, html):
+        if not html or '<style' not in html:
+            return html
+        if etree is None:
+            warn_without_lxml("a aplicação do CSS nos atributos style")
+            return html
+
+        key = hashlib.blake2b(html.encode('utf-8'), digest_size=16).digest()
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            return cached
+
+        try:
+            result = self._inline(html)
+        except ImportError as e:
+            print(f"Inliner de CSS indisponível, mantendo o bloco <style>: {e}")
+            return html
+
+        self._results[key] = result
+        if len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        return result
+
+    def _inline(self, html):
+        import cssselect2
+
+        body = parse_fragment(html)
+        style_elements = list(body.iter('style'))
+        sheets = [_compile_stylesheet(el.text or '') for el in style_elements]
+        for style_element, sheet in zip(style_elements, sheets):
+            if sheet.residual_css:
+                style_element.text = sheet.residual_css
+            else:
+                remove_keep_tail(style_element)
+
+        root = cssselect2.ElementWrapper.from_html_root(body)
+        for wrapper in root.iter_subtree():
+            element = wrapper.etree_element
+            if element is body:
+                continue
+            rule_declarations = []
+            for sheet in sheets:
+                matches = sheet.matcher.match(wrapper)
+                if matches:
+                    matches.sort(key=lambda m: (m[0], m[1]))
+                    rule_declarations.extend(sheet.declarations[m[3]] for m in matches)
+            if rule_declarations:
+                style = _cascade(rule_declarations, element.get('style', ''))
+                if style:
+                    element.set('style', style)
+        return serialize_fragment(body)
+
+
+_default_inliner = CssInliner()
+
+
+def inline_css(html):
+    """Inlina os blocos <style> do HTML usando o cache compartilhado."""
+    return _default_inliner.inline(html)
@@ -0,0 +1,101 @@
+import json
+import urllib.error
+import urllib.request
+
+from core.sender_daemon import state_file_path, TOKEN_HEADER, FINISHED_STATUSES
+
+# O serviço responde assim que valida a campanha, mas ler uma planilha grande ou
+# montar um projeto ainda acontece na requisição
+SUBMIT_TIMEOUT = 120
+
+
+class DaemonError(Exception):
+    """Erro de comunicação com o serviço de envio."""
+
+
+class DaemonClient:
+    """Cliente da API local do serviço de envio (usado pelo aplicativo e pelo CLI)."""
+
+    def __init__(self, url, token, timeout=10):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    @classmethod
+    def from_config_dir(cls, config_dir, timeout=10):
+        """Lê o endereço e o token gravados pelo serviço. Retorna None se ele não estiver rodando."""
+        try:
+            with open(state_file_path(config_dir), 'r') as f:
+                state = json.load(f)
+            return cls(state['url'], state['token'], timeout)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _request(self, method, path, payload=None, timeout=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method)
+        request.add_header(TOKEN_HEADER, self.token)
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode('utf-8')).get('error', str(e))
+            except ValueError:
+                message = str(e)
+            raise DaemonError(message) from e
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise DaemonError(f"Serviço de envio indisponível: {e}") from e
+
+    def health(self, timeout=None):
+        return self._request('GET', '/health', timeout=timeout)
+
+    def is_running(self, timeout=0.5):
+        try:
+            self.health(timeout)
+            return True
+        except DaemonError:
+            return False
+
+    def submit(self, payload):
+        """
+        Envia uma campanha para a fila. Retorna o estado inicial (com o id), em geral
+        'preparing': as imagens e os links são preparados depois, pelo serviço.
+        """
+        return self._request('POST', '/jobs', payload, timeout=max(self.timeout, SUBMIT_TIMEOUT))
+
+    def jobs(self):
+        return self._request('GET', '/jobs')
+
+    def job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def events(self, job_id, since=0, wait=0):
+        """Retorna (estado da campanha, eventos após `since`), aguardando até `wait` segundos."""
+        result = self._request('GET', f'/jobs/{job_id}/events?since={since}&wait={wait}',
+                               timeout=self.timeout + wait)
+        return result['job'], result['events']
+
+    def cancel(self, job_id):
+        return self._request('DELETE', f'/jobs/{job_id}')
+
+    def follow(self, job_id, wait=10):
+        """Itera sobre os eventos da campanha até ela terminar."""
+        since = 0
+        while True:
+            job, events = self.events(job_id, since, wait)
+            for event in events:
+                since = event['seq']
+                yield event
+            if job['status'] in FINISHED_STATUSES and not events:
+                return
+
+
+def find_daemon(config_dir, timeout=0.5):
+    """Retorna um cliente se o serviço de envio estiver rodando, senão None."""
+    client = DaemonClient.from_config_dir(config_dir)
+    if client is not None and client.is_running(timeout):
+        return client
+    return None
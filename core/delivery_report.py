@@ -0,0 +1,194 @@
+import os
+import csv
+import threading
+from datetime import datetime
+
+STATUS_COLUMNS = ['Status Envio', 'Data Envio', 'Resposta SMTP', 'Message-ID']
+_LOG_FIELDS = ['email', 'status', 'timestamp', 'response', 'message_id', 'tracking_id']
+
+
+class DeliveryLog:
+    """
+    Registro dos resultados de uma campanha, gravado em CSV à medida que os envios
+    acontecem (memória constante). Pode ser passado diretamente como `on_result`.
+
+    `tracking_ids` ({email em minúsculas: id}, ver Tracker.recipient_ids) preenche a
+    coluna tracking_id: é por ela que cliques e descadastros chegam ao endereço.
+    """
+
+    def __init__(self, path, tracking_ids=None):
+        self.path = path
+        self.tracking_ids = tracking_ids
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(_LOG_FIELDS)
+
+    def record(self, recipient, success, response='', message_id=None):
+        row = [
+            recipient.strip(),
+            'enviado' if success else 'falhou',
+            datetime.now().isoformat(timespec='seconds'),
+            str(response),
+            message_id or '',
+            self.tracking_ids.get(recipient.strip().lower(), '') if self.tracking_ids else '',
+        ]
+        with self._lock:
+            self._writer.writerow(row)
+
+    __call__ = record
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def load_delivery_results(log_path):
+    """Carrega o log em um dicionário {email normalizado: (status, data, resposta, message-id)}."""
+    results = {}
+    with open(log_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            # O último resultado de um endereço prevalece (ex.: reenvio)
+            results[row['email'].strip().lower()] = (
+                row['status'], row['timestamp'], row['response'], row['message_id']
+            )
+    return results
+
+
+def _annotated_rows(source_path, results, column_name):
+    """
+    Percorre a planilha original em modo somente leitura (streaming) e produz
+    o cabeçalho e cada linha com as colunas de status acrescentadas.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = list(next(rows, None) or [])
+        if column_name not in header:
+            raise ValueError(f"Coluna '{column_name}' não encontrada na planilha.")
+        email_idx = header.index(column_name)
+        # Colunas com dados mas sem título também entram (ficam sem nome no cabeçalho)
+        width = max(len(header), sheet.max_column or 0)
+        header.extend([None] * (width - len(header)))
+        yield header + STATUS_COLUMNS
+
+        empty = ('', '', '', '')
+        for line, row in enumerate(rows, start=2):
+            row = list(row)
+            if len(row) < width:
+                row.extend([None] * (width - len(row)))
+            elif len(row) > width:
+                if any(v is not None for v in row[width:]):
+                    # As colunas de status ficariam desalinhadas
+                    raise ValueError(f"A linha {line} tem mais colunas que o cabeçalho da planilha.")
+                del row[width:]
+            email = row[email_idx] if email_idx < len(row) else None
+            status = results.get(str(email).strip().lower(), empty) if email is not None else empty
+            yield row + list(status)
+    finally:
+        workbook.close()
+
+
+def export_delivery_status(source_path, log_path, output_path, column_name='Email'):
+    """
+    Grava a planilha original com as colunas de status de entrega.
+    O formato é escolhido pela extensão de output_path: .xlsx (openpyxl em modo
+    write-only), .csv ou .parquet (requer pyarrow). Tudo é feito em streaming,
+    sem carregar a planilha inteira na memória.
+    Retorna (sucesso, mensagem).
+    """
+    try:
+        results = load_delivery_results(log_path)
+        rows = _annotated_rows(source_path, results, column_name)
+        ext = os.path.splitext(output_path)[1].lower()
+
+        if ext == '.csv':
+            count = _write_csv(rows, output_path)
+        elif ext == '.parquet':
+            count = _write_parquet(rows, output_path)
+        else:
+            count = _write_xlsx(rows, output_path)
+        return True, f"Status de {count} linhas salvo em {output_path}."
+    except ImportError as e:
+        return False, f"Formato indisponível: {e}"
+    except Exception as e:
+        return False, f"Erro ao exportar o status de entrega: {e}"
+
+
+def _write_xlsx(rows, output_path):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Status')
+    count = -1
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(output_path)
+    return count
+
+
+def _write_csv(rows, output_path):
+    count = -1
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        for row in rows:
+            writer.writerow(['' if v is None else v for v in row])
+            count += 1
+    return count
+
+
+def _unique_column_names(header):
+    """
+    Nomes de coluna únicos e não vazios, como exigem o Parquet e o pyarrow:
+    ['Email', 'Email', None] vira ['Email', 'Email_2', 'coluna_3'].
+    """
+    names, seen = [], set()
+    for i, value in enumerate(header, start=1):
+        base = str(value).strip() if value is not None else ''
+        base = base or f'coluna_{i}'
+        name, suffix = base, 2
+        while name in seen:
+            name, suffix = f'{base}_{suffix}', suffix + 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _write_parquet(rows, output_path, batch_size=50000):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    header = _unique_column_names(next(rows))
+    width = len(header)
+    schema = pa.schema([(name, pa.string()) for name in header])
+
+    def write(writer, columns):
+        # Montado por coluna: nenhuma célula depende do nome da coluna
+        writer.write_table(pa.Table.from_arrays([pa.array(c, pa.string()) for c in columns], schema=schema))
+
+    count = 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        columns = [[] for _ in range(width)]
+        pending = 0
+        for row in rows:
+            if len(row) > width:
+                raise ValueError(f"Linha {count + pending + 2} com mais colunas que o cabeçalho.")
+            for i, column in enumerate(columns):
+                value = row[i] if i < len(row) else None
+                column.append('' if value is None else str(value))
+            pending += 1
+            if pending >= batch_size:
+                write(writer, columns)
+                count += pending
+                columns = [[] for _ in range(width)]
+                pending = 0
+        if pending:
+            write(writer, columns)
+            count += pending
+    return count
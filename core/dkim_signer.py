@@ -0,0 +1,180 @@
+import io
+import re
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from email.generator import BytesGenerator
+
+# Cabeçalhos assinados, quando presentes na mensagem (From é obrigatório)
+SIGNED_HEADERS = ('From', 'To', 'Subject', 'Date', 'Message-ID', 'MIME-Version', 'Content-Type',
+                  'List-Unsubscribe', 'List-Unsubscribe-Post')
+MAX_CACHED_BODIES = 32
+_SIGNATURE_LINE = 72
+
+_WSP = re.compile(rb'[ \t]+')
+_HEADER_WSP = re.compile(r'[ \t]+')
+_CRLF = b'\r\n'
+
+
+def canonicalize_body(body):
+    """Canonicalização relaxed do corpo (RFC 6376, 3.4.4). O corpo precisa usar CRLF."""
+    body = _WSP.sub(b' ', body).replace(b' \r\n', _CRLF).rstrip(b' \t\r\n')
+    return body + _CRLF if body else body
+
+
+def _canonicalize_header(name, value):
+    # Relaxed (RFC 6376, 3.4.2): nome em minúsculas, valor desdobrado e com espaços colapsados
+    value = _HEADER_WSP.sub(' ', value.replace('\r\n', '')).strip()
+    return f'{name.strip().lower()}:{value}'
+
+
+def _parse_headers(header_block):
+    """[(nome, valor bruto)] na ordem da mensagem, com as linhas de continuação juntadas."""
+    headers = []
+    for line in header_block.decode('utf-8', 'surrogateescape').split('\r\n'):
+        if line[:1] in (' ', '\t') and headers:
+            headers[-1][1] += '\r\n' + line
+        elif ':' in line:
+            name, value = line.split(':', 1)
+            headers.append([name, value])
+    return headers
+
+
+def message_bytes(msg):
+    """Serializa a mensagem como o smtplib faria no send_message (linhas com CRLF)."""
+    with io.BytesIO() as buffer:
+        BytesGenerator(buffer).flatten(msg, linesep='\r\n')
+        return buffer.getvalue()
+
+
+class DkimSigner:
+    """
+    Assinatura DKIM (RFC 6376, c=relaxed/relaxed) com rsa-sha256 ou
+    ed25519-sha256 (RFC 8463), conforme a chave.
+
+    A chave privada é carregada uma vez e fica em memória. Quando várias mensagens
+    têm o mesmo corpo, quem chama informa `body_key` e o hash do corpo (bh=) é
+    calculado na primeira e reaproveitado: por mensagem resta canonicalizar os
+    cabeçalhos e assinar.
+
+    O objeto pode ser enviado a processos de um pool: na serialização vai só a
+    chave em PEM, carregada uma vez por processo (ver _restore_signer).
+    """
+
+    def __init__(self, domain, selector, private_key_pem, headers=SIGNED_HEADERS):
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key
+        from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
+
+        if not domain or not selector:
+            raise ValueError("Informe o domínio e o seletor DKIM.")
+        try:
+            self._key = load_pem_private_key(private_key_pem, password=None)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Chave DKIM inválida: {e}")
+        if isinstance(self._key, rsa.RSAPrivateKey):
+            self.algorithm = 'rsa-sha256'
+        elif isinstance(self._key, ed25519.Ed25519PrivateKey):
+            self.algorithm = 'ed25519-sha256'
+        else:
+            raise ValueError("A chave DKIM precisa ser RSA ou Ed25519.")
+        self.domain = domain
+        self.selector = selector
+        self.headers = tuple(headers)
+        self._pem = private_key_pem
+        self._body_hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        return _restore_signer, (self.domain, self.selector, self._pem, self.headers)
+
+    def body_hash(self, body, body_key=None):
+        if body_key is not None:
+            with self._lock:
+                cached = self._body_hashes.get(body_key)
+            if cached is not None:
+                return cached
+        digest = base64.b64encode(hashlib.sha256(canonicalize_body(body)).digest()).decode('ascii')
+        if body_key is not None:
+            with self._lock:
+                self._body_hashes[body_key] = digest
+                while len(self._body_hashes) > MAX_CACHED_BODIES:
+                    self._body_hashes.popitem(last=False)
+        return digest
+
+    def sign(self, data, body_key=None):
+        """
+        Assina a mensagem já serializada (bytes com CRLF) e retorna os bytes com o
+        cabeçalho DKIM-Signature no início. `body_key` identifica um corpo repetido
+        em várias mensagens (o chamador garante que o corpo é idêntico).
+        """
+        split = data.find(b'\r\n\r\n')
+        if split < 0:
+            header_block, body = data, b''
+        else:
+            header_block, body = data[:split], data[split + 4:]
+
+        # Em cabeçalhos repetidos vale a última ocorrência (RFC 6376, 5.4.2)
+        present = {}
+        for name, value in _parse_headers(header_block):
+            present[name.strip().lower()] = (name, value)
+        signed = [present[name.lower()] for name in self.headers if name.lower() in present]
+        if not any(name.strip().lower() == 'from' for name, _ in signed):
+            raise ValueError("A mensagem não tem o cabeçalho From, obrigatório para o DKIM.")
+
+        tags = [
+            'v=1', f'a={self.algorithm}', 'c=relaxed/relaxed', f'd={self.domain}', f's={self.selector}',
+            f't={int(time.time())}', 'h=' + ':'.join(name.strip() for name, _ in signed),
+            f'bh={self.body_hash(body, body_key)}',
+        ]
+        # Quebrar a linha no lugar do espaço após ";" não muda a forma canonicalizada
+        unsigned = ';\r\n\t'.join(tags) + ';\r\n\tb='
+        canonical = ''.join(_canonicalize_header(name, value) + '\r\n' for name, value in signed)
+        canonical += _canonicalize_header('DKIM-Signature', unsigned)
+        signature = base64.b64encode(self._sign(canonical.encode('utf-8', 'surrogateescape'))).decode('ascii')
+
+        # Espaços dentro de b= são ignorados na verificação
+        folded = '\r\n\t '.join(signature[i:i + _SIGNATURE_LINE] for i in range(0, len(signature), _SIGNATURE_LINE))
+        return f'DKIM-Signature: {unsigned}{folded}\r\n'.encode('ascii') + data
+
+    def sign_message(self, msg, body_key=None):
+        return self.sign(message_bytes(msg), body_key)
+
+    def _sign(self, data):
+        if self.algorithm == 'ed25519-sha256':
+            # RFC 8463: o Ed25519 assina o hash SHA-256 dos dados canonicalizados
+            return self._key.sign(hashlib.sha256(data).digest())
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        return self._key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+
+# Assinadores já carregados neste processo, por domínio, seletor e chave
+_signers = {}
+_signers_lock = threading.Lock()
+
+
+def _restore_signer(domain, selector, private_key_pem, headers=SIGNED_HEADERS):
+    key = (domain, selector, hashlib.sha256(private_key_pem).hexdigest(), tuple(headers))
+    with _signers_lock:
+        signer = _signers.get(key)
+        if signer is None:
+            signer = _signers[key] = DkimSigner(domain, selector, private_key_pem, headers)
+    return signer
+
+
+def signer_for(smtp_config):
+    """
+    Assinador das opções dkim_domain, dkim_selector e dkim_key_file do smtp_config,
+    carregado uma vez por processo. None quando o DKIM não está configurado.
+    """
+    domain = smtp_config.get('dkim_domain')
+    selector = smtp_config.get('dkim_selector')
+    key_file = smtp_config.get('dkim_key_file')
+    if not (domain or selector or key_file):
+        return None
+    if not (domain and selector and key_file):
+        raise ValueError("Configuração DKIM incompleta: informe domínio, seletor e arquivo da chave.")
+    with open(key_file, 'rb') as f:
+        return _restore_signer(domain, selector, f.read())
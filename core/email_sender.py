@@ -1,23 +1,46 @@
 import smtplib
+import socket
 import os
 import base64
 import re
 import mimetypes
+import secrets
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from email.mime.application import MIMEApplication
+from email.utils import make_msgid
 from urllib.parse import urlparse, unquote
+from core.attachment_prefetch import AttachmentPrefetcher
+from core.metrics import metrics, STAGE_CONNECT, STAGE_LOGIN, STAGE_PROCESS_IMAGES, STAGE_ATTACHMENTS, STAGE_MIME_BUILD, STAGE_SEND
+from core.tracing import tracer, trace_smtp_commands
+from core.profiling import profiler
+from core.smtp_transcript import record_transcript, transcripts
+from core.image_optimizer import default_image_optimizer, mime_type_for
+from core.asset_store import asset_digest
+from core.dkim_signer import signer_for
 
-def process_images_in_html(html_body):
+def process_images_in_html(html_body, image_optimizer=None, remote_fetcher=None):
     """
     Processa imagens no HTML, convertendo URLs locais em imagens embutidas com CID.
+    As imagens são redimensionadas para a largura em que aparecem e regravadas
+    (ver core.image_optimizer); passe ImageOptimizer(enabled=False) para enviar os originais.
+    Com um RemoteAssetFetcher, as imagens http(s) são baixadas e embutidas quando
+    pequenas o bastante; as demais continuam como link.
     Retorna o HTML modificado e um dicionário de imagens para anexar.
     """
     images_to_attach = {}
     img_pattern = re.compile(r'<img[^>]+src=["\']([^"\'>]+)["\'][^>]*>', re.IGNORECASE)
-    
-    def replace_image_src(match):
+    optimizer = image_optimizer or default_image_optimizer()
+
+    # Primeiro lê todas as imagens locais, para otimizá-las em lote. Cada arquivo é lido
+    # uma vez e cada conteúdo (SHA-256) vira uma única parte MIME com um único CID,
+    # mesmo que apareça várias vezes no email ou em arquivos diferentes.
+    found = []
+    files = {}
+    assets = {}
+    remote_urls = []
+    for match in img_pattern.finditer(html_body):
         src = match.group(1)
         parsed_url = urlparse(src)
         
@@ -32,48 +55,230 @@ def process_images_in_html(html_body):
             else:
                 file_path = src
                 
-            # Verifica se o arquivo existe
-            if os.path.isfile(file_path):
+            # Se o arquivo não existe, mantém a URL original
+            if file_path not in files and os.path.isfile(file_path):
                 try:
-                    # Gera um ID único para a imagem
-                    img_id = f"img_{len(images_to_attach) + 1}"
-                    cid = f"<{img_id}>"
-                    
-                    # Lê o arquivo de imagem
                     with open(file_path, 'rb') as img_file:
                         img_data = img_file.read()
-                    
-                    # Determina o tipo MIME com base na extensão
-                    ext = os.path.splitext(file_path)[1].lower()
-                    mime_type = {
-                        '.jpg': 'image/jpeg',
-                        '.jpeg': 'image/jpeg',
-                        '.png': 'image/png',
-                        '.gif': 'image/gif',
-                        '.bmp': 'image/bmp'
-                    }.get(ext, 'application/octet-stream')
-                    
-                    # Armazena a imagem para anexar depois
-                    images_to_attach[img_id] = (img_data, mime_type)
-                    
-                    # Substitui o src pela referência CID
-                    return match.group(0).replace(src, f"cid:{img_id}")
+                    digest = asset_digest(img_data)
+                    files[file_path] = digest
+                    assets.setdefault(digest, [img_data, os.path.splitext(file_path)[1].lower(), 0])
                 except Exception as e:
                     print(f"Erro ao processar imagem {file_path}: {e}")
-                    return match.group(0)
-            else:
-                # Se o arquivo não existe, mantém a URL original
-                return match.group(0)
+            if file_path in files:
+                found.append((match, file_path))
+        elif parsed_url.scheme in ('http', 'https') and remote_fetcher is not None:
+            # Imagens remotas são baixadas uma vez, depois do laço e em paralelo
+            remote_urls.append(src)
+            found.append((match, src))
+
+    remote = set()
+    if remote_urls:
+        for url, result in remote_fetcher.fetch_many(remote_urls).items():
+            if result is not None:
+                digest = asset_digest(result[0])
+                files[url] = digest
+                remote.add(digest)
+                assets.setdefault(digest, [result[0], result[1], 0])
+
+    found = [(match, files[source]) for match, source in found if source in files]
+    for match, digest in found:
+        # Usada em larguras diferentes, a imagem é otimizada para a maior delas
+        assets[digest][2] = max(assets[digest][2], optimizer.target_width(match.group(0)))
+
+    optimized = optimizer.optimize_batch([
+        (img_data, ext, target_width, digest) for digest, (img_data, ext, target_width) in assets.items()
+    ])
+
+    for (digest, (img_data, ext, _)), result in zip(assets.items(), optimized):
+        # O ID vem do conteúdo: a mesma imagem tem o mesmo CID em qualquer campanha
+        img_id = f"img_{digest[:16]}"
+
+        if result is not None:
+            img_data, extension = result
+            mime_type = mime_type_for(extension)
         else:
-            # Se não for uma URL local, mantém a URL original
-            return match.group(0)
-    
-    # Substitui todas as ocorrências de imagens no HTML
-    modified_html = img_pattern.sub(replace_image_src, html_body)
+            # Determina o tipo MIME com base na extensão
+            mime_type = {
+                '.jpg': 'image/jpeg',
+                '.jpeg': 'image/jpeg',
+                '.png': 'image/png',
+                '.gif': 'image/gif',
+                '.bmp': 'image/bmp'
+            }.get(ext, 'application/octet-stream')
+
+        # Imagem remota grande demais (mesmo otimizada) continua como link
+        if digest in remote and not remote_fetcher.should_embed(len(img_data)):
+            continue
+
+        # Armazena a imagem para anexar depois
+        images_to_attach[img_id] = (img_data, mime_type)
+
+    # Substitui o src pela referência CID
+    replacements = {
+        match.start(): match.group(0).replace(match.group(1), f"cid:img_{digest[:16]}")
+        for match, digest in found if f"img_{digest[:16]}" in images_to_attach
+    }
+    modified_html = img_pattern.sub(lambda match: replacements.get(match.start(), match.group(0)), html_body)
     
     return modified_html, images_to_attach
 
-def send_email(smtp_config, recipients, subject, html_body, attachments=None):
+def create_attachment_part(attachment_path):
+    """Lê um arquivo e o codifica como parte MIME de anexo."""
+    # Determina o tipo MIME com base na extensão
+    content_type, encoding = mimetypes.guess_type(attachment_path)
+    if content_type is None or encoding is not None:
+        content_type = 'application/octet-stream'
+    maintype, subtype = content_type.split('/', 1)
+    
+    # Lê o arquivo
+    with open(attachment_path, 'rb') as f:
+        attachment_data = f.read()
+    
+    # Cria o anexo
+    if maintype == 'text':
+        attachment = MIMEText(attachment_data.decode('utf-8'), _subtype=subtype)
+    elif maintype == 'image':
+        attachment = MIMEImage(attachment_data, _subtype=subtype)
+    else:
+        attachment = MIMEApplication(attachment_data, _subtype=subtype)
+    
+    # Adiciona o cabeçalho com o nome do arquivo
+    filename = os.path.basename(attachment_path)
+    attachment.add_header('Content-Disposition', 'attachment', filename=filename)
+    return attachment
+
+def connect_smtp(smtp_config):
+    """Abre e autentica uma conexão SMTP: SSL primeiro, que é mais comum, com fallback para STARTTLS."""
+    connection = metrics.new_connection()
+    address = f"{smtp_config['host']}:{smtp_config['port']}"
+    with metrics.timer(STAGE_CONNECT, connection), tracer.span('connect', 'smtp'):
+        try:
+            server = smtplib.SMTP_SSL(smtp_config['host'], smtp_config['port'])
+            record_transcript(server, address)
+        except Exception as e:
+            # Se falhar, tenta com TLS
+            server = smtplib.SMTP(smtp_config['host'], smtp_config['port'])
+            record_transcript(server, address).note(f"SSL direto falhou ({e}); usando STARTTLS")
+            try:
+                server.starttls()
+            except Exception as e:
+                transcripts.dump(server, f"Falha no STARTTLS: {e}")
+                raise
+    server.metrics_connection = connection
+    trace_smtp_commands(server, connection)
+
+    # Sem isso o último registro TLS de cada mensagem fica retido até o ACK do servidor (algoritmo de Nagle)
+    try:
+        server.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except (OSError, AttributeError):
+        pass
+    with metrics.timer(STAGE_LOGIN, connection), tracer.span('login', 'smtp'):
+        try:
+            server.login(smtp_config['user'], smtp_config['password'])
+        except Exception as e:
+            transcripts.dump(server, f"Falha no login: {e}")
+            raise
+    return server
+
+def prepare_shared_parts(html_body, attachments=None, image_optimizer=None, remote_fetcher=None):
+    """
+    Lê e codifica uma única vez o que é comum a todas as mensagens da campanha.
+    Retorna (HTML com as imagens trocadas por CID, partes MIME das imagens inline e anexos comuns).
+    """
+    with metrics.timer(STAGE_PROCESS_IMAGES), tracer.span('process_images', 'render'):
+        modified_html, images_to_attach = process_images_in_html(html_body, image_optimizer, remote_fetcher)
+    shared_parts = []
+    for img_id, (img_data, mime_type) in images_to_attach.items():
+        img = MIMEImage(img_data, _subtype=mime_type.split('/')[1])
+        img.add_header('Content-ID', img_id)
+        img.add_header('Content-Disposition', 'inline')
+        shared_parts.append(img)
+
+    for attachment_path in attachments or []:
+        if os.path.isfile(attachment_path):
+            try:
+                with metrics.timer(STAGE_ATTACHMENTS), tracer.span('attachment', 'encode'):
+                    shared_parts.append(create_attachment_part(attachment_path))
+            except Exception as e:
+                print(f"Erro ao anexar arquivo {attachment_path}: {e}")
+    return modified_html, shared_parts
+
+def build_message(sender, recipient, subject, html, shared_parts, own_parts=(), headers=None):
+    """Monta a mensagem de um destinatário a partir das partes já codificadas."""
+    with metrics.timer(STAGE_MIME_BUILD, recipient=recipient), tracer.span('encode', 'encode'):
+        msg = MIMEMultipart('related')
+        msg['Subject'] = subject
+        msg['From'] = sender
+        msg['To'] = recipient
+        msg['Message-ID'] = make_msgid(domain=sender.rpartition('@')[2] or None)
+        for name, value in (headers or {}).items():
+            msg[name] = value
+
+        # Adiciona a parte HTML
+        html_part = MIMEText(html, 'html', 'utf-8')
+        msg.attach(html_part)
+
+        # Adiciona as imagens como anexos inline e os anexos
+        for part in shared_parts:
+            msg.attach(part)
+        for part in own_parts:
+            msg.attach(part)
+    return msg
+
+def deliver_message(server, msg, on_result=None, signer=None, body_key=None):
+    """
+    Envia uma mensagem já montada. Recusas do destinatário são informadas via
+    on_result e não interrompem a campanha; demais erros são propagados.
+    Com `signer` (DkimSigner), a mensagem é serializada uma vez, assinada e
+    enviada como bytes; `body_key` marca um corpo igual ao de outras mensagens.
+    Retorna True se o servidor aceitou a mensagem.
+    """
+    data = None
+    if signer is not None:
+        with tracer.span('dkim_sign', 'encode'):
+            data = signer.sign_message(msg, body_key)
+    try:
+        connection = getattr(server, 'metrics_connection', None)
+        with metrics.timer(STAGE_SEND, connection, msg['To']), tracer.span('send_message', 'smtp'):
+            if data is None:
+                server.send_message(msg)
+            else:
+                server.sendmail(msg['From'], [msg['To']], data)
+    except smtplib.SMTPRecipientsRefused as e:
+        code, reply = next(iter(e.recipients.values()))
+        if on_result:
+            on_result(msg['To'], False, f"{code} {reply.decode(errors='replace')}", msg['Message-ID'])
+        return False
+    except Exception as e:
+        transcripts.dump(server, f"Falha no envio para {msg['To']}: {e}")
+        raise
+    finally:
+        profiler.message_sent()
+    if on_result:
+        on_result(msg['To'], True, "250 OK", msg['Message-ID'])
+    return True
+
+# Pausas maiores que isto (fora da janela ou entre envios espaçados) fecham a conexão,
+# que é refeita depois: servidores SMTP costumam derrubar conexões ociosas em poucos minutos
+_IDLE_RECONNECT_SECONDS = 120
+
+def _wait_for_schedule(server, schedule, smtp_config):
+    delay = schedule.delay()
+    if delay > _IDLE_RECONNECT_SECONDS:
+        print(f"Envio pausado até {schedule.next_send_time().strftime('%d/%m/%Y %H:%M')}.")
+        try:
+            server.quit()
+        except Exception:
+            pass
+        schedule.wait()
+        return connect_smtp(smtp_config)
+    schedule.wait()
+    return server
+
+def send_email(smtp_config, recipients, subject, html_body, attachments=None, on_result=None,
+               recipient_attachments=None, schedule=None, image_optimizer=None, remote_fetcher=None,
+               personalizer=None, tracker=None):
     """
     Envia email para uma lista de destinatários.
     Parâmetros:
@@ -82,79 +287,85 @@ def send_email(smtp_config, recipients, subject, html_body, attachments=None):
         subject: Assunto do email
         html_body: Conteúdo HTML do email
         attachments: Lista de caminhos para arquivos a serem anexados
+        on_result: Função opcional chamada após cada destinatário com
+                   (destinatário, sucesso, resposta do servidor, Message-ID)
+        recipient_attachments: Dicionário opcional {email: caminho ou lista de caminhos}
+                   com anexos individuais, lidos antecipadamente em segundo plano
+        schedule: SendSchedule opcional (início, janela e espaçamento dos envios)
+        image_optimizer: ImageOptimizer opcional (padrão: otimiza com o cache da pasta de configuração)
+        remote_fetcher: RemoteAssetFetcher opcional para embutir as imagens remotas
+        personalizer: ImagePersonalizer opcional; as imagens de cada destinatário são
+                   renderizadas antes do primeiro envio e embutidas com CID
+        tracker: Tracker opcional (core.link_tracking) para rastrear cliques e aberturas
+                   e incluir o List-Unsubscribe
+    Com dkim_domain, dkim_selector e dkim_key_file no smtp_config, as mensagens são assinadas com DKIM.
     Retorna (sucesso, mensagem)
     """
     try:
-        # Tenta com SSL primeiro, que é mais comum
-        try:
-            server = smtplib.SMTP_SSL(smtp_config['host'], smtp_config['port'])
-        except Exception:
-            # Se falhar, tenta com TLS
-            server = smtplib.SMTP(smtp_config['host'], smtp_config['port'])
-            server.starttls()
-            
-        server.login(smtp_config['user'], smtp_config['password'])
+        signer = signer_for(smtp_config)
+        # Mensagens sem nada individual usam o mesmo separador MIME e têm o corpo
+        # idêntico: o hash DKIM do corpo é calculado uma vez
+        shared_boundary = '=_mf_' + secrets.token_hex(16)
+
+        # Imagens e anexos comuns são lidos e codificados uma única vez por campanha,
+        # antes de conectar: o servidor derruba conexões ociosas
+        modified_html, shared_parts = prepare_shared_parts(html_body, attachments, image_optimizer, remote_fetcher)
+        if personalizer is not None:
+            modified_html = personalizer.prepare_html(modified_html)
+            with tracer.span('personalize', 'render'):
+                personalizer.render_all(recipients)
+        tracked = tokens = None
+        if tracker is not None:
+            # Links localizados e tokens assinados uma vez; por mensagem só o join
+            with tracer.span('tracking', 'render'):
+                tracked = tracker.compile(modified_html)
+                tokens = tracker.tokens_for(recipients)
+
+        server = connect_smtp(smtp_config)
+
+        prefetcher = AttachmentPrefetcher(recipients, recipient_attachments, create_attachment_part)
 
         sent_count = 0
-        for recipient in recipients:
+        remaining = sum(1 for r in recipients if r.strip())
+        for recipient, own_parts, attachment_error in prefetcher:
             if not recipient.strip():
                 continue
-            
-            # Processa imagens no HTML
-            modified_html, images_to_attach = process_images_in_html(html_body)
-            
-            msg = MIMEMultipart('related')
-            msg['Subject'] = subject
-            msg['From'] = smtp_config['user']
-            msg['To'] = recipient.strip()
-
-            # Adiciona a parte HTML
-            html_part = MIMEText(modified_html, 'html', 'utf-8')
-            msg.attach(html_part)
-            
-            # Adiciona as imagens como anexos inline
-            for img_id, (img_data, mime_type) in images_to_attach.items():
-                img = MIMEImage(img_data, _subtype=mime_type.split('/')[1])
-                img.add_header('Content-ID', img_id)
-                img.add_header('Content-Disposition', 'inline')
-                msg.attach(img)
-            
-            # Adiciona os anexos
-            if attachments:
-                for attachment_path in attachments:
-                    if os.path.isfile(attachment_path):
-                        try:
-                            # Determina o tipo MIME com base na extensão
-                            content_type, encoding = mimetypes.guess_type(attachment_path)
-                            if content_type is None or encoding is not None:
-                                content_type = 'application/octet-stream'
-                            maintype, subtype = content_type.split('/', 1)
-                            
-                            # Lê o arquivo
-                            with open(attachment_path, 'rb') as f:
-                                attachment_data = f.read()
-                            
-                            # Cria o anexo
-                            if maintype == 'text':
-                                attachment = MIMEText(attachment_data.decode('utf-8'), _subtype=subtype)
-                            elif maintype == 'image':
-                                attachment = MIMEImage(attachment_data, _subtype=subtype)
-                            else:
-                                attachment = MIMEApplication(attachment_data, _subtype=subtype)
-                            
-                            # Adiciona o cabeçalho com o nome do arquivo
-                            filename = os.path.basename(attachment_path)
-                            attachment.add_header('Content-Disposition', 'attachment', filename=filename)
-                            msg.attach(attachment)
-                        except Exception as e:
-                            print(f"Erro ao anexar arquivo {attachment_path}: {e}")
-            
-            server.send_message(msg)
-            sent_count += 1
+            remaining -= 1
+            if schedule is not None:
+                server = _wait_for_schedule(server, schedule, smtp_config)
+                schedule.record_send(remaining)
+            if attachment_error:
+                # Sem o anexo individual a mensagem não deve ser enviada
+                print(f"Erro ao anexar arquivo para {recipient.strip()}: {attachment_error}")
+                if on_result:
+                    on_result(recipient.strip(), False, attachment_error, None)
+                continue
+
+            if personalizer is not None:
+                try:
+                    own_parts = personalizer.parts_for(recipient) + own_parts
+                except (LookupError, OSError) as e:
+                    # Sem a imagem do destinatário a mensagem não sai, mas a campanha continua
+                    print(f"Erro na imagem personalizada para {recipient.strip()}: {e}")
+                    if on_result:
+                        on_result(recipient.strip(), False, f"Erro na imagem personalizada: {e}", None)
+                    continue
+            html, headers = modified_html, None
+            if tracked is not None:
+                token = tokens[recipient.strip().lower()]
+                html, headers = tracked.render(token), tracker.headers(token)
+            msg = build_message(smtp_config['user'], recipient.strip(), subject, html, shared_parts, own_parts, headers)
+            body_key = None
+            if signer is not None and tracked is None and not own_parts:
+                msg.set_boundary(shared_boundary)
+                body_key = shared_boundary
+            # Recusa de um destinatário não interrompe o restante da lista
+            if deliver_message(server, msg, on_result, signer, body_key):
+                sent_count += 1
         
         server.quit()
         return True, f"{sent_count} de {len(recipients)} emails enviados com sucesso!"
     except smtplib.SMTPAuthenticationError:
         return False, "Falha na autenticação. Verifique seu usuário e senha."
     except Exception as e:
-        return False, f"Falha no envio: {e}"
\ No newline at end of file
+        return False, f"Falha no envio: {e}"
@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 
 def get_emails_from_excel(filepath, column_name='Email'):
@@ -10,4 +11,57 @@ def get_emails_from_excel(filepath, column_name='Email'):
         emails = df[column_name].dropna().astype(str).unique().tolist()
         return emails, f"{len(emails)} emails carregados com sucesso."
     except Exception as e:
-        return None, f"Erro ao ler o arquivo Excel: {e}"
\ No newline at end of file
+        return None, f"Erro ao ler o arquivo Excel: {e}"
+
+def get_recipients_from_excel(filepath, column_name='Email', attachment_column=None):
+    """
+    Lê os destinatários e, opcionalmente, uma coluna com o arquivo de anexo
+    individual de cada um. Caminhos relativos são resolvidos a partir da pasta da planilha.
+    Retorna (emails, anexos por email, mensagem).
+    """
+    try:
+        df = pd.read_excel(filepath, engine='openpyxl')
+        for col in (column_name, attachment_column):
+            if col and col not in df.columns:
+                available_cols = ", ".join(map(str, df.columns))
+                return None, None, f"Coluna '{col}' não encontrada. Colunas disponíveis: {available_cols}"
+
+        df = df.dropna(subset=[column_name])
+        df[column_name] = df[column_name].astype(str)
+        df = df.drop_duplicates(subset=[column_name])
+        emails = df[column_name].tolist()
+
+        attachments = {}
+        if attachment_column:
+            base_dir = os.path.dirname(os.path.abspath(filepath))
+            for email, path in zip(emails, df[attachment_column].tolist()):
+                if isinstance(path, str) and path.strip():
+                    path = path.strip()
+                    if not os.path.isabs(path):
+                        path = os.path.join(base_dir, path)
+                    attachments[email.strip().lower()] = path
+            return emails, attachments, f"{len(emails)} emails carregados com sucesso ({len(attachments)} com anexo individual)."
+        return emails, attachments, f"{len(emails)} emails carregados com sucesso."
+    except Exception as e:
+        return None, None, f"Erro ao ler o arquivo Excel: {e}"
+
+def get_rows_from_excel(filepath, column_name='Email'):
+    """
+    Lê todas as colunas de cada destinatário (primeira linha de cada email).
+    Retorna ({email em minúsculas: {coluna: valor em texto}}, mensagem).
+    """
+    try:
+        df = pd.read_excel(filepath, engine='openpyxl', dtype=str)
+        if column_name not in df.columns:
+            available_cols = ", ".join(map(str, df.columns))
+            return None, f"Coluna '{column_name}' não encontrada. Colunas disponíveis: {available_cols}"
+
+        df = df.dropna(subset=[column_name]).fillna('')
+        rows = {}
+        for row in df.to_dict('records'):
+            email = row[column_name].strip().lower()
+            if email and email not in rows:
+                rows[email] = {str(key): value.strip() for key, value in row.items()}
+        return rows, f"{len(rows)} linhas carregadas."
+    except Exception as e:
+        return None, f"Erro ao ler o arquivo Excel: {e}"
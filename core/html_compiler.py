@@ -0,0 +1,616 @@
+import re
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+
+from core.tracing import tracer
+
+# O lxml (libxml2) é bem mais rápido que o BeautifulSoup com o parser puro-Python.
+# Quando não estiver instalado, usamos o BeautifulSoup como antes.
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+_warned_without_lxml = set()
+
+
+def warn_without_lxml(feature):
+    """Avisa (uma vez por recurso) que algo foi pulado por falta do lxml."""
+    if feature not in _warned_without_lxml:
+        _warned_without_lxml.add(feature)
+        print(f"Aviso: lxml não instalado; pulando {feature}. Instale com 'pip install lxml'.")
+
+COLUMN_TYPES = ('two-columns', 'three-columns')
+EDITOR_CLASSES = frozenset([
+    'editable-component', 'selected', 'drop-column', 'column', 'row',
+    'placeholder-text', 'drag-over', 'text-content'
+])
+COPIED_STYLES = ['background-color', 'font-family', 'font-size', 'color', 'height', 'width']
+RADIUS_STYLES = [
+    'border-radius',
+    'border-top-left-radius',
+    'border-top-right-radius',
+    'border-bottom-left-radius',
+    'border-bottom-right-radius'
+]
+LAYOUT_TABLE_ATTRS = {'role': "presentation", 'border': "0", 'cellpadding': "0", 'cellspacing': "0", 'width': "100%"}
+
+# Estilos usados apenas pelo editor (layout flex, bordas tracejadas das colunas)
+_EDITOR_STYLE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'min-height:[^;]+;?',
+    r'display:\s*flex;?',
+    r'justify-content:[^;]+;?',
+    r'align-items:[^;]+;?',
+    r'flex-direction:[^;]+;?',
+    r'border-style:\s*dashed;?'
+]]
+_EDITOR_STYLE_HINT = re.compile(r'min-height|display|justify-content|align-items|flex-direction|border-style', re.IGNORECASE)
+_GAP_PATTERN = re.compile(r'gap:\s*(\d+)px')
+# Documentos completos (com <html>/<body>) seguem pelo caminho do BeautifulSoup
+_DOCUMENT_PATTERN = re.compile(r'<(?:!doctype|html|head|body)[\s>/]|</(?:html|head|body)\s*>', re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def parse_style(style):
+    """Converte um atributo style em dicionário. O resultado é compartilhado: não altere."""
+    return {k.strip(): v.strip() for k, v in (s.split(':', 1) for s in style.split(';') if ':' in s)}
+
+
+@lru_cache(maxsize=4096)
+def _clean_style(style):
+    """Remove os estilos exclusivos do editor. Retorna None se nada restar."""
+    if _EDITOR_STYLE_HINT.search(style):
+        for pattern in _EDITOR_STYLE_PATTERNS:
+            style = pattern.sub('', style).strip()
+    else:
+        style = style.strip()
+    return style.strip(';').strip() if style else None
+
+
+def _clean_classes(classes):
+    """Retorna as classes que não pertencem ao editor."""
+    return [c for c in classes if c not in EDITOR_CLASSES]
+
+
+def _column_cells(container_style, num_cols):
+    """Largura e estilo de cada célula da tabela que substitui as colunas flex."""
+    col_width = f"{100 / num_cols:.2f}%"
+    gap_match = _GAP_PATTERN.search(container_style)
+    padding_val = int(gap_match.group(1)) // 2 if gap_match else 10
+    cells = []
+    for i in range(num_cols):
+        padding_style = []
+        if i > 0: padding_style.append(f"padding-left: {padding_val}px")
+        if i < num_cols - 1: padding_style.append(f"padding-right: {padding_val}px")
+        cells.append('; '.join(padding_style) if padding_style else None)
+    return col_width, cells
+
+
+@lru_cache(maxsize=1024)
+def _component_cell(align, style):
+    """Atributos da célula que envolve um componente: (align, valign, style)."""
+    styles = parse_style(style)
+    td_style = []
+
+    # Preserva alinhamento vertical para centralização real
+    valign = None
+    if align == "center":
+        valign = 'middle'
+        td_style.append("text-align: center; vertical-align: middle;")
+    else:
+        td_style.append(f"text-align: {align};")
+
+    # Copia estilos importantes
+    for prop in COPIED_STYLES:
+        if prop in styles:
+            td_style.append(f"{prop}: {styles[prop]}")
+
+    # Borda arredondada
+    td_style.extend(f"{prop}: {styles[prop]}" for prop in RADIUS_STYLES if prop in styles and styles[prop] != '0px')
+    return align, valign, '; '.join(td_style)
+
+
+@lru_cache(maxsize=1024)
+def _button_style(style):
+    """Recompõe o estilo inline de um botão."""
+    a_styles = parse_style(style)
+    return (
+        f"display: inline-block; text-decoration: none; "
+        f"padding: {a_styles.get('padding', '12px 25px')}; "
+        f"font-family: {a_styles.get('font-family', 'Arial, sans-serif')}; "
+        f"font-size: {a_styles.get('font-size', '16px')}; "
+        f"font-weight: {a_styles.get('font-weight', 'bold')}; "
+        f"color: {a_styles.get('color', '#ffffff')}; "
+        f"background-color: {a_styles.get('background-color', '#3498db')}; "
+        f"border-radius: {a_styles.get('border-radius', '5px')};"
+    )
+
+
+class _Compiler:
+    """
+    Transforma a árvore do editor em HTML de email em uma única passagem:
+    colunas viram tabelas, componentes de primeiro nível são envolvidos em tabelas
+    e os atributos do editor são limpos à medida que cada tag é visitada.
+    As subclasses implementam as operações na árvore de cada parser.
+    """
+
+    def visit(self, tag, in_td):
+        if self.get(tag, 'data-type') in COLUMN_TYPES:
+            table = self.convert_columns(tag)
+            if table is not None:
+                self.finish_layout(table)
+                return
+
+        if not in_td and 'editable-component' in self.classes(tag):
+            table = self.convert_component(tag)
+            if table is not None:
+                self.finish_layout(table)
+                return
+
+        self.clean(tag)
+        self.visit_children(tag, in_td or self.name(tag) == 'td')
+
+    def finish_layout(self, table):
+        """Limpa a tabela gerada e continua a passagem dentro das células."""
+        self.clean(table)
+        for tr in self.child_tags(table):
+            self.clean(tr)
+            for td in self.child_tags(tr):
+                self.clean(td)
+                self.visit_children(td, True)
+
+    def visit_children(self, parent, in_td):
+        for child in self.child_tags(parent):
+            self.visit(child, in_td)
+
+    def convert_columns(self, container):
+        """Converte colunas flex em uma tabela de layout."""
+        inner_cols = [c for c in self.child_tags(container) if 'column' in self.classes(c)]
+        if not inner_cols:
+            return None
+        col_width, cell_styles = _column_cells(self.get(container, 'style', ''), len(inner_cols))
+
+        table = self.new_tag('table', LAYOUT_TABLE_ATTRS)
+        tr = self.new_tag('tr')
+        self.append(table, tr)
+        for col_div, cell_style in zip(inner_cols, cell_styles):
+            td = self.new_tag('td', {'width': col_width, 'valign': "top"})
+            if cell_style:
+                self.set(td, 'style', cell_style)
+            self.move_children(col_div, td)
+            self.append(tr, td)
+        self.replace(container, table)
+        return table
+
+    def convert_component(self, component):
+        """Envolve um componente em uma tabela com alinhamento e estilos compatíveis com email."""
+        a_tag = None
+        if self.get(component, 'data-type', '') == 'button':
+            a_tag = self.find_link(component)
+            if a_tag is None:
+                return None
+
+        align, valign, td_style = _component_cell(self.get(component, 'data-align', 'left'), self.get(component, 'style', ''))
+        table = self.new_tag('table', LAYOUT_TABLE_ATTRS)
+        tr = self.new_tag('tr')
+        td = self.new_tag('td')
+        self.append(tr, td)
+        self.append(table, tr)
+        self.set(td, 'align', align)
+        if valign:
+            self.set(td, 'valign', valign)
+        self.set(td, 'style', td_style)
+
+        if a_tag is not None:
+            self.set(a_tag, 'style', _button_style(self.get(a_tag, 'style', '')))
+            self.move_link(a_tag, td)
+        else:
+            self.move_children(component, td)
+
+        self.replace(component, table)
+        return table
+
+
+class _SoupCompiler(_Compiler):
+    """Operações sobre a árvore do BeautifulSoup (html.parser)."""
+
+    def __init__(self, soup):
+        self.soup = soup
+
+    def get(self, tag, attr, default=None):
+        return tag.get(attr, default)
+
+    def set(self, tag, attr, value):
+        tag[attr] = value
+
+    def name(self, tag):
+        return tag.name
+
+    def classes(self, tag):
+        return tag.get('class', ())
+
+    def child_tags(self, tag):
+        return [c for c in tag.children if c.name is not None]
+
+    def find_link(self, tag):
+        return tag.find('a')
+
+    def new_tag(self, name, attrs=None):
+        return self.soup.new_tag(name, attrs=dict(attrs or {}))
+
+    def append(self, parent, child):
+        parent.append(child)
+
+    def move_children(self, source, target):
+        target.extend(list(source.children))
+
+    def move_link(self, a_tag, td):
+        td.append(a_tag)
+
+    def replace(self, old, new):
+        old.replace_with(new)
+
+    def clean(self, tag):
+        attrs = tag.attrs
+        for attr in [a for a in attrs if a.startswith('data-') or a == 'id']:
+            del attrs[attr]
+
+        if 'class' in attrs:
+            classes_to_keep = _clean_classes(attrs['class'])
+            if classes_to_keep:
+                attrs['class'] = classes_to_keep
+            else:
+                del attrs['class']
+
+        if 'style' in attrs:
+            style = _clean_style(attrs['style'])
+            if style is None:
+                del attrs['style']
+            else:
+                attrs['style'] = style
+
+
+# Mesmas regras de saída do BeautifulSoup (formatter "minimal"), para que os dois
+# caminhos gerem exatamente os mesmos bytes.
+_VOID_ELEMENTS = frozenset([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image',
+    'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source',
+    'spacer', 'track', 'wbr'
+])
+_RAW_TEXT_ELEMENTS = frozenset(['script', 'style'])
+_PRESERVE_WHITESPACE_ELEMENTS = frozenset(['pre', 'textarea'])
+_ASCII_SPACES = dict.fromkeys(map(ord, '\x20\x0a\x09\x0c\x0d'))
+_LIST_ATTRIBUTES = {
+    '*': frozenset(['class', 'accesskey', 'dropzone']),
+    'a': frozenset(['rel', 'rev']), 'link': frozenset(['rel', 'rev']),
+    'td': frozenset(['headers']), 'th': frozenset(['headers']),
+    'form': frozenset(['accept-charset']), 'object': frozenset(['archive']),
+    'area': frozenset(['rel']), 'icon': frozenset(['sizes']),
+    'iframe': frozenset(['sandbox']), 'output': frozenset(['for']),
+}
+_NO_LIST_ATTRIBUTES = frozenset()
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _quote_attribute(value):
+    value = _escape(value)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', '&quot;') + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+def _text(text, raw, preserve):
+    # Como o BeautifulSoup, reduz textos só de espaços a '\n' ou ' '
+    if not preserve and not text.translate(_ASCII_SPACES):
+        return '\n' if '\n' in text else ' '
+    return text if raw else _escape(text)
+
+
+def _serialize_element(element, out, preserve=False, fragments=None):
+    """Serializa um elemento (sem o texto que o segue). `fragments` mapeia elementos já serializados."""
+    tag = element.tag
+    if fragments and element in fragments:
+        out.append(fragments[element])
+    elif isinstance(tag, str):
+        list_attrs = _LIST_ATTRIBUTES.get(tag, _NO_LIST_ATTRIBUTES)
+        attrs = []
+        for key, value in sorted(element.attrib.items()):
+            if key in _LIST_ATTRIBUTES['*'] or key in list_attrs:
+                value = ' '.join(value.split())
+            attrs.append(f' {key}={_quote_attribute(value)}')
+        attr_string = ''.join(attrs)
+        if tag in _VOID_ELEMENTS and not len(element) and not element.text:
+            out.append(f'<{tag}{attr_string}/>')
+        else:
+            out.append(f'<{tag}{attr_string}>')
+            _serialize_children(element, out, preserve or tag in _PRESERVE_WHITESPACE_ELEMENTS, fragments)
+            out.append(f'</{tag}>')
+    elif tag is etree.Comment:
+        out.append(f'<!--{element.text or ""}-->')
+    elif tag is etree.ProcessingInstruction:
+        out.append(f'<?{element.target} {element.text or ""}>')
+
+
+def _serialize_children(element, out, preserve=False, fragments=None):
+    raw = element.tag in _RAW_TEXT_ELEMENTS
+    if element.text:
+        out.append(_text(element.text, raw, preserve))
+    for child in element:
+        _serialize_element(child, out, preserve, fragments)
+        if child.tail:
+            out.append(_text(child.tail, raw, preserve))
+
+
+class _LxmlCompiler(_Compiler):
+    """Operações sobre a árvore do lxml."""
+
+    def get(self, tag, attr, default=None):
+        return tag.get(attr, default)
+
+    def set(self, tag, attr, value):
+        tag.set(attr, value)
+
+    def name(self, tag):
+        return tag.tag
+
+    def classes(self, tag):
+        value = tag.get('class')
+        return value.split() if value else ()
+
+    def child_tags(self, tag):
+        return [c for c in tag if isinstance(c.tag, str)]
+
+    def find_link(self, tag):
+        return next(tag.iterdescendants('a'), None)
+
+    def new_tag(self, name, attrs=None):
+        return etree.Element(name, attrs or {})
+
+    def append(self, parent, child):
+        parent.append(child)
+
+    def move_children(self, source, target):
+        # No lxml o texto após um elemento (tail) acompanha o elemento
+        target.text = source.text
+        for child in list(source):
+            target.append(child)
+
+    def move_link(self, a_tag, td):
+        # O texto após o link pertence ao componente, que é descartado
+        a_tag.tail = None
+        td.append(a_tag)
+
+    def replace(self, old, new):
+        new.tail = old.tail
+        old.tail = None
+        old.getparent().replace(old, new)
+
+    def clean(self, tag):
+        attrib = tag.attrib
+        for attr in [a for a in attrib.keys() if a.startswith('data-') or a == 'id']:
+            del attrib[attr]
+
+        value = attrib.get('class')
+        if value is not None:
+            classes_to_keep = _clean_classes(value.split())
+            if classes_to_keep:
+                attrib['class'] = ' '.join(classes_to_keep)
+            else:
+                del attrib['class']
+
+        value = attrib.get('style')
+        if value is not None:
+            style = _clean_style(value)
+            if style is None:
+                del attrib['style']
+            else:
+                attrib['style'] = style
+
+
+_lxml_parser = None
+
+
+def parse_fragment(raw_html):
+    """Faz o parse de um fragmento HTML com o lxml e retorna o <body> que o contém."""
+    global _lxml_parser
+    if _lxml_parser is None:
+        _lxml_parser = etree.HTMLParser(huge_tree=True)
+    # O wrapper explícito preserva espaços e comentários antes do primeiro elemento
+    root = etree.fromstring(f'<html><body>{raw_html}</body></html>', _lxml_parser)
+    return root.find('body')
+
+
+def serialize_fragment(body):
+    """Serializa o conteúdo de um elemento lxml com as mesmas regras do BeautifulSoup."""
+    out = []
+    _serialize_children(body, out)
+    return ''.join(out)
+
+
+def serialize_element(element):
+    """Serializa um elemento lxml (incluindo a própria tag, sem o texto seguinte)."""
+    out = []
+    _serialize_element(element, out)
+    return ''.join(out)
+
+
+def remove_keep_tail(element):
+    """Remove um elemento lxml preservando o texto que vem depois dele."""
+    parent = element.getparent()
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + element.tail
+        else:
+            parent.text = (parent.text or '') + element.tail
+    parent.remove(element)
+
+
+def _compile_with_lxml(raw_html):
+    body = parse_fragment(raw_html)
+    _LxmlCompiler().visit_children(body, False)
+    return serialize_fragment(body)
+
+
+def _compile_with_soup(raw_html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(raw_html, 'html.parser')
+    _SoupCompiler(soup).visit_children(soup.body or soup, False)
+    return soup.body.decode_contents() if soup.body else str(soup)
+
+
+def clean_html_for_sending(raw_html):
+    """
+    Converte o HTML do editor em um formato compatível com email, usando tabelas.
+    Trata corretamente botões, redes sociais, bordas curvadas e alinhamento de textos.
+
+    Usa o lxml quando disponível; a saída é a mesma do BeautifulSoup para o HTML
+    gerado pelo editor (fragmentos bem formados).
+    """
+    if not raw_html:
+        return ""
+    with tracer.span('compile', 'render'):
+        if etree is not None and not _DOCUMENT_PATTERN.search(raw_html):
+            return _compile_with_lxml(raw_html)
+        return _compile_with_soup(raw_html)
+
+
+class HtmlCompileCache:
+    """
+    Compilação incremental: guarda o HTML final de cada componente, indexado pelo
+    hash do seu HTML original e pelo contexto (dentro ou fora de uma coluna).
+    Ao recompilar, apenas os componentes alterados são transformados novamente;
+    colunas são resolvidas célula a célula, reaproveitando os componentes internos.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()
+        self._last = (None, None)
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self._fragments.clear()
+        self._last = (None, None)
+
+    def compile(self, raw_html):
+        """Equivalente a clean_html_for_sending(), reaproveitando fragmentos já compilados."""
+        if not raw_html:
+            return ""
+        if etree is None or _DOCUMENT_PATTERN.search(raw_html):
+            return clean_html_for_sending(raw_html)
+
+        with tracer.span('compile', 'render', {'incremental': True}):
+            document_key = hashlib.blake2b(raw_html.encode('utf-8'), digest_size=16).digest()
+            if self._last[0] == document_key:
+                return self._last[1]
+
+            body = parse_fragment(raw_html)
+            compiler = _LxmlCompiler()
+            fragments = {}
+            for child in compiler.child_tags(body):
+                self._compile_tag(compiler, child, False, fragments)
+            out = []
+            _serialize_children(body, out, fragments=fragments)
+            result = ''.join(out)
+            self._last = (document_key, result)
+            return result
+
+    def _compile_tag(self, compiler, tag, in_td, fragments):
+        key = (hashlib.blake2b(etree.tostring(tag, with_tail=False), digest_size=16).digest(), in_td)
+        cached = self._fragments.get(key)
+        if cached is not None:
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            fragments[tag] = cached
+            return
+        self.misses += 1
+
+        parent = tag.getparent()
+        position = parent.index(tag)
+        table = compiler.convert_columns(tag) if compiler.get(tag, 'data-type') in COLUMN_TYPES else None
+        if table is not None:
+            # Mesma sequência de finish_layout(), mas cada item das células passa pelo cache
+            compiler.clean(table)
+            for tr in compiler.child_tags(table):
+                compiler.clean(tr)
+                for td in compiler.child_tags(tr):
+                    compiler.clean(td)
+                    for child in compiler.child_tags(td):
+                        self._compile_tag(compiler, child, True, fragments)
+        else:
+            compiler.visit(tag, in_td)
+        # A transformação pode ter substituído o elemento por uma tabela
+        result = parent[position]
+
+        out = []
+        _serialize_element(result, out, fragments=fragments)
+        fragment = ''.join(out)
+        fragments[result] = fragment
+        self._fragments[key] = fragment
+        if len(self._fragments) > self.max_entries:
+            self._fragments.popitem(last=False)
+
+
+def build_export_document(clean_html):
+    """Envolve o HTML limpo no boilerplate do arquivo exportado."""
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<title>Seu Email</title>
+<style>
+    body {{ margin: 0; padding: 0; background-color: #f4f4f4; }}
+    table {{ border-collapse: collapse; mso-table-lspace:0pt; mso-table-rspace:0pt; }}
+    img {{ max-width: 100%; height: auto; display: block; }}
+</style>
+</head>
+<body>
+<table role="presentation" cellspacing="0" cellpadding="0" border="0" align="center" width="100%" style="max-width: 600px;">
+    <tr>
+        <td style="padding: 20px; background-color: #ffffff;">
+            {clean_html}
+        </td>
+    </tr>
+</table>
+</body>
+</html>"""
+
+
+def build_send_document(clean_html, bg_color=None):
+    """Envolve o HTML limpo no contêiner usado no corpo da mensagem enviada."""
+    if not bg_color or bg_color == "" or bg_color == "transparent":
+        bg_color = "#ffffff"
+    return f'''
+        <div style="background-color: {bg_color}; padding: 1px;">
+            <style type="text/css">
+                table[align="center"] {{ margin-left: auto; margin-right: auto; }}
+                table[align="right"] {{ margin-left: auto; }}
+                td[align="center"] {{ text-align: center !important; }}
+                td[align="right"] {{ text-align: right !important; }}
+                td[align="left"] {{ text-align: left !important; }}
+                a {{ text-decoration: none; }}
+                a[href] {{ color: inherit; }}
+                img {{ border: 0; display: block; }}
+                .button {{ display: inline-block; padding: 12px 25px; text-decoration: none; border-radius: 5px; font-weight: bold; font-size: inherit; }}
+                a[data-type="button"] {{ 
+                    display: inline-block !important; padding: 12px 25px !important; text-decoration: none !important; 
+                    font-weight: bold !important; background-color: #3498db !important; color: white !important; 
+                    border-radius: 5px !important; text-align: center !important;
+                    mso-padding-alt: 12px 25px !important; mso-line-height-rule: exactly !important;
+                }}
+                hr {{ border: 0; border-top: 1px solid #ccc; margin: 20px 0; }}
+                .spacer {{ font-size: 1px; line-height: 1px; }}
+                * {{ -webkit-text-size-adjust: none; }}
+                a, span, p, div {{ font-size: inherit; }}
+            </style>
+            {clean_html}
+        </div>'''
@@ -0,0 +1,240 @@
+import re
+from functools import lru_cache
+
+from core.html_compiler import (etree, parse_fragment, serialize_fragment, serialize_element, remove_keep_tail,
+                                warn_without_lxml)
+
+# O Gmail corta ("Mensagem cortada") corpos HTML acima de ~102 KB
+GMAIL_CLIP_KB = 102
+DEFAULT_BUDGET_KB = GMAIL_CLIP_KB
+
+# Espaços entre estes elementos não aparecem na renderização
+_BLOCK_ELEMENTS = frozenset([
+    'html', 'head', 'body', 'title', 'meta', 'link', 'style', 'script', 'table', 'thead', 'tbody',
+    'tfoot', 'tr', 'td', 'th', 'caption', 'colgroup', 'col', 'div', 'p', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'ul', 'ol', 'li', 'hr', 'br', 'center', 'blockquote', 'section', 'header', 'footer'
+])
+_RAW_ELEMENTS = frozenset(['pre', 'textarea', 'script', 'style'])
+# Elementos com estes valores de white-space mostram os espaços e quebras como estão
+_PRESERVED_WHITESPACE = re.compile(r'(?:^|;)\s*white-space\s*:\s*(?:pre|pre-wrap|pre-line|break-spaces)\b',
+                                   re.IGNORECASE)
+# Atributos com o valor padrão do HTML podem ser omitidos
+_DEFAULT_ATTRIBUTES = {
+    'style': {'type': 'text/css'},
+    'script': {'type': 'text/javascript'},
+    'a': {'shape': 'rect'},
+    'td': {'colspan': '1', 'rowspan': '1'},
+    'th': {'colspan': '1', 'rowspan': '1'},
+    'col': {'span': '1'},
+    'colgroup': {'span': '1'},
+    'form': {'method': 'get'},
+    'input': {'type': 'text'},
+}
+_NO_DEFAULTS = {}
+
+_WHITESPACE = re.compile(r'[ \t\n\r\f]+')
+_DOCTYPE = re.compile(r'\s*(<!doctype[^>]*>)', re.IGNORECASE)
+_IMPORTANT = re.compile(r'\s*!\s*important\s*$', re.IGNORECASE)
+_ZERO_UNIT = re.compile(r'(?<![\w.#-])0(?:px|pt|em|rem)\b')
+_HEX_COLOR = re.compile(r'#([0-9a-fA-F])\1([0-9a-fA-F])\2([0-9a-fA-F])\3\b')
+_COMMA_SPACES = re.compile(r'\s*,\s*')
+# Comentários, strings entre aspas e url(...) sem aspas: só o que fica fora deles é compactado
+_CSS_PROTECTED = re.compile(
+    r'''(/\*.*?\*/)|("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|url\(\s*[^\s"')]*\s*\))''',
+    re.DOTALL | re.IGNORECASE
+)
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+
+def _split_declarations(style):
+    """Separa as declarações por ';', ignorando os que estão dentro de url(...) ou aspas."""
+    parts, start, depth, quote = [], 0, 0, None
+    for i, char in enumerate(style):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(0, depth - 1)
+        elif char == ';' and depth == 0:
+            parts.append(style[start:i])
+            start = i + 1
+    parts.append(style[start:])
+    return parts
+
+
+def _shorten_value(value):
+    value = _WHITESPACE.sub(' ', value)
+    if '"' in value or "'" in value or 'url(' in value:
+        return value
+    value = _COMMA_SPACES.sub(',', value)
+    value = _ZERO_UNIT.sub('0', value)
+    return _HEX_COLOR.sub(r'#\1\2\3', value)
+
+
+@lru_cache(maxsize=8192)
+def minify_style(style):
+    """
+    Compacta um atributo style: remove declarações repetidas (a última vence,
+    respeitando !important), espaços desnecessários, unidades em zero e cores longas.
+    """
+    declarations = {}
+    for part in _split_declarations(style):
+        if ':' not in part:
+            continue
+        name, value = part.split(':', 1)
+        name = name.strip().lower()
+        important = bool(_IMPORTANT.search(value))
+        value = _shorten_value(_IMPORTANT.sub('', value).strip())
+        if not name or not value:
+            continue
+        previous = declarations.get(name)
+        if previous is not None:
+            if previous[1] and not important:
+                continue
+            # Reposiciona para manter a ordem da cascata entre atalhos e propriedades longas
+            del declarations[name]
+        declarations[name] = (value, important)
+    return ';'.join(f"{name}:{value}!important" if important else f"{name}:{value}"
+                    for name, (value, important) in declarations.items())
+
+
+def _minify_css_code(code):
+    code = _WHITESPACE.sub(' ', code)
+    code = _CSS_PUNCTUATION.sub(r'\1', code)
+    return code.replace(': ', ':').replace(';}', '}')
+
+
+def minify_css(css):
+    """
+    Compacta o conteúdo de um bloco <style>. Strings entre aspas e url(...) ficam
+    como estão: "x: y.png" e um caminho com espaços apontam para outro arquivo se mudarem.
+    """
+    output, code, position = [], '', 0
+    for match in _CSS_PROTECTED.finditer(css):
+        code += css[position:match.start()]
+        position = match.end()
+        if match.group(1):
+            # Comentário: descartado; o código em volta é compactado junto
+            continue
+        output.append(_minify_css_code(code))
+        output.append(match.group(2))
+        code = ''
+    output.append(_minify_css_code(code + css[position:]))
+    return ''.join(output).strip()
+
+
+def _is_block(element):
+    return element is not None and element.tag in _BLOCK_ELEMENTS
+
+
+def _minify_text(text, block_before, block_after):
+    if not text:
+        return text
+    if not text.strip(' \t\n\r\f'):
+        return None if block_before or block_after else ' '
+    text = _WHITESPACE.sub(' ', text)
+    if block_before:
+        text = text.lstrip(' ')
+    if block_after:
+        text = text.rstrip(' ')
+    return text
+
+
+def _is_conditional_comment(comment):
+    text = (comment.text or '').strip()
+    return text.startswith('[if') or text.endswith('<![endif]') or text.startswith('<![endif')
+
+
+def _minify_element(element, raw=False):
+    tag = element.tag
+    # O style é lido antes de ser compactado; os descendentes herdam o white-space
+    raw = raw or tag in _RAW_ELEMENTS or bool(_PRESERVED_WHITESPACE.search(element.get('style', '')))
+
+    for child in list(element):
+        if child.tag is etree.Comment and not _is_conditional_comment(child):
+            remove_keep_tail(child)
+
+    if tag == 'style' and element.text:
+        element.text = minify_css(element.text)
+    elif not raw:
+        element.text = _minify_text(element.text, _is_block(element), _is_block(element[0]) if len(element) else _is_block(element))
+
+    attrib = element.attrib
+    style = attrib.get('style')
+    if style is not None:
+        style = minify_style(style)
+        if style:
+            attrib['style'] = style
+        else:
+            del attrib['style']
+    classes = attrib.get('class')
+    if classes is not None:
+        classes = ' '.join(classes.split())
+        if classes:
+            attrib['class'] = classes
+        else:
+            del attrib['class']
+    for attr, default in _DEFAULT_ATTRIBUTES.get(tag, _NO_DEFAULTS).items():
+        if attrib.get(attr, '').strip().lower() == default:
+            del attrib[attr]
+
+    for child in element:
+        if isinstance(child.tag, str):
+            _minify_element(child, raw)
+        if not raw:
+            following = child.getnext()
+            child.tail = _minify_text(
+                child.tail, _is_block(child),
+                _is_block(following) if following is not None else _is_block(element)
+            )
+
+
+def minify_html(html):
+    """
+    Minifica o HTML final do email: colapsa espaços, remove comentários (exceto os
+    condicionais do Outlook), compacta os estilos e remove atributos vazios ou com
+    valor padrão. Aceita tanto fragmentos quanto documentos completos.
+    Sem o lxml, o HTML é retornado sem alterações.
+    """
+    if not html:
+        return html
+    if etree is None:
+        warn_without_lxml("a minificação do HTML")
+        return html
+
+    doctype = _DOCTYPE.match(html)
+    if doctype or re.match(r'\s*<html[\s>]', html, re.IGNORECASE):
+        rest = html[doctype.end():] if doctype else html
+        root = etree.fromstring(rest, etree.HTMLParser(huge_tree=True))
+        _minify_element(root)
+        return (doctype.group(1) if doctype else '') + serialize_element(root)
+
+    body = parse_fragment(html)
+    _minify_element(body)
+    return serialize_fragment(body)
+
+
+def size_report(html, budget_kb=DEFAULT_BUDGET_KB):
+    """Tamanho do corpo HTML em relação ao orçamento configurado e ao corte do Gmail."""
+    size = len(html.encode('utf-8')) if html else 0
+    kb = size / 1024
+    return {
+        'bytes': size,
+        'kb': round(kb, 1),
+        'budget_kb': budget_kb,
+        'over_budget': bool(budget_kb) and kb > budget_kb,
+        'gmail_clipped': kb > GMAIL_CLIP_KB,
+    }
+
+
+def check_size_budget(html, budget_kb=DEFAULT_BUDGET_KB):
+    """Retorna (dentro do orçamento, mensagem) para exibir antes do envio."""
+    report = size_report(html, budget_kb)
+    message = f"O corpo do email tem {report['kb']} KB (orçamento: {budget_kb} KB)."
+    if report['gmail_clipped']:
+        message += f" Acima de {GMAIL_CLIP_KB} KB o Gmail corta a mensagem e esconde o restante do conteúdo."
+    return not report['over_budget'], message
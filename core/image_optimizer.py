@@ -0,0 +1,233 @@
+import os
+import io
+import re
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from core.asset_store import AssetIndex, asset_digest, default_asset_store, split_entry
+
+CONTAINER_WIDTH = 600       # largura máxima do corpo do email (build_send_document)
+DEFAULT_SCALE = 2           # pixels por px de CSS: nítido em telas de alta densidade
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+# Política de WebP: desligado por padrão, porque o Outlook para Windows e
+# clientes antigos não exibem WebP
+WEBP_OFF = 'off'
+WEBP_IF_SMALLER = 'if-smaller'
+WEBP_ALWAYS = 'always'
+WEBP_POLICIES = (WEBP_OFF, WEBP_IF_SMALLER, WEBP_ALWAYS)
+
+# Muda quando o resultado da otimização muda, invalidando o cache em disco
+CACHE_VERSION = 2
+
+# GIFs (animações) e formatos desconhecidos seguem como estão
+OPTIMIZABLE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+_MIME_BY_EXTENSION = {'.jpg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp'}
+_KEEP_ORIGINAL = '.orig'
+
+_WIDTH_ATTR = re.compile(r'\swidth\s*=\s*["\']?\s*(\d+(?:\.\d+)?)\s*(%?)', re.IGNORECASE)
+_STYLE_ATTR = re.compile(r'\sstyle\s*=\s*(["\'])(.*?)\1', re.IGNORECASE | re.DOTALL)
+_STYLE_WIDTH = re.compile(r'(?:^|;)\s*width\s*:\s*(\d+(?:\.\d+)?)\s*(px|%)', re.IGNORECASE)
+
+
+def rendered_width(img_tag, container_width=CONTAINER_WIDTH):
+    """
+    Largura em px de CSS com que a imagem aparece no email: a do style, depois a
+    do atributo width; sem nenhuma das duas, a do corpo (img { max-width: 100% }).
+    """
+    width = None
+    style = _STYLE_ATTR.search(img_tag)
+    match = _STYLE_WIDTH.search(style.group(2)) if style else None
+    if match is None:
+        match = _WIDTH_ATTR.search(img_tag)
+    if match is not None:
+        value = float(match.group(1))
+        width = container_width * value / 100 if match.group(2) == '%' else value
+    if not width:
+        return container_width
+    return min(int(round(width)), container_width)
+
+
+def optimize_image(data, extension, target_width, jpeg_quality=JPEG_QUALITY, webp=WEBP_OFF):
+    """
+    Redimensiona para `target_width` pixels (só reduz), aplica a orientação do EXIF
+    e regrava sem metadados: JPEG progressivo ou PNG otimizado, e WebP conforme a política.
+    Retorna (dados, extensão do resultado), ou None quando o original já é menor.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        if getattr(source, 'is_animated', False):
+            return None
+        image = ImageOps.exif_transpose(source)
+        resized = image.width > target_width
+        if resized:
+            height = max(1, round(image.height * target_width / image.width))
+            image = image.resize((target_width, height), Image.LANCZOS)
+
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+        output = io.BytesIO()
+        if extension in ('.jpg', '.jpeg') and not has_alpha:
+            image.convert('RGB').save(output, 'JPEG', quality=jpeg_quality, optimize=True, progressive=True)
+            best = (output.getvalue(), '.jpg')
+        else:
+            if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+                image = image.convert('RGBA' if has_alpha else 'RGB')
+            image.save(output, 'PNG', optimize=True)
+            best = (output.getvalue(), '.png')
+
+        if webp != WEBP_OFF:
+            output = io.BytesIO()
+            image.save(output, 'WEBP', quality=WEBP_QUALITY, method=4)
+            if webp == WEBP_ALWAYS or len(output.getvalue()) < len(best[0]):
+                best = (output.getvalue(), '.webp')
+
+    # Sem redução de tamanho não vale trocar o arquivo (exceto quando a política exige WebP)
+    if len(best[0]) >= len(data) and not (webp == WEBP_ALWAYS and best[1] == '.webp'):
+        return None
+    return best
+
+
+def _optimize_task(args):
+    data, extension, target_width, jpeg_quality, webp = args
+    try:
+        return optimize_image(data, extension, target_width, jpeg_quality, webp)
+    except Exception:
+        # Arquivo corrompido ou formato que o Pillow não lê: envia o original
+        return None
+
+
+class ImageOptimizer:
+    """
+    Otimiza as imagens locais embutidas no email antes do envio.
+
+    Os resultados ficam no armazenamento de imagens (core.asset_store), e um
+    índice em `cache_dir` liga o hash do original + parâmetros ao hash do
+    resultado: reenviar a campanha, ou outra com as mesmas imagens, não
+    reprocessa nada. As imagens que faltam no cache são processadas em
+    paralelo em um pool de processos.
+    """
+
+    def __init__(self, cache_dir=None, enabled=True, scale=DEFAULT_SCALE, jpeg_quality=JPEG_QUALITY,
+                 webp=WEBP_OFF, max_workers=None, container_width=CONTAINER_WIDTH, asset_store=None):
+        if webp not in WEBP_POLICIES:
+            raise ValueError(f"Política de WebP inválida: {webp}")
+        self._cache_dir = cache_dir
+        self.asset_store = asset_store or default_asset_store()
+        self.enabled = enabled
+        self.scale = scale
+        self.jpeg_quality = jpeg_quality
+        self.webp = webp
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.container_width = container_width
+
+    @classmethod
+    def from_dict(cls, data):
+        """Opções vindas do CLI ou do serviço ({'optimize': bool, 'webp': política}); vazio usa o padrão."""
+        if not data:
+            return default_image_optimizer()
+        return cls(enabled=data.get('optimize', True), webp=data.get('webp') or WEBP_OFF)
+
+    def to_dict(self):
+        return {'optimize': self.enabled, 'webp': self.webp}
+
+    @property
+    def cache_dir(self):
+        if self._cache_dir is None:
+            from core.config_manager import ConfigManager
+            self._cache_dir = os.path.join(ConfigManager().config_dir, 'image_cache')
+        return self._cache_dir
+
+    def target_width(self, img_tag):
+        return max(1, int(rendered_width(img_tag, self.container_width) * self.scale))
+
+    def optimize_batch(self, items):
+        """
+        Recebe [(dados, extensão, largura alvo em pixels, digest dos dados ou None)] e
+        retorna, na mesma ordem, [(dados, extensão)] otimizados, ou None onde o original
+        deve ser mantido.
+        """
+        results = [None] * len(items)
+        if not self.enabled:
+            return results
+
+        pending = {}
+        for index, (data, extension, target_width, digest) in enumerate(items):
+            extension = extension.lower()
+            if extension not in OPTIMIZABLE_EXTENSIONS:
+                continue
+            key = self._cache_key(digest or asset_digest(data), extension, target_width)
+            if key in pending:
+                # A mesma imagem na mesma largura é processada uma vez no lote
+                pending[key][0].append(index)
+                continue
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[index] = cached if cached != _KEEP_ORIGINAL else None
+                continue
+            pending[key] = ([index], (data, extension, target_width, self.jpeg_quality, self.webp))
+
+        tasks = [task for _, task in pending.values()]
+        for (key, (indexes, _)), result in zip(pending.items(), self._run(tasks)):
+            for index in indexes:
+                results[index] = result
+            self._cache_put(key, result)
+        return results
+
+    def _run(self, tasks):
+        if len(tasks) < 2 or self.max_workers < 2:
+            return [_optimize_task(task) for task in tasks]
+        try:
+            with ProcessPoolExecutor(max_workers=min(len(tasks), self.max_workers)) as executor:
+                return list(executor.map(_optimize_task, tasks))
+        except Exception as e:
+            # Sem processos disponíveis (ambiente restrito, executável congelado): processa aqui mesmo
+            print(f"Pool de processos indisponível para otimizar imagens: {e}")
+            return [_optimize_task(task) for task in tasks]
+
+    # --- Cache em disco ---
+
+    def _cache_key(self, digest, extension, target_width):
+        params = f'{CACHE_VERSION}|{digest}|{extension}|{target_width}|{self.jpeg_quality}|{self.webp}'
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    def _cache_get(self, key):
+        # O índice guarda "<digest><extensão>" do resultado, ou ".orig" para manter o original
+        entry = AssetIndex(self.cache_dir).get(key)
+        if entry is None or entry == _KEEP_ORIGINAL:
+            return entry
+        digest, extension = split_entry(entry)
+        try:
+            with open(self.asset_store.path_for(digest, extension), 'rb') as f:
+                return f.read(), extension
+        except OSError:
+            return None
+
+    def _cache_put(self, key, result):
+        try:
+            if result is None:
+                entry = _KEEP_ORIGINAL
+            else:
+                data, extension = result
+                digest, _ = self.asset_store.put(data, extension)
+                entry = digest + extension
+            AssetIndex(self.cache_dir).put(key, entry)
+        except OSError as e:
+            print(f"Não foi possível gravar a imagem otimizada no cache: {e}")
+
+
+def mime_type_for(extension):
+    return _MIME_BY_EXTENSION.get(extension, 'application/octet-stream')
+
+
+_default_optimizer = None
+
+
+def default_image_optimizer():
+    """Otimizador compartilhado, com o cache na pasta de configuração."""
+    global _default_optimizer
+    if _default_optimizer is None:
+        _default_optimizer = ImageOptimizer()
+    return _default_optimizer
@@ -0,0 +1,224 @@
+import os
+import re
+import hmac
+import html
+import time
+import base64
+import hashlib
+import secrets
+from urllib.parse import quote, urlparse
+
+# <a href="unsubscribe:"> no template vira o link de descadastro do destinatário
+UNSUBSCRIBE_SCHEME = 'unsubscribe:'
+SECRET_ENV = 'MAILFORGE_TRACKING_SECRET'
+SECRET_FILE_NAME = 'tracking_secret'
+
+# Identificador opaco do destinatário (9 bytes, 12 caracteres) e assinatura do token
+# (18 bytes, 24 caracteres): múltiplos de 3 bytes viram um número exato de caracteres
+# em base64, o que permite codificar o lote inteiro de uma vez e fatiar o resultado
+RECIPIENT_ID_BYTES = 9
+_RECIPIENT_ID_CHARS = RECIPIENT_ID_BYTES * 4 // 3
+SIGNATURE_BYTES = 18
+_SIGNATURE_CHARS = SIGNATURE_BYTES * 4 // 3
+LINK_SIGNATURE_BYTES = 12
+
+_LINK = re.compile(r'(<a\b[^>]*?\shref\s*=\s*)(["\'])(.*?)\2', re.IGNORECASE | re.DOTALL)
+_BODY_END = re.compile(r'</body\s*>', re.IGNORECASE)
+_CAMPAIGN_ID = re.compile(r'^[\w-]+$')
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _key(secret):
+    return secret.encode('utf-8') if isinstance(secret, str) else secret
+
+
+def load_tracking_secret(config_dir=None):
+    """
+    Chave HMAC dos tokens: a variável MAILFORGE_TRACKING_SECRET ou o arquivo
+    tracking_secret da pasta de configuração, criado na primeira vez. O serviço
+    que recebe os cliques e descadastros precisa da mesma chave.
+    """
+    secret = os.environ.get(SECRET_ENV)
+    if secret:
+        return secret.encode('utf-8')
+    if config_dir is None:
+        from core.config_manager import ConfigManager
+        config_dir = ConfigManager().config_dir
+    path = os.path.join(config_dir, SECRET_FILE_NAME)
+    try:
+        with open(path, 'r', encoding='ascii') as f:
+            return f.read().strip().encode('ascii')
+    except OSError:
+        pass
+    from core.config_manager import write_private_file
+    secret = secrets.token_urlsafe(32)
+    os.makedirs(config_dir, exist_ok=True)
+    write_private_file(path, secret)
+    return secret.encode('ascii')
+
+
+def link_signature(secret, campaign, url):
+    """Assinatura de um link da campanha: o redirecionamento só segue URLs que estavam no email."""
+    digest = hmac.new(_key(secret), f'link\0{campaign}\0{url}'.encode('utf-8'), hashlib.sha256).digest()
+    return _b64(digest[:LINK_SIGNATURE_BYTES])
+
+
+def verify_token(secret, token):
+    """
+    Lado do servidor de rastreamento: retorna (campanha, id do destinatário) de um
+    token válido, ou None. O token não contém o email: o id é associado ao endereço
+    pela coluna tracking_id do log de entrega (ou por Tracker.recipient_ids).
+    """
+    parts = token.split('.')
+    if len(parts) != 3 or not _CAMPAIGN_ID.match(parts[0]) or len(parts[1]) != _RECIPIENT_ID_CHARS:
+        return None
+    campaign, recipient_id, signature = parts
+    data = f'rcpt\0{campaign}\0{recipient_id}'.encode('utf-8')
+    expected = _b64(hmac.new(_key(secret), data, hashlib.sha256).digest()[:SIGNATURE_BYTES])
+    if not hmac.compare_digest(expected, signature):
+        return None
+    return campaign, recipient_id
+
+
+class TrackedTemplate:
+    """
+    HTML da campanha já cortado nos pontos onde entra o token do destinatário.
+    Todos os pontos recebem o mesmo token, então render() é um único join.
+    """
+
+    __slots__ = ('segments', 'links')
+
+    def __init__(self, segments, links):
+        self.segments = segments
+        self.links = links
+
+    def render(self, token):
+        return token.join(self.segments)
+
+
+class Tracker:
+    """
+    Rastreamento de cliques e aberturas e cabeçalhos List-Unsubscribe, com um
+    token HMAC por destinatário.
+
+    O token é <campanha>.<id>.<assinatura>: o id é um HMAC do endereço, opaco para
+    quem vê a URL, e o email nunca aparece nos links. recipient_ids() dá o mapa
+    email -> id, que o log de entrega guarda na coluna tracking_id.
+
+    compile() localiza os links uma vez por campanha; tokens_for() assina o lote
+    de destinatários reaproveitando o estado da chave HMAC. Por mensagem resta
+    só juntar os segmentos com o token.
+
+    URLs geradas a partir de `base_url` (o servidor que as atende fica fora do MailForge):
+        <base>/o/<token>.gif                 pixel de abertura
+        <base>/c/<token>?u=<url>&s=<assin.>  clique (verificar com link_signature)
+        <base>/u/<token>                     descadastro (GET e POST One-Click)
+    """
+
+    def __init__(self, base_url, secret, campaign=None, clicks=True, opens=True,
+                 unsubscribe=True, unsubscribe_mailto=None):
+        parsed = urlparse(base_url or '')
+        if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+            raise ValueError(f"Endereço de rastreamento inválido: {base_url}")
+        campaign = campaign or time.strftime('%Y%m%d%H%M%S')
+        if not _CAMPAIGN_ID.match(campaign):
+            raise ValueError(f"Identificador de campanha inválido: {campaign}")
+        self.base_url = base_url.rstrip('/')
+        self.secret = _key(secret)
+        self.campaign = campaign
+        self.clicks = clicks
+        self.opens = opens
+        self.unsubscribe = unsubscribe
+        self.unsubscribe_mailto = unsubscribe_mailto
+
+    @classmethod
+    def from_dict(cls, data, campaign=None, config_dir=None):
+        """Opções do CLI ou do serviço; None quando o rastreamento está desligado (sem base_url)."""
+        if not data or not data.get('base_url'):
+            return None
+        return cls(data['base_url'], data.get('secret') or load_tracking_secret(config_dir),
+                   data.get('campaign') or campaign, data.get('clicks', True), data.get('opens', True),
+                   data.get('unsubscribe', True), data.get('unsubscribe_mailto'))
+
+    def to_dict(self):
+        # A chave não viaja: o serviço lê a sua da pasta de configuração
+        return {'base_url': self.base_url, 'campaign': self.campaign, 'clicks': self.clicks,
+                'opens': self.opens, 'unsubscribe': self.unsubscribe,
+                'unsubscribe_mailto': self.unsubscribe_mailto}
+
+    def compile(self, html_body):
+        """Corta o HTML nos pontos de inserção do token. Chamado uma vez por campanha."""
+        segments, links = [], []
+        position = 0
+        pending = ''
+        for match in _LINK.finditer(html_body):
+            url = html.unescape(match.group(3)).strip()
+            if url.lower() == UNSUBSCRIBE_SCHEME and self.unsubscribe:
+                before, after = f'{self.base_url}/u/', ''
+            elif self.clicks and urlparse(url).scheme in ('http', 'https'):
+                signature = link_signature(self.secret, self.campaign, url)
+                before, after = f'{self.base_url}/c/', f'?u={quote(url, safe="")}&amp;s={signature}'
+                links.append(url)
+            else:
+                continue
+            quote_char = match.group(2)
+            segments.append(pending + html_body[position:match.start()] + match.group(1) + quote_char + before)
+            pending = after + quote_char
+            position = match.end()
+        tail = pending + html_body[position:]
+
+        if self.opens:
+            pixel = (f'<img src="{self.base_url}/o/', '.gif" width="1" height="1" alt="" '
+                     'style="display:block;width:1px;height:1px;border:0;">')
+            ends = list(_BODY_END.finditer(tail))
+            cut = ends[-1].start() if ends else len(tail)
+            segments.append(tail[:cut] + pixel[0])
+            tail = pixel[1] + tail[cut:]
+        segments.append(tail)
+        return TrackedTemplate(segments, links)
+
+    def recipient_ids(self, recipients):
+        """Ids opacos de todos os destinatários em um lote: {email em minúsculas: id}."""
+        emails = list(dict.fromkeys(r.strip().lower() for r in recipients if r and r.strip()))
+        keyed = hmac.new(self.secret, f'id\0{self.campaign}\0'.encode('utf-8'), hashlib.sha256)
+        digests = []
+        for email in emails:
+            derive = keyed.copy()
+            derive.update(email.encode('utf-8'))
+            digests.append(derive.digest()[:RECIPIENT_ID_BYTES])
+        ids = base64.urlsafe_b64encode(b''.join(digests)).decode('ascii')
+        return {email: ids[i * _RECIPIENT_ID_CHARS:(i + 1) * _RECIPIENT_ID_CHARS] for i, email in enumerate(emails)}
+
+    def tokens_for(self, recipients, recipient_ids=None):
+        """
+        Tokens de todos os destinatários em um lote: {email em minúsculas: token}.
+        Aceita os ids já calculados por recipient_ids() para não derivá-los de novo.
+        """
+        ids = recipient_ids if recipient_ids is not None else self.recipient_ids(recipients)
+        keyed = hmac.new(self.secret, f'rcpt\0{self.campaign}\0'.encode('utf-8'), hashlib.sha256)
+        digests = []
+        for recipient_id in ids.values():
+            signer = keyed.copy()
+            signer.update(recipient_id.encode('ascii'))
+            digests.append(signer.digest()[:SIGNATURE_BYTES])
+        signatures = base64.urlsafe_b64encode(b''.join(digests)).decode('ascii')
+        return {
+            email: f'{self.campaign}.{recipient_id}.{signatures[i * _SIGNATURE_CHARS:(i + 1) * _SIGNATURE_CHARS]}'
+            for i, (email, recipient_id) in enumerate(ids.items())
+        }
+
+    def headers(self, token):
+        """Cabeçalhos List-Unsubscribe do destinatário (vazio se o descadastro está desligado)."""
+        if not self.unsubscribe:
+            return {}
+        targets = [f'<{self.base_url}/u/{token}>']
+        if self.unsubscribe_mailto:
+            targets.append(f'<mailto:{self.unsubscribe_mailto}?subject=unsubscribe-{token}>')
+        headers = {'List-Unsubscribe': ', '.join(targets)}
+        # O descadastro com um clique (RFC 8058) exige HTTPS
+        if self.base_url.startswith('https://'):
+            headers['List-Unsubscribe-Post'] = 'List-Unsubscribe=One-Click'
+        return headers
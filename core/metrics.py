@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# Etapas medidas no envio
+STAGE_CONNECT = 'connect'              # TCP + TLS (SSL direto ou STARTTLS)
+STAGE_LOGIN = 'login'
+STAGE_PROCESS_IMAGES = 'process_images'
+STAGE_ATTACHMENTS = 'attachments'      # leitura e codificação dos anexos comuns
+STAGE_MIME_BUILD = 'mime_build'
+STAGE_SEND = 'send_message'            # serialização + transação SMTP
+
+# Limites dos buckets (segundos), no padrão dos histogramas do Prometheus
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+ENV_VAR = 'MAILFORGE_METRICS'
+
+
+class Histogram:
+    """Contagem, soma, mínimo, máximo e buckets cumulativos de uma etapa."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        index = 0
+        for bound in self.buckets:
+            if seconds <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimativa do quantil por interpolação dentro do bucket."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            upper = self.buckets[index] if index < len(self.buckets) else self.max
+            if seen + count >= target and count:
+                estimate = lower + (upper - lower) * (target - seen) / count
+                return min(max(estimate, self.min), self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum_s': round(self.sum, 6),
+            'mean_s': round(self.sum / self.count, 6) if self.count else None,
+            'min_s': round(self.min, 6) if self.min is not None else None,
+            'max_s': round(self.max, 6) if self.max is not None else None,
+            'p50_s': _round(self.quantile(0.5)),
+            'p90_s': _round(self.quantile(0.9)),
+            'p99_s': _round(self.quantile(0.99)),
+        }
+
+
+def _round(value):
+    return round(value, 6) if value is not None else None
+
+
+class _NullTimer:
+    """Timer usado com as métricas desligadas: não mede nada."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'connection', 'recipient', 'started')
+
+    def __init__(self, metrics, stage, connection, recipient):
+        self.metrics = metrics
+        self.stage = stage
+        self.connection = connection
+        self.recipient = recipient
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started, self.connection, self.recipient)
+        return False
+
+
+class Metrics:
+    """
+    Tempos de cada etapa do envio: histograma por etapa, totais das últimas
+    `max_connections` conexões e os tempos dos últimos `max_recipients` destinatários.
+
+    Desligado (padrão), timer() devolve um objeto que não faz nada e observe()
+    retorna logo, então a instrumentação pode ficar no caminho do envio.
+    Liga com enable() ou com a variável de ambiente MAILFORGE_METRICS=1.
+    """
+
+    def __init__(self, enabled=False, max_recipients=1000, buckets=DEFAULT_BUCKETS, max_connections=100):
+        self.enabled = enabled
+        self.max_recipients = max_recipients
+        # No serviço, cada reconexão é uma conexão nova: sem limite, a tabela cresceria sem fim
+        self.max_connections = max_connections
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._next_connection = 0
+        self.reset()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._connections = OrderedDict()
+            self._recipients = OrderedDict()
+            self._started = time.time()
+
+    def new_connection(self):
+        """Número da próxima conexão SMTP (rótulo dos totais por conexão), ou None se desligado."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._next_connection += 1
+            return self._next_connection
+
+    def timer(self, stage, connection=None, recipient=None):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage, connection, recipient)
+
+    def observe(self, stage, seconds, connection=None, recipient=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+            if connection is not None:
+                totals = self._connections.pop(connection, None) or {}
+                count, total = totals.get(stage, (0, 0.0))
+                totals[stage] = (count + 1, total + seconds)
+                self._connections[connection] = totals
+                if len(self._connections) > self.max_connections:
+                    self._connections.popitem(last=False)
+
+            if recipient is not None:
+                timings = self._recipients.pop(recipient, None) or {}
+                timings[stage] = round(timings.get(stage, 0.0) + seconds, 6)
+                self._recipients[recipient] = timings
+                if len(self._recipients) > self.max_recipients:
+                    self._recipients.popitem(last=False)
+
+    # --- Exportação ---
+
+    def summary(self):
+        with self._lock:
+            return {
+                'started': self._started,
+                'generated': time.time(),
+                'stages': {stage: histogram.to_dict() for stage, histogram in self._stages.items()},
+                'connections': {
+                    str(connection): {stage: {'count': count, 'sum_s': round(total, 6)}
+                                      for stage, (count, total) in totals.items()}
+                    for connection, totals in self._connections.items()
+                },
+                'recipients': [{'recipient': recipient, 'stages_s': timings}
+                               for recipient, timings in self._recipients.items()],
+            }
+
+    def prometheus_text(self):
+        """Métricas no formato de texto do Prometheus (ex.: para o textfile collector do node_exporter)."""
+        lines = [
+            '# HELP mailforge_stage_seconds Duração de cada etapa do envio.',
+            '# TYPE mailforge_stage_seconds histogram',
+        ]
+        with self._lock:
+            for stage, histogram in self._stages.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'mailforge_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'mailforge_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'mailforge_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'mailforge_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines.append('# HELP mailforge_connection_stage_seconds_total Tempo acumulado por conexão SMTP e etapa.')
+            lines.append('# TYPE mailforge_connection_stage_seconds_total counter')
+            for connection, totals in self._connections.items():
+                for stage, (_, total) in totals.items():
+                    lines.append(f'mailforge_connection_stage_seconds_total'
+                                 f'{{connection="{connection}",stage="{stage}"}} {total:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path_prefix):
+        """Grava <prefixo>.json e <prefixo>.prom. Retorna os dois caminhos."""
+        directory = os.path.dirname(path_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        json_path, prom_path = path_prefix + '.json', path_prefix + '.prom'
+        _write_atomic(json_path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+        _write_atomic(prom_path, self.prometheus_text())
+        return json_path, prom_path
+
+
+def _write_atomic(path, text):
+    # O coletor do Prometheus pode ler o arquivo a qualquer momento: nunca expõe um arquivo pela metade
+    partial = path + '.tmp'
+    with open(partial, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(partial, path)
+
+
+# Instância usada pelo envio (email_sender, pool e serviço)
+metrics = Metrics(enabled=os.environ.get(ENV_VAR, '') not in ('', '0'))
@@ -0,0 +1,266 @@
+import os
+import io
+import re
+import json
+import hashlib
+import string
+from email.mime.image import MIMEImage
+from concurrent.futures import ProcessPoolExecutor
+
+from core.asset_store import AssetIndex, default_asset_store, split_entry
+
+# <img src="personalized:banner"> no template vira cid:personal_banner, com uma
+# imagem própria em cada mensagem
+PLACEHOLDER_SCHEME = 'personalized:'
+CID_PREFIX = 'personal_'
+_PLACEHOLDER = re.compile(re.escape(PLACEHOLDER_SCHEME) + r'([\w-]+)')
+
+JPEG_QUALITY = 85
+MIN_FONT_SIZE = 8
+CHUNK_SIZE = 32
+
+# Muda quando a renderização muda, invalidando o cache em disco
+CACHE_VERSION = 1
+
+
+class _Row(dict):
+    """Colunas da linha do destinatário; colunas ausentes viram texto vazio."""
+
+    def __missing__(self, key):
+        return ''
+
+
+_formatter = string.Formatter()
+
+
+class PersonalizedImage:
+    """
+    Imagem base com camadas de texto preenchidas pelas colunas da planilha,
+    por exemplo {"text": "Olá, {Nome}!", "x": 40, "y": 60, "size": 36, "color": "#ffffff"}.
+
+    Campos de cada camada: text, x, y, font (arquivo .ttf/.otf), size, color,
+    anchor (padrão do Pillow, ex.: "la" ou "mm"), max_width (reduz a fonte até
+    caber), stroke_width e stroke_color.
+    """
+
+    def __init__(self, name, base_path, layers, image_format=None):
+        self.name = name
+        self.base_path = base_path
+        self.layers = layers
+        ext = os.path.splitext(base_path)[1].lower()
+        self.image_format = image_format or ('jpeg' if ext in ('.jpg', '.jpeg') else 'png')
+        with open(base_path, 'rb') as f:
+            base_digest = hashlib.sha256(f.read()).hexdigest()
+        # Tudo o que muda o resultado além dos textos: base, camadas e formato
+        self.fingerprint = hashlib.sha256(
+            json.dumps([CACHE_VERSION, base_digest, layers, self.image_format], sort_keys=True).encode()
+        ).hexdigest()
+
+    @classmethod
+    def from_dict(cls, data, base_dir=''):
+        if not data.get('name') or not data.get('base'):
+            raise ValueError("Cada imagem personalizada precisa de 'name' e 'base'.")
+        layers = data.get('layers') or []
+        for layer in layers:
+            if 'text' not in layer:
+                raise ValueError(f"Camada sem 'text' na imagem '{data['name']}'.")
+            if layer.get('font') and not os.path.isabs(layer['font']) and base_dir:
+                candidate = os.path.join(base_dir, layer['font'])
+                # Fontes instaladas no sistema (ex.: "arial.ttf") são procuradas pelo Pillow
+                if os.path.exists(candidate):
+                    layer['font'] = candidate
+        base = data['base'] if os.path.isabs(data['base']) else os.path.join(base_dir, data['base'])
+        return cls(data['name'], base, layers, data.get('format'))
+
+    @property
+    def cid(self):
+        return CID_PREFIX + self.name
+
+    @property
+    def extension(self):
+        return '.jpg' if self.image_format == 'jpeg' else '.png'
+
+    def spec(self):
+        """Dados enviados aos processos de renderização."""
+        return {'base': self.base_path, 'layers': self.layers, 'format': self.image_format}
+
+    def texts_for(self, row):
+        row = _Row(row or {})
+        return tuple(_formatter.vformat(layer['text'], (), row) for layer in self.layers)
+
+    def cache_key(self, texts):
+        return hashlib.sha256((self.fingerprint + '\0' + '\0'.join(texts)).encode('utf-8')).hexdigest()
+
+
+# --- Renderização (executada nos processos do pool) ---
+
+_worker_specs = {}
+_worker_bases = {}
+_worker_fonts = {}
+
+
+def _init_worker(specs):
+    _worker_specs.clear()
+    _worker_specs.update(specs)
+
+
+def _font(path, size):
+    from PIL import ImageFont
+
+    key = (path, size)
+    font = _worker_fonts.get(key)
+    if font is None:
+        try:
+            font = ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+        except OSError:
+            print(f"Fonte não encontrada: {path}. Usando a fonte padrão.")
+            font = ImageFont.load_default(size)
+        _worker_fonts[key] = font
+    return font
+
+
+def render_image(spec, texts):
+    """Desenha os textos sobre a imagem base. Retorna os bytes da imagem."""
+    from PIL import Image, ImageDraw
+
+    base = _worker_bases.get(spec['base'])
+    if base is None:
+        with Image.open(spec['base']) as source:
+            base = _worker_bases[spec['base']] = source.convert('RGBA')
+
+    image = base.copy()
+    draw = ImageDraw.Draw(image)
+    for layer, text in zip(spec['layers'], texts):
+        size = int(layer.get('size', 24))
+        font = _font(layer.get('font'), size)
+        max_width = layer.get('max_width')
+        while max_width and size > MIN_FONT_SIZE and draw.textlength(text, font=font) > max_width:
+            size -= 1
+            font = _font(layer.get('font'), size)
+        draw.text((layer.get('x', 0), layer.get('y', 0)), text, font=font, fill=layer.get('color', '#000000'),
+                  anchor=layer.get('anchor'), stroke_width=int(layer.get('stroke_width', 0)),
+                  stroke_fill=layer.get('stroke_color'))
+
+    output = io.BytesIO()
+    if spec['format'] == 'jpeg':
+        image.convert('RGB').save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(output, 'PNG', optimize=True)
+    return output.getvalue()
+
+
+def _render_task(args):
+    name, texts = args
+    return render_image(_worker_specs[name], texts)
+
+
+class ImagePersonalizer:
+    """
+    Gera as imagens personalizadas de uma campanha antes do envio.
+
+    render_all() calcula os textos de cada destinatário, descarta as combinações
+    repetidas (destinatários com o mesmo nome renderizam uma vez) e renderiza as
+    que faltam no cache em um pool de processos. O resultado fica no armazenamento
+    de imagens, indexado pelo hash da imagem base, das camadas e dos textos.
+    Durante o envio, parts_for() só lê os arquivos prontos.
+    """
+
+    def __init__(self, images, rows, cache_dir=None, asset_store=None, max_workers=None):
+        self.images = images
+        self.rows = rows or {}
+        self._cache_dir = cache_dir
+        self.asset_store = asset_store or default_asset_store()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._keys = {}
+        self._entries = {}
+
+    @classmethod
+    def load(cls, spec_path, rows, **kwargs):
+        """Lê a especificação JSON ({"images": [...]}); caminhos relativos partem da pasta do arquivo."""
+        with open(spec_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(spec_path))
+        images = [PersonalizedImage.from_dict(item, base_dir) for item in data.get('images', [])]
+        if not images:
+            raise ValueError("Nenhuma imagem personalizada na especificação.")
+        return cls(images, rows, **kwargs)
+
+    @property
+    def cache_dir(self):
+        if self._cache_dir is None:
+            from core.config_manager import ConfigManager
+            self._cache_dir = os.path.join(ConfigManager().config_dir, 'personalized_cache')
+        return self._cache_dir
+
+    def prepare_html(self, html):
+        """Troca os marcadores personalized:<nome> pela referência CID da imagem de cada mensagem."""
+        names = {image.name for image in self.images}
+        return _PLACEHOLDER.sub(
+            lambda m: 'cid:' + CID_PREFIX + m.group(1) if m.group(1) in names else m.group(0), html
+        )
+
+    def render_all(self, recipients):
+        """Renderiza o que falta no cache. Retorna (imagens únicas, renderizadas agora)."""
+        index = AssetIndex(self.cache_dir)
+        pending = {}
+        for recipient in recipients:
+            recipient = recipient.strip().lower()
+            if not recipient:
+                continue
+            row = self.rows.get(recipient)
+            for image in self.images:
+                texts = image.texts_for(row)
+                key = image.cache_key(texts)
+                self._keys[(recipient, image.name)] = key
+                if key in self._entries or key in pending:
+                    continue
+                entry = index.get(key)
+                if entry is not None and os.path.exists(self.asset_store.path_for(*split_entry(entry))):
+                    self._entries[key] = entry
+                else:
+                    pending[key] = (image, texts)
+
+        tasks = [(image.name, texts) for image, texts in pending.values()]
+        for (key, (image, _)), data in zip(pending.items(), self._run(tasks)):
+            digest, _ = self.asset_store.put(data, image.extension)
+            entry = self._entries[key] = digest + image.extension
+            try:
+                index.put(key, entry)
+            except OSError as e:
+                print(f"Não foi possível gravar o índice de imagens personalizadas: {e}")
+        return len(self._entries), len(tasks)
+
+    def _run(self, tasks):
+        # Gerador: cada imagem vai para o disco assim que fica pronta, sem acumular a campanha na memória
+        specs = {image.name: image.spec() for image in self.images}
+        if len(tasks) < 2 or self.max_workers < 2:
+            _init_worker(specs)
+            yield from map(_render_task, tasks)
+            return
+        try:
+            executor = ProcessPoolExecutor(max_workers=min(len(tasks), self.max_workers),
+                                           initializer=_init_worker, initargs=(specs,))
+        except Exception as e:
+            # Sem processos disponíveis (ambiente restrito): renderiza aqui mesmo
+            print(f"Pool de processos indisponível para as imagens personalizadas: {e}")
+            _init_worker(specs)
+            yield from map(_render_task, tasks)
+            return
+        with executor:
+            yield from executor.map(_render_task, tasks, chunksize=CHUNK_SIZE)
+
+    def parts_for(self, recipient):
+        """Partes MIME inline das imagens do destinatário (render_all precisa ter sido chamado)."""
+        recipient = recipient.strip().lower()
+        parts = []
+        for image in self.images:
+            key = self._keys.get((recipient, image.name))
+            entry = self._entries.get(key)
+            if entry is None:
+                raise LookupError(f"Imagem '{image.name}' não renderizada para {recipient}.")
+            with open(self.asset_store.path_for(*split_entry(entry)), 'rb') as f:
+                part = MIMEImage(f.read(), _subtype=image.image_format)
+            part.add_header('Content-ID', image.cid)
+            part.add_header('Content-Disposition', 'inline')
+            parts.append(part)
+        return parts
@@ -0,0 +1,195 @@
+import os
+import io
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+
+MODE_SESSION = 'session'      # perfil da sessão inteira (aplicativo ou comando do CLI)
+MODE_CAMPAIGN = 'campaign'    # perfil de cada campanha enviada pelo aplicativo
+PROFILE_MODES = (MODE_SESSION, MODE_CAMPAIGN)
+
+DEFAULT_SNAPSHOT_EVERY = 500
+TRACEMALLOC_FRAMES = 5
+TOP_ENTRIES = 40
+
+
+def snapshot_interval(value):
+    """Tipo do argparse para --snapshot-every: inteiro maior que zero."""
+    import argparse
+
+    try:
+        interval = int(value)
+    except ValueError:
+        interval = 0
+    if interval < 1:
+        raise argparse.ArgumentTypeError(f"informe um número de mensagens maior que zero: {value}")
+    return interval
+
+
+def default_report_dir():
+    """Pasta 'profiles' dentro da pasta de configuração (ao lado do executável no build)."""
+    from core.config_manager import ConfigManager
+    return os.path.join(ConfigManager().config_dir, 'profiles')
+
+
+class Profiler:
+    """
+    Modos de diagnóstico para builds de produção:
+    - profile: cProfile da sessão (ou de cada campanha), gravado como .pstats
+      (abre no snakeviz ou com `python -m pstats`) e um resumo .txt;
+    - trace_malloc: tracemalloc com um snapshot a cada `snapshot_every` mensagens;
+      cada relatório compara o snapshot com o anterior e com o primeiro, mostrando
+      as linhas em que a memória cresce durante envios longos.
+
+    Desligado (padrão), message_sent() e campaign() não fazem nada.
+    """
+
+    def __init__(self):
+        self.profile = None
+        self.trace_malloc = False
+        self.snapshot_every = DEFAULT_SNAPSHOT_EVERY
+        self.report_dir = None
+        self.reports = []
+        self._session = None
+        self._session_thread = None
+        self._messages = 0
+        self._first_snapshot = None
+        self._last_snapshot = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.profile or self.trace_malloc)
+
+    def start(self, report_dir=None, profile=None, trace_malloc=False, snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        """
+        Liga os modos pedidos. `profile` é MODE_SESSION, MODE_CAMPAIGN ou None.
+        No modo sessão, o perfil cobre a thread que chamou start() até stop().
+        """
+        if profile and profile not in PROFILE_MODES:
+            raise ValueError(f"Modo de perfil inválido: {profile}")
+        self.profile = profile
+        self.trace_malloc = trace_malloc
+        self.snapshot_every = max(1, snapshot_every)
+        self.report_dir = report_dir or default_report_dir()
+        self._stamp = time.strftime('%Y%m%d_%H%M%S')
+        os.makedirs(self.report_dir, exist_ok=True)
+
+        if trace_malloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._messages = 0
+            self._first_snapshot = self._last_snapshot = self._snapshot()
+
+        if profile == MODE_SESSION:
+            self._session = cProfile.Profile()
+            self._session_thread = threading.get_ident()
+            self._session.enable()
+
+    def stop(self):
+        """Encerra os modos ligados e grava os relatórios finais. Retorna os caminhos gravados."""
+        if self._session is not None:
+            self._session.disable()
+            self._write_profile(self._session, 'session')
+            self._session = None
+            self._session_thread = None
+
+        if self.trace_malloc:
+            with self._lock:
+                self._write_malloc_report('final')
+            tracemalloc.stop()
+            self._first_snapshot = self._last_snapshot = None
+
+        self.profile = None
+        self.trace_malloc = False
+        return list(self.reports)
+
+    @contextlib.contextmanager
+    def campaign(self, label='campaign'):
+        """Perfil de um único envio (modo campanha). Na thread da sessão, o perfil da sessão já o cobre."""
+        if self.profile != MODE_CAMPAIGN or threading.get_ident() == self._session_thread:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._write_profile(profile, label)
+
+    def message_sent(self):
+        """Chamado após cada mensagem: tira um snapshot da memória a cada `snapshot_every`."""
+        if not self.trace_malloc:
+            return
+        with self._lock:
+            self._messages += 1
+            if not self._messages % self.snapshot_every:
+                self._write_malloc_report(f'{self._messages:07d}msgs')
+
+    # --- Relatórios ---
+
+    def _path(self, label, extension):
+        return os.path.join(self.report_dir, f'{self._stamp}-{label}.{extension}')
+
+    def _write_profile(self, profile, label):
+        pstats_path = self._path(label, 'pstats')
+        try:
+            profile.dump_stats(pstats_path)
+            text = io.StringIO()
+            stats = pstats.Stats(profile, stream=text)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_ENTRIES)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_ENTRIES)
+            with open(self._path(label, 'txt'), 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+        except OSError as e:
+            print(f"Não foi possível gravar o perfil em {pstats_path}: {e}")
+            return
+        self.reports.append(pstats_path)
+
+    def _snapshot(self):
+        # Sem filter_traces: o filtro é Python puro e levaria segundos por snapshot em campanhas grandes
+        return tracemalloc.take_snapshot()
+
+    def _write_malloc_report(self, label):
+        snapshot = self._snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"Mensagens enviadas: {self._messages}",
+            f"Memória rastreada: {current / 1024 / 1024:.1f} MB (pico {peak / 1024 / 1024:.1f} MB)",
+            '',
+            f"Maiores crescimentos desde o snapshot anterior (top {TOP_ENTRIES}):",
+        ]
+        lines += [str(stat) for stat in _top(snapshot.compare_to(self._last_snapshot, 'lineno'))]
+        lines += ['', f"Maiores crescimentos desde o início (top {TOP_ENTRIES}):"]
+        lines += [str(stat) for stat in _top(snapshot.compare_to(self._first_snapshot, 'lineno'))]
+        lines += ['', "Maiores alocações vivas, com a pilha de chamadas (top 10):"]
+        for stat in _top(snapshot.statistics('traceback'), 10):
+            lines.append(f"{stat.size / 1024:.1f} KiB em {stat.count} blocos")
+            lines += ['    ' + line for line in stat.traceback.format()]
+        self._last_snapshot = snapshot
+
+        path = self._path(f'malloc-{label}', 'txt')
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            print(f"Não foi possível gravar o relatório de memória em {path}: {e}")
+            return
+        self.reports.append(path)
+
+
+# Alocações do próprio diagnóstico e do import de módulos, que não interessam no relatório
+_IGNORED_FILES = {tracemalloc.__file__, '<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>'}
+
+
+def _top(stats, limit=TOP_ENTRIES):
+    return [stat for stat in stats if stat.traceback[0].filename not in _IGNORED_FILES][:limit]
+
+
+# Instância usada pelo aplicativo, pelo CLI e pelo envio
+profiler = Profiler()
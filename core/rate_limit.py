@@ -0,0 +1,40 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Limite de envios por minuto compartilhado por todas as conexões.
+    `burst` é quantos envios podem sair de uma vez após um período ocioso
+    (padrão: o equivalente a 5 segundos de envio).
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst) if burst else max(1.0, self.rate * 5)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, reserve=0.0):
+        """
+        Consome um envio se houver saldo acima de `reserve` (saldo guardado para
+        outra fila). Retorna 0 se consumiu, ou quantos segundos faltam para haver saldo.
+        """
+        with self._lock:
+            self._refill()
+            needed = 1.0 + min(reserve, self.capacity - 1.0)
+            if self._tokens >= needed:
+                self._tokens -= 1.0
+                return 0
+            return (needed - self._tokens) / self.rate
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
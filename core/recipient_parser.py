@@ -0,0 +1,101 @@
+import os
+import re
+import csv
+
+# Separadores aceitos ao colar listas: quebra de linha, vírgula, ponto e vírgula e tab
+_SEPARATORS = re.compile(r'[\r\n,;\t]+')
+
+
+def parse_email_list(text):
+    """
+    Converte um texto colado (um email por linha, ou separados por vírgula/;)
+    em uma lista de emails sem duplicatas, preservando a ordem.
+    Retorna (emails, quantidade de entradas inválidas).
+    """
+    seen = set()
+    emails = []
+    invalid = 0
+    for raw in _SEPARATORS.split(text):
+        email = raw.strip().strip('<>').strip()
+        if not email:
+            continue
+        if '@' not in email or ' ' in email:
+            invalid += 1
+            continue
+        key = email.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        emails.append(email)
+    return emails, invalid
+
+
+def load_recipients_file(filepath, column_name='Email', attachment_column=None):
+    """
+    Lê destinatários de uma planilha (.xlsx/.xls), de um CSV com cabeçalho ou de
+    um arquivo de texto (um email por linha). Mesmo retorno de
+    get_recipients_from_excel: (emails, anexos por email, mensagem).
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in ('.xlsx', '.xlsm', '.xls'):
+        # O pandas só é carregado quando a lista vem de uma planilha
+        from core.excel_reader import get_recipients_from_excel
+        return get_recipients_from_excel(filepath, column_name, attachment_column)
+
+    try:
+        with open(filepath, 'r', encoding='utf-8-sig', newline='') as f:
+            if ext != '.csv':
+                emails, invalid = parse_email_list(f.read())
+                return emails, {}, f"{len(emails)} emails carregados com sucesso ({invalid} inválidos ignorados)."
+
+            reader = csv.DictReader(f)
+            for col in (column_name, attachment_column):
+                if col and col not in (reader.fieldnames or []):
+                    available_cols = ", ".join(reader.fieldnames or [])
+                    return None, None, f"Coluna '{col}' não encontrada. Colunas disponíveis: {available_cols}"
+
+            base_dir = os.path.dirname(os.path.abspath(filepath))
+            seen = set()
+            emails = []
+            attachments = {}
+            for row in reader:
+                email = (row.get(column_name) or '').strip()
+                if not email or email.lower() in seen:
+                    continue
+                seen.add(email.lower())
+                emails.append(email)
+                path = (row.get(attachment_column) or '').strip() if attachment_column else ''
+                if path:
+                    attachments[email.lower()] = path if os.path.isabs(path) else os.path.join(base_dir, path)
+            return emails, attachments, f"{len(emails)} emails carregados com sucesso."
+    except Exception as e:
+        return None, None, f"Erro ao ler a lista de destinatários: {e}"
+
+
+def load_recipient_rows(filepath, column_name='Email'):
+    """
+    Lê todas as colunas de cada destinatário de uma planilha ou CSV, para
+    personalização. Retorna ({email em minúsculas: {coluna: valor}}, mensagem),
+    ou (None, mensagem) em caso de erro.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in ('.xlsx', '.xlsm', '.xls'):
+        from core.excel_reader import get_rows_from_excel
+        return get_rows_from_excel(filepath, column_name)
+    if ext != '.csv':
+        return {}, "Arquivo sem colunas: nenhum dado para personalizar."
+
+    try:
+        with open(filepath, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            if column_name not in (reader.fieldnames or []):
+                available_cols = ", ".join(reader.fieldnames or [])
+                return None, f"Coluna '{column_name}' não encontrada. Colunas disponíveis: {available_cols}"
+            rows = {}
+            for row in reader:
+                email = (row.get(column_name) or '').strip().lower()
+                if email and email not in rows:
+                    rows[email] = {key: (value or '').strip() for key, value in row.items() if key}
+            return rows, f"{len(rows)} linhas carregadas."
+    except Exception as e:
+        return None, f"Erro ao ler a lista de destinatários: {e}"
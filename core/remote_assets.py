@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+from core.asset_store import default_asset_store
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024      # acima disso a imagem nem é baixada: fica como link
+DEFAULT_EMBED_MAX_BYTES = 200 * 1024     # até este tamanho (já otimizada) a imagem é embutida com CID
+DEFAULT_TIMEOUT = 10
+DEFAULT_WORKERS = 8
+USER_AGENT = 'MailForge'
+
+_EXTENSION_BY_TYPE = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/bmp': '.bmp',
+    'image/webp': '.webp',
+}
+
+
+class RemoteAssetFetcher:
+    """
+    Baixa as imagens remotas (http/https) do email uma vez por campanha e as
+    guarda no armazenamento de imagens. Um índice em disco lembra o ETag e o
+    Last-Modified de cada URL: nas campanhas seguintes a requisição é condicional
+    e, com 304, a cópia armazenada é reaproveitada sem baixar de novo.
+
+    A política de should_embed() decide, pelo tamanho final, se a imagem vai
+    embutida (CID) ou se o email continua apontando para a URL.
+    """
+
+    def __init__(self, asset_store=None, index_path=None, max_bytes=DEFAULT_MAX_BYTES,
+                 embed_max_bytes=DEFAULT_EMBED_MAX_BYTES, timeout=DEFAULT_TIMEOUT, max_workers=DEFAULT_WORKERS):
+        self.asset_store = asset_store or default_asset_store()
+        self._index_path = index_path
+        self.max_bytes = max_bytes
+        self.embed_max_bytes = embed_max_bytes
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._index = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Opções de imagens do CLI ou do serviço; None se a busca de imagens remotas estiver desligada."""
+        if not data or not data.get('fetch_remote'):
+            return None
+        embed_max_kb = data.get('embed_max_kb')
+        return cls(embed_max_bytes=DEFAULT_EMBED_MAX_BYTES if embed_max_kb is None else int(embed_max_kb * 1024))
+
+    @property
+    def index_path(self):
+        if self._index_path is None:
+            from core.config_manager import ConfigManager
+            self._index_path = os.path.join(ConfigManager().config_dir, 'remote_assets.json')
+        return self._index_path
+
+    def should_embed(self, size):
+        return size <= self.embed_max_bytes
+
+    def fetch_many(self, urls):
+        """Baixa as URLs em paralelo. Retorna {url: (dados, extensão)}, ou None para as que ficam como link."""
+        self._load_index()
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(urls) or 1))) as executor:
+            results = dict(zip(urls, executor.map(self.fetch, urls)))
+        self._save_index()
+        return results
+
+    def fetch(self, url):
+        self._load_index()
+        with self._lock:
+            entry = dict(self._index.get(url) or {})
+        stored = self._read_stored(entry)
+        if stored is not None and len(stored[0]) > self.max_bytes:
+            stored = None
+
+        request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        if stored is not None:
+            if entry.get('etag'):
+                request.add_header('If-None-Match', entry['etag'])
+            if entry.get('last_modified'):
+                request.add_header('If-Modified-Since', entry['last_modified'])
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                extension = _EXTENSION_BY_TYPE.get(response.headers.get_content_type())
+                length = response.headers.get('Content-Length')
+                if extension is None or (length and int(length) > self.max_bytes):
+                    return None
+                data = response.read(self.max_bytes + 1)
+                if len(data) > self.max_bytes:
+                    return None
+                etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and stored is not None:
+                return stored
+            print(f"Não foi possível baixar a imagem {url}: {e}")
+            return None
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            # Sem rede, a cópia da campanha anterior ainda serve
+            if stored is None:
+                print(f"Não foi possível baixar a imagem {url}: {e}")
+            return stored
+
+        digest, _ = self.asset_store.put(data, extension)
+        with self._lock:
+            self._index[url] = {'digest': digest, 'extension': extension, 'etag': etag,
+                                'last_modified': last_modified, 'fetched': time.time()}
+            self._dirty = True
+        return data, extension
+
+    def _read_stored(self, entry):
+        if not entry.get('digest'):
+            return None
+        try:
+            with open(self.asset_store.path_for(entry['digest'], entry['extension']), 'rb') as f:
+                return f.read(), entry['extension']
+        except OSError:
+            return None
+
+    def _load_index(self):
+        with self._lock:
+            if self._index is not None:
+                return
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+
+    def _save_index(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+                partial = f'{self.index_path}.{os.getpid()}.tmp'
+                with open(partial, 'w', encoding='utf-8') as f:
+                    json.dump(self._index, f, indent=1)
+                os.replace(partial, self.index_path)
+                self._dirty = False
+            except OSError as e:
+                print(f"Não foi possível gravar o índice de imagens remotas: {e}")
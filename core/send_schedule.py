@@ -0,0 +1,136 @@
+import re
+import time
+from datetime import datetime, timedelta
+
+_WINDOW_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$')
+
+
+def parse_window(text):
+    """Converte '08:00-18:00' em (hora inicial, hora final). Janelas que passam da meia-noite são aceitas."""
+    match = _WINDOW_PATTERN.match(text or '')
+    if not match:
+        raise ValueError(f"Janela inválida: {text!r} (use HH:MM-HH:MM).")
+    h1, m1, h2, m2 = (int(g) for g in match.groups())
+    if h1 > 23 or h2 > 24 or m1 > 59 or m2 > 59 or (h2 == 24 and m2):
+        raise ValueError(f"Janela inválida: {text!r}.")
+    if (h1, m1) == (h2 % 24, m2):
+        raise ValueError(f"Janela vazia: {text!r}.")
+    return h1 * 60 + m1, h2 * 60 + m2
+
+
+def parse_start_at(text):
+    """Data/hora de início no formato ISO ('2026-10-20 08:00'), convertida para o horário local."""
+    try:
+        value = datetime.fromisoformat(text.strip())
+    except (AttributeError, ValueError):
+        raise ValueError(f"Data de início inválida: {text!r} (use AAAA-MM-DD HH:MM).")
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+class SendSchedule:
+    """
+    Agenda de uma campanha: início em data futura, janela diária (ex.: 08:00-18:00,
+    horário local) e limites do provedor (envios por minuto e por janela/dia).
+
+    Dentro da janela as mensagens são distribuídas uniformemente pelo tempo que
+    resta, de acordo com quantas ainda faltam e quantas o limite diário permite;
+    fora dela o envio pausa e recomeça na abertura da próxima janela.
+    """
+
+    def __init__(self, start_at=None, window=None, rate_per_minute=0, daily_limit=0):
+        self.start_at = parse_start_at(start_at) if isinstance(start_at, str) else start_at
+        self.window = parse_window(window) if isinstance(window, str) else window
+        self.rate_per_minute = rate_per_minute or 0
+        self.daily_limit = int(daily_limit or 0)
+        self._next_due = None
+        self._period = None
+        self._period_sent = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        """Cria a agenda a partir do JSON da API ({start_at, window, rate_per_minute, daily_limit})."""
+        if not data:
+            return None
+        return cls(data.get('start_at'), data.get('window'),
+                   float(data.get('rate_per_minute') or 0), int(data.get('daily_limit') or 0))
+
+    def _period_at(self, moment):
+        """(início, fim) da janela que contém `moment`, ou da próxima; sem janela, o dia."""
+        if self.window is None:
+            start = datetime.combine(moment.date(), datetime.min.time())
+            return start, start + timedelta(days=1)
+        first, last = self.window
+        for offset in (-1, 0, 1):
+            day = datetime.combine(moment.date(), datetime.min.time()) + timedelta(days=offset)
+            start = day + timedelta(minutes=first)
+            end = day + timedelta(minutes=last)
+            if end <= start:
+                end += timedelta(days=1)
+            if moment < end:
+                break
+        # A janela do dia seguinte sempre termina depois de `moment`
+        return start, end
+
+    def _period_sent_at(self, period_start):
+        return self._period_sent if self._period == period_start else 0
+
+    def next_send_time(self, now=None):
+        """Horário em que a próxima mensagem pode sair."""
+        now = now or datetime.now()
+        moment = max(now, self.start_at or now, self._next_due or now)
+        # Pula janelas cujo limite diário já foi atingido
+        for _ in range(3):
+            start, end = self._period_at(moment)
+            moment = max(moment, start)
+            if not self.daily_limit or self._period_sent_at(start) < self.daily_limit:
+                break
+            moment = end
+        return moment
+
+    def delay(self, now=None):
+        """Segundos até a próxima mensagem poder sair (0 se já pode)."""
+        now = now or datetime.now()
+        return max(0.0, (self.next_send_time(now) - now).total_seconds())
+
+    def record_send(self, remaining, now=None):
+        """Registra um envio e calcula quando sai o próximo, com `remaining` mensagens ainda na fila."""
+        now = now or datetime.now()
+        start, end = self._period_at(now)
+        if self._period != start:
+            self._period, self._period_sent = start, 0
+        self._period_sent += 1
+
+        interval = 60.0 / self.rate_per_minute if self.rate_per_minute else 0.0
+        if self.window is not None and remaining:
+            slots = remaining
+            if self.daily_limit:
+                slots = min(slots, self.daily_limit - self._period_sent)
+            if slots > 0:
+                # O restante da janela dividido igualmente entre as mensagens que cabem nela
+                interval = max(interval, (end - now).total_seconds() / (slots + 1))
+        self._next_due = now + timedelta(seconds=interval)
+
+    def wait(self, sleep=time.sleep):
+        """Bloqueia até a próxima mensagem poder sair. Retorna os segundos aguardados."""
+        seconds = self.delay()
+        if seconds:
+            sleep(seconds)
+        return seconds
+
+    def to_dict(self, now=None):
+        now = now or datetime.now()
+        next_send = self.next_send_time(now)
+        start, end = self._period_at(now)
+        return {
+            'start_at': self.start_at.isoformat(timespec='minutes') if self.start_at else None,
+            'window': '%02d:%02d-%02d:%02d' % (*divmod(self.window[0], 60), *divmod(self.window[1], 60))
+                      if self.window else None,
+            'rate_per_minute': self.rate_per_minute,
+            'daily_limit': self.daily_limit,
+            'next_send_at': next_send.isoformat(timespec='seconds'),
+            'waiting': next_send > now,
+            'in_window': start <= now < end,
+            'sent_in_window': self._period_sent_at(start),
+        }
@@ -0,0 +1,691 @@
+import os
+import json
+import time
+import uuid
+import secrets
+import threading
+from collections import deque, OrderedDict
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from core.email_sender import prepare_shared_parts, build_message, create_attachment_part
+from core.smtp_pool import SmtpConnectionPool
+from core.rate_limit import TokenBucket
+from core.send_schedule import SendSchedule
+from core.metrics import metrics
+from core.tracing import tracer
+from core.smtp_transcript import transcripts
+from core.image_optimizer import ImageOptimizer
+from core.remote_assets import RemoteAssetFetcher
+from core.link_tracking import Tracker
+from core.dkim_signer import signer_for
+from core.delivery_report import DeliveryLog
+from core.config_manager import write_private_file
+
+STATE_FILE_NAME = 'daemon.json'
+# Só o token, para o credentials_file do Prometheus (Authorization: Bearer em GET /metrics)
+TOKEN_FILE_NAME = 'daemon.token'
+TOKEN_HEADER = 'X-MailForge-Token'
+
+# Baixando imagens remotas, otimizando e assinando os links; os workers ainda não enviam
+JOB_PREPARING = 'preparing'
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Filas de prioridade: envios transacionais (high) passam à frente das campanhas (bulk)
+PRIORITY_HIGH = 'high'
+PRIORITY_BULK = 'bulk'
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_BULK)
+
+_MAX_EVENTS = 10000
+_MAX_FINISHED_JOBS = 100
+_MAX_WAIT = 30
+
+
+def state_file_path(config_dir):
+    return os.path.join(config_dir, STATE_FILE_NAME)
+
+
+def token_file_path(config_dir):
+    return os.path.join(config_dir, TOKEN_FILE_NAME)
+
+
+class CampaignJob:
+    """
+    Uma campanha na fila do serviço: mensagem já compilada, destinatários pendentes,
+    contadores e os eventos recentes (para quem acompanha o progresso).
+
+    A campanha nasce em 'preparing': prepare() faz o trabalho pesado (imagens remotas,
+    otimização, imagens personalizadas, links rastreados e tokens) fora da requisição
+    que a criou.
+    """
+
+    def __init__(self, job_id, subject, html_body, recipients, attachments=None,
+                 recipient_attachments=None, log_path=None, priority=PRIORITY_BULK, schedule=None,
+                 image_optimizer=None, remote_fetcher=None, tracker=None, personalizer=None):
+        self.id = job_id
+        self.subject = subject
+        self.priority = priority
+        self.schedule = schedule
+        self.html = html_body
+        self.shared_parts = []
+        self._preparation = (attachments, image_optimizer, remote_fetcher)
+        self.recipient_attachments = recipient_attachments or {}
+        self.pending = deque(r.strip() for r in recipients if r and r.strip())
+        self.total = len(self.pending)
+        self.tracker = tracker
+        self.personalizer = personalizer
+        # Separador MIME comum às mensagens sem nada individual (corpo idêntico para o DKIM)
+        self.boundary = '=_mf_' + secrets.token_hex(16)
+        self.tracked = self.tokens = None
+        self.sent = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.status = JOB_PREPARING
+        self.message = ''
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.delivery_log = DeliveryLog(log_path) if log_path else None
+        self.on_result = None
+        self._events = deque(maxlen=_MAX_EVENTS)
+        self._seq = 0
+        self._changed = threading.Condition()
+
+    def _add_event(self, event, **data):
+        with self._changed:
+            self._seq += 1
+            self._events.append(dict(seq=self._seq, event=event, **data))
+            self._changed.notify_all()
+
+    def prepare(self):
+        """Monta as partes comuns e os tokens. Chamado uma vez, fora da thread da API."""
+        attachments, image_optimizer, remote_fetcher = self._preparation
+        self._preparation = None
+        self.html, self.shared_parts = prepare_shared_parts(
+            self.html, attachments, image_optimizer, remote_fetcher
+        )
+        if self.personalizer is not None:
+            self.html = self.personalizer.prepare_html(self.html)
+            self.personalizer.render_all(self.pending)
+        if self.tracker is not None:
+            self.tracked = self.tracker.compile(self.html)
+            recipient_ids = self.tracker.recipient_ids(self.pending)
+            self.tokens = self.tracker.tokens_for(self.pending, recipient_ids)
+            if self.delivery_log is not None:
+                self.delivery_log.tracking_ids = recipient_ids
+
+    def record_result(self, recipient, success, response='', message_id=None):
+        """Callback on_result de cada destinatário."""
+        with self._changed:
+            if success:
+                self.sent += 1
+            else:
+                self.failed += 1
+        if self.delivery_log is not None:
+            self.delivery_log.record(recipient, success, response, message_id)
+        if self.on_result is not None:
+            self.on_result(recipient, success, response, message_id)
+        self._add_event('result', recipient=recipient, success=success, response=str(response), message_id=message_id)
+
+    def finish(self, status, message=''):
+        self.status = status
+        self.message = message
+        self.finished = time.time()
+        self.close_log_if_idle()
+        self._add_event('finished', **self.to_dict())
+
+    def close_log_if_idle(self):
+        # Mensagens ainda em envio (ex.: após cancelar) continuam sendo registradas
+        if self.delivery_log is not None and not self.in_flight and self.status in FINISHED_STATUSES:
+            self.delivery_log.close()
+
+    def events_since(self, seq, wait=0):
+        """Eventos com número de sequência maior que `seq`, aguardando até `wait` segundos por novos."""
+        with self._changed:
+            if wait and self._seq <= seq and self.status not in FINISHED_STATUSES:
+                self._changed.wait(min(wait, _MAX_WAIT))
+            return [e for e in self._events if e['seq'] > seq]
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'subject': self.subject,
+            'status': self.status,
+            'priority': self.priority,
+            'message': self.message,
+            'total': self.total,
+            'sent': self.sent,
+            'failed': self.failed,
+            'pending': len(self.pending),
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'delivery_log': self.delivery_log.path if self.delivery_log else None,
+            'schedule': self.schedule.to_dict() if self.schedule else None,
+        }
+
+
+class JobQueue:
+    """
+    Fila de campanhas com duas prioridades que dividem as mesmas conexões e o
+    mesmo limite de envios por minuto.
+
+    - Os workers sempre atendem a fila high antes da bulk; dentro de cada fila
+      alternam entre as campanhas ativas (round-robin), uma mensagem por vez,
+      então uma campanha grande não bloqueia as que chegaram depois.
+    - `reserved_slots` conexões ficam reservadas para a fila high: a bulk nunca
+      ocupa todas, então um envio high não espera uma mensagem bulk terminar.
+    - Com limite de envios (`rate_limiter`), a bulk só consome o saldo acima de
+      `reserved_rate` (fração do saldo máximo), que fica guardado para a high.
+    """
+
+    def __init__(self, slots=1, reserved_slots=0, rate_limiter=None, reserved_rate=0.0):
+        self._jobs = OrderedDict()
+        self._active = {lane: deque() for lane in PRIORITIES}
+        self._in_flight = {lane: 0 for lane in PRIORITIES}
+        self._lane_slots = {
+            PRIORITY_HIGH: max(1, slots),
+            PRIORITY_BULK: max(1, slots - reserved_slots),
+        }
+        self._rate = rate_limiter
+        self._reserve = {
+            PRIORITY_HIGH: 0.0,
+            PRIORITY_BULK: rate_limiter.capacity * reserved_rate if rate_limiter else 0.0,
+        }
+        self._cond = threading.Condition()
+
+    def submit(self, job):
+        with self._cond:
+            self._jobs[job.id] = job
+            if job.status not in FINISHED_STATUSES:
+                self._active[job.priority].append(job)
+            self._prune()
+            self._cond.notify_all()
+
+    def ready(self, job):
+        """Libera para os workers uma campanha que terminou a preparação."""
+        with self._cond:
+            # Cancelada ou encerrada durante a preparação: continua como está
+            if job.status != JOB_PREPARING:
+                return
+            job.status = JOB_QUEUED
+            self._cond.notify_all()
+        job._add_event('prepared', **job.to_dict())
+
+    def next_task(self, timeout=None):
+        """Retorna (campanha, destinatário) ou None se nada ficar disponível no tempo informado."""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                wait = None
+                for lane in PRIORITIES:
+                    if self._in_flight[lane] >= self._lane_slots[lane]:
+                        continue
+                    job, due_in = self._next_job(lane)
+                    if job is None:
+                        if due_in is not None:
+                            wait = due_in if wait is None else min(wait, due_in)
+                        continue
+                    if self._rate is not None:
+                        delay = self._rate.try_take(self._reserve[lane])
+                        if delay:
+                            wait = delay if wait is None else min(wait, delay)
+                            continue
+                    if job.status == JOB_QUEUED:
+                        job.status = JOB_RUNNING
+                        job.started = time.time()
+                    job.in_flight += 1
+                    self._in_flight[lane] += 1
+                    recipient = job.pending.popleft()
+                    if job.schedule is not None:
+                        job.schedule.record_send(len(job.pending))
+                    return job, recipient
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                if wait is not None:
+                    remaining = wait if remaining is None else min(remaining, wait)
+                self._cond.wait(remaining)
+
+    def _next_job(self, lane):
+        """
+        Próxima campanha da fila com mensagem liberada. Se todas estiverem aguardando
+        a agenda (início, janela ou espaçamento), retorna (None, segundos até a primeira).
+        """
+        active = self._active[lane]
+        due_in = None
+        for _ in range(len(active)):
+            job = active[0]
+            active.rotate(-1)
+            if not job.pending or job.status not in (JOB_QUEUED, JOB_RUNNING):
+                continue
+            if job.schedule is not None:
+                delay = job.schedule.delay()
+                if delay:
+                    due_in = delay if due_in is None else min(due_in, delay)
+                    continue
+            return job, None
+        return None, due_in
+
+    def task_done(self, job):
+        with self._cond:
+            job.in_flight -= 1
+            self._in_flight[job.priority] -= 1
+            if not job.pending and not job.in_flight and job.status == JOB_RUNNING:
+                self._deactivate(job)
+                job.finish(JOB_DONE, f"{job.sent} de {job.total} emails enviados com sucesso!")
+            else:
+                job.close_log_if_idle()
+            # Uma vaga liberada pode ser de outra fila
+            self._cond.notify_all()
+
+    def _deactivate(self, job):
+        if job in self._active[job.priority]:
+            self._active[job.priority].remove(job)
+
+    def fail(self, job, message):
+        """Interrompe a campanha (ex.: falha de conexão ou de autenticação)."""
+        with self._cond:
+            job.pending.clear()
+            self._deactivate(job)
+            if job.status not in FINISHED_STATUSES:
+                job.finish(JOB_FAILED, message)
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return job
+            job.pending.clear()
+            self._deactivate(job)
+            job.finish(JOB_CANCELLED, f"Cancelado após {job.sent} de {job.total} envios.")
+            return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs.values())
+
+    def stats(self):
+        with self._cond:
+            stats = {
+                lane: {
+                    'active': len(self._active[lane]),
+                    'in_flight': self._in_flight[lane],
+                    'slots': self._lane_slots[lane],
+                }
+                for lane in PRIORITIES
+            }
+            if self._rate is not None:
+                stats['rate'] = {
+                    'per_minute': round(self._rate.rate * 60, 2),
+                    'available': round(self._rate.available(), 2),
+                    'reserved_high': round(self._reserve[PRIORITY_BULK], 2),
+                }
+            return stats
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.status in FINISHED_STATUSES]
+        for job in finished[:max(0, len(finished) - _MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+
+class SenderDaemon:
+    """
+    Serviço de envio em segundo plano: mantém conexões SMTP autenticadas abertas
+    (SmtpConnectionPool), executa as campanhas da fila e expõe uma API HTTP em
+    localhost para o aplicativo e o CLI enviarem campanhas e acompanharem o progresso.
+
+    O endereço e o token de acesso ficam em <config_dir>/daemon.json; toda
+    requisição precisa do token no cabeçalho X-MailForge-Token. GET /metrics
+    aceita também "Authorization: Bearer <token>", que é o que o Prometheus
+    envia; o token sozinho fica em <config_dir>/daemon.token para o
+    credentials_file da configuração de scrape.
+    """
+
+    def __init__(self, smtp_config, config_dir, host='127.0.0.1', port=0, connections=2,
+                 keepalive_interval=30, suppression_store=None, rate_per_minute=0,
+                 reserved_connections=1, reserved_rate=0.2, signer=None):
+        self.smtp_config = smtp_config
+        # Sem assinador informado, vem das opções dkim_* do smtp_config
+        self.signer = signer if signer is not None else signer_for(smtp_config)
+        self.config_dir = config_dir
+        self.host = host
+        self.port = port
+        self.token = secrets.token_urlsafe(32)
+        self.pool = SmtpConnectionPool(smtp_config, size=connections, keepalive_interval=keepalive_interval)
+        # Com uma única conexão não há o que reservar: a high só passa à frente na fila
+        self.queue = JobQueue(
+            slots=self.pool.size,
+            reserved_slots=min(reserved_connections, self.pool.size - 1),
+            rate_limiter=TokenBucket(rate_per_minute) if rate_per_minute else None,
+            reserved_rate=reserved_rate,
+        )
+        self.suppression_store = suppression_store
+        self._workers = []
+        self._httpd = None
+        self._stopping = threading.Event()
+
+    # --- Ciclo de vida ---
+
+    def start(self):
+        """Abre a porta da API, as conexões SMTP e os workers. OSError se a porta estiver em uso."""
+        # A porta primeiro: se falhar, nenhuma conexão ou thread fica aberta
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _ApiHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.sender_daemon = self
+        self.port = self._httpd.server_address[1]
+
+        try:
+            # Transcrições SMTP das falhas ficam ao lado dos logs de entrega
+            transcripts.dump_dir = os.path.join(self.config_dir, 'delivery_logs')
+            self.pool.start(warm=True)
+            for i in range(self.pool.size):
+                worker = threading.Thread(target=self._worker_loop, name=f'sender-{i + 1}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            # A porta já aceita conexões; elas são atendidas assim que o servidor começa
+            self._write_state()
+        except BaseException:
+            self._stopping.set()
+            self._httpd.server_close()
+            self._httpd = None
+            self.pool.close()
+            raise
+        threading.Thread(target=self._httpd.serve_forever, name='daemon-api', daemon=True).start()
+
+    def serve_forever(self):
+        """Bloqueia até stop() ou Ctrl+C. Chame start() antes."""
+        try:
+            while not self._stopping.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stopping.set()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        for job in self.queue.jobs():
+            if job.status not in FINISHED_STATUSES:
+                self.queue.cancel(job.id)
+        self.pool.close()
+        for path in (state_file_path(self.config_dir), token_file_path(self.config_dir)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _write_state(self):
+        state = {'url': f"http://{self.host}:{self.port}", 'token': self.token, 'pid': os.getpid()}
+        # O arquivo guarda o token de acesso à API
+        write_private_file(state_file_path(self.config_dir), json.dumps(state))
+        write_private_file(token_file_path(self.config_dir), self.token)
+
+    # --- Campanhas ---
+
+    def submit(self, payload):
+        """
+        Valida e enfileira uma campanha a partir do JSON recebido pela API e retorna
+        na hora, com a campanha em 'preparing' (ver _prepare):
+        subject, html (ou project com o caminho de um .mf/.html), bg_color,
+        recipients (lista) ou recipients_file (+ column, attachment_column),
+        recipient_attachments, attachments, filter_suppressed, recent_days,
+        priority ('high' para envios transacionais, 'bulk' para campanhas),
+        schedule ({start_at, window, rate_per_minute, daily_limit}; ver SendSchedule),
+        tracking ({base_url, clicks, opens, unsubscribe, unsubscribe_mailto}; ver Tracker),
+        personalized_images (caminho da especificação JSON; ver ImagePersonalizer), com as
+        colunas de cada destinatário em rows ({email: {coluna: valor}}) ou lidas de
+        recipients_file (+ column).
+        """
+        subject = payload.get('subject')
+        if not subject:
+            raise ValueError("Informe o assunto (subject).")
+        priority = payload.get('priority') or PRIORITY_BULK
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridade inválida: {priority} (use {' ou '.join(PRIORITIES)}).")
+        schedule = SendSchedule.from_dict(payload.get('schedule'))
+        image_optimizer = ImageOptimizer.from_dict(payload.get('images'))
+        remote_fetcher = RemoteAssetFetcher.from_dict(payload.get('images'))
+        job_id = uuid.uuid4().hex[:12]
+        tracker = Tracker.from_dict(payload.get('tracking'), job_id, self.config_dir)
+
+        html_body = payload.get('html')
+        if not html_body and payload.get('project'):
+            from core.template_builder import load_project, build_email_html, TARGET_SEND
+            project = payload['project']
+            html_body = load_project(project)
+            if not project.lower().endswith(('.html', '.htm')):
+                html_body = build_email_html(html_body, TARGET_SEND, payload.get('bg_color'))
+        if not html_body:
+            raise ValueError("Informe o HTML (html) ou o projeto (project).")
+
+        recipients = payload.get('recipients')
+        recipient_attachments = payload.get('recipient_attachments') or {}
+        if recipients is None and payload.get('recipients_file'):
+            from core.recipient_parser import load_recipients_file
+            recipients, file_attachments, message = load_recipients_file(
+                payload['recipients_file'], payload.get('column', 'Email'), payload.get('attachment_column')
+            )
+            if recipients is None:
+                raise ValueError(message)
+            recipient_attachments = {**file_attachments, **recipient_attachments}
+        if not recipients:
+            raise ValueError("Nenhum destinatário informado.")
+
+        personalizer = None
+        if payload.get('personalized_images'):
+            from core.personalized_images import ImagePersonalizer
+            rows = payload.get('rows')
+            if rows is None and payload.get('recipients_file'):
+                from core.recipient_parser import load_recipient_rows
+                rows, message = load_recipient_rows(payload['recipients_file'], payload.get('column', 'Email'))
+                if rows is None:
+                    raise ValueError(message)
+            rows = {email.strip().lower(): row for email, row in (rows or {}).items()}
+            personalizer = ImagePersonalizer.load(
+                payload['personalized_images'], rows, cache_dir=os.path.join(self.config_dir, 'personalized_cache')
+            )
+
+        if self.suppression_store is not None and payload.get('filter_suppressed', True):
+            recipients, _ = self.suppression_store.filter_recipients(recipients, int(payload.get('recent_days', 0)))
+
+        log_name = datetime.now().strftime(f'envio_%Y%m%d_%H%M%S_{job_id}.csv')
+        job = CampaignJob(
+            job_id, subject, html_body, recipients, payload.get('attachments'),
+            {k.strip().lower(): v for k, v in recipient_attachments.items()},
+            os.path.join(self.config_dir, 'delivery_logs', log_name), priority, schedule,
+            image_optimizer, remote_fetcher, tracker, personalizer
+        )
+        if self.suppression_store is not None:
+            job.on_result = self.suppression_store.record_delivery
+        if not job.total:
+            job.finish(JOB_DONE, "Nenhum destinatário após a lista de supressão.")
+        self.queue.submit(job)
+        if job.status == JOB_PREPARING:
+            threading.Thread(target=self._prepare, args=(job,), name=f'prepare-{job_id}', daemon=True).start()
+        return job
+
+    def _prepare(self, job):
+        # Downloads e otimização podem levar minutos: quem enviou acompanha pelo status
+        try:
+            with tracer.span('prepare', 'daemon', {'job': job.id}):
+                job.prepare()
+        except Exception as e:
+            self.queue.fail(job, f"Falha ao preparar a campanha: {e}")
+            return
+        self.queue.ready(job)
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            task = self.queue.next_task(timeout=1)
+            if task is None:
+                continue
+            job, recipient = task
+            try:
+                with tracer.span('deliver', 'daemon', {'job': job.id}):
+                    self._deliver(job, recipient)
+            finally:
+                self.queue.task_done(job)
+
+    def _deliver(self, job, recipient):
+        try:
+            paths = job.recipient_attachments.get(recipient.lower(), [])
+            own_parts = [create_attachment_part(p) for p in ([paths] if isinstance(paths, str) else paths)]
+        except Exception as e:
+            job.record_result(recipient, False, f"Erro no anexo individual: {e}")
+            return
+        if job.personalizer is not None:
+            try:
+                own_parts = job.personalizer.parts_for(recipient) + own_parts
+            except (LookupError, OSError) as e:
+                job.record_result(recipient, False, f"Erro na imagem personalizada: {e}")
+                return
+
+        html, headers = job.html, None
+        if job.tracked is not None:
+            token = job.tokens[recipient.lower()]
+            html, headers = job.tracked.render(token), job.tracker.headers(token)
+        msg = build_message(self.smtp_config['user'], recipient, job.subject, html, job.shared_parts, own_parts, headers)
+        body_key = None
+        if self.signer is not None and job.tracked is None and not own_parts:
+            msg.set_boundary(job.boundary)
+            body_key = job.boundary
+        try:
+            self.pool.send(msg, on_result=job.record_result, signer=self.signer, body_key=body_key)
+        except Exception as e:
+            # Sem conexão com o servidor não adianta continuar a campanha
+            job.record_result(recipient, False, str(e), msg['Message-ID'])
+            self.queue.fail(job, f"Falha no envio: {e}")
+
+    def status(self):
+        return {
+            'status': 'ok',
+            'pid': os.getpid(),
+            'sender': self.smtp_config['user'],
+            'pool': self.pool.stats(),
+            'lanes': self.queue.stats(),
+            'metrics': metrics.enabled,
+            'jobs': [job.to_dict() for job in self.queue.jobs()],
+        }
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    server_version = 'MailForgeDaemon/1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload, content_type='application/json; charset=utf-8'):
+        if not isinstance(payload, str):
+            payload = json.dumps(payload, ensure_ascii=False)
+        body = payload.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        daemon = self.server.sender_daemon
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        token = self.headers.get(TOKEN_HEADER, '')
+        if not token and self.command == 'GET' and parts == ['metrics']:
+            # O Prometheus só envia o cabeçalho Authorization
+            scheme, _, credentials = self.headers.get('Authorization', '').partition(' ')
+            if scheme.lower() == 'bearer':
+                token = credentials.strip()
+        if not secrets.compare_digest(token, daemon.token):
+            self._reply(401, {'error': "Token inválido."})
+            return None, None, None
+        return daemon, parts, parse_qs(url.query)
+
+    def _job_or_404(self, daemon, job_id):
+        job = daemon.queue.get(job_id)
+        if job is None:
+            self._reply(404, {'error': f"Campanha {job_id} não encontrada."})
+        return job
+
+    def do_GET(self):
+        daemon, parts, query = self._route()
+        if daemon is None:
+            return
+        if parts == ['health']:
+            self._reply(200, daemon.status())
+        elif parts == ['metrics']:
+            # Prometheus por padrão; ?format=json traz também os tempos por destinatário
+            if query.get('format', [''])[0] == 'json':
+                self._reply(200, metrics.summary())
+            else:
+                self._reply(200, metrics.prometheus_text(), 'text/plain; version=0.0.4; charset=utf-8')
+        elif parts == ['trace']:
+            # Trace dos eventos mais recentes (buffer circular), sem parar o serviço
+            if not tracer.enabled:
+                self._reply(404, {'error': "Trace desligado (use 'mailforge --trace ARQUIVO daemon')."})
+            else:
+                self._reply(200, {'traceEvents': tracer.events(), 'displayTimeUnit': 'ms'})
+        elif parts == ['transcripts']:
+            # Transcrições despejadas nas últimas falhas e, sob demanda, as das conexões ociosas do pool
+            self._reply(200, {'failures': transcripts.recent(), 'connections': daemon.pool.transcripts()})
+        elif parts == ['jobs']:
+            self._reply(200, [job.to_dict() for job in daemon.queue.jobs()])
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self._job_or_404(daemon, parts[1])
+            if job is not None:
+                self._reply(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            job = self._job_or_404(daemon, parts[1])
+            if job is not None:
+                try:
+                    since = int(query.get('since', ['0'])[0])
+                    wait = float(query.get('wait', ['0'])[0])
+                except ValueError:
+                    self._reply(400, {'error': "Parâmetros since/wait inválidos."})
+                    return
+                self._reply(200, {'job': job.to_dict(), 'events': job.events_since(since, wait)})
+        else:
+            self._reply(404, {'error': "Rota desconhecida."})
+
+    def do_POST(self):
+        daemon, parts, _ = self._route()
+        if daemon is None:
+            return
+        if parts != ['jobs']:
+            self._reply(404, {'error': "Rota desconhecida."})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+            job = daemon.submit(payload)
+        except (ValueError, OSError) as e:
+            self._reply(400, {'error': str(e)})
+            return
+        # Aceita: a preparação continua em segundo plano (status 'preparing')
+        self._reply(202, job.to_dict())
+
+    def do_DELETE(self):
+        daemon, parts, _ = self._route()
+        if daemon is None:
+            return
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = daemon.queue.cancel(parts[1])
+            if job is None:
+                self._reply(404, {'error': f"Campanha {parts[1]} não encontrada."})
+            else:
+                self._reply(200, job.to_dict())
+        else:
+            self._reply(404, {'error': "Rota desconhecida."})
@@ -0,0 +1,96 @@
+import os
+import json
+
+DEFAULT_SMTP_HOST = "smtp.gmail.com"
+DEFAULT_SMTP_PORT = 587
+
+# Mesmos nomes do .env gravado pelo ConfigManager
+_ENV_KEYS = {
+    'EMAIL_REMETENTE': 'user',
+    'EMAIL_PASSWORD': 'password',
+    'SMTP_HOST': 'host',
+    'SMTP_PORT': 'port',
+    'DKIM_DOMAIN': 'dkim_domain',
+    'DKIM_SELECTOR': 'dkim_selector',
+    'DKIM_KEY_FILE': 'dkim_key_file',
+}
+DKIM_FIELDS = ('dkim_domain', 'dkim_selector', 'dkim_key_file')
+
+
+def _read_env_file(path):
+    values = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            values[key.strip()] = value.strip().strip('"').strip("'")
+    return values
+
+
+def read_credentials_file(path):
+    """
+    Lê credenciais SMTP de um arquivo .env (EMAIL_REMETENTE, EMAIL_PASSWORD,
+    SMTP_HOST, SMTP_PORT) ou JSON ({"email", "password", "host", "port"}).
+    Opcionalmente, o DKIM: DKIM_DOMAIN, DKIM_SELECTOR e DKIM_KEY_FILE no .env, ou
+    "dkim_domain", "dkim_selector" e "dkim_key_file" no JSON. Um arquivo de chave
+    relativo parte da pasta do arquivo de credenciais.
+    """
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        config = {
+            'user': data.get('email') or data.get('user', ''),
+            'password': data.get('password', ''),
+            'host': data.get('host', ''),
+            'port': data.get('port', ''),
+        }
+        config.update({field: data.get(field, '') for field in DKIM_FIELDS})
+    else:
+        values = _read_env_file(path)
+        config = {field: values.get(key, '') for key, field in _ENV_KEYS.items()}
+    key_file = config.get('dkim_key_file')
+    if key_file and not os.path.isabs(key_file):
+        config['dkim_key_file'] = os.path.join(os.path.dirname(os.path.abspath(path)), key_file)
+    return config
+
+
+def _parse_port(value):
+    try:
+        port = int(str(value).strip())
+    except ValueError:
+        port = 0
+    if not 0 < port < 65536:
+        raise ValueError(f"Porta SMTP inválida: {value!r} (use um número entre 1 e 65535).")
+    return port
+
+
+def load_smtp_config(credentials_file=None, config_manager=None):
+    """
+    Monta o smtp_config usado por send_email, na ordem: arquivo de credenciais,
+    variáveis de ambiente e, por último, a configuração criptografada do ConfigManager.
+    Retorna (smtp_config, origem). ValueError se a porta não for um número válido.
+    """
+    if credentials_file:
+        config, source = read_credentials_file(credentials_file), credentials_file
+    elif os.environ.get('EMAIL_REMETENTE') and os.environ.get('EMAIL_PASSWORD'):
+        config = {field: os.environ.get(key, '') for key, field in _ENV_KEYS.items()}
+        source = 'ambiente'
+    else:
+        if config_manager is None:
+            from core.config_manager import ConfigManager
+            config_manager = ConfigManager()
+        email_config = config_manager.load_email_config()
+        config = {'user': email_config.get('email', ''), 'password': email_config.get('password', '')}
+        source = config_manager.config_file
+
+    return {
+        'host': config.get('host') or os.environ.get('SMTP_HOST') or DEFAULT_SMTP_HOST,
+        'port': _parse_port(config.get('port') or os.environ.get('SMTP_PORT') or DEFAULT_SMTP_PORT),
+        'user': config.get('user', ''),
+        'password': config.get('password', ''),
+        'dkim_domain': config.get('dkim_domain') or os.environ.get('DKIM_DOMAIN', ''),
+        'dkim_selector': config.get('dkim_selector') or os.environ.get('DKIM_SELECTOR', ''),
+        'dkim_key_file': config.get('dkim_key_file') or os.environ.get('DKIM_KEY_FILE', ''),
+    }, source
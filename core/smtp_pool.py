@@ -0,0 +1,172 @@
+import time
+import smtplib
+import threading
+
+from core.email_sender import connect_smtp
+
+
+class PooledConnection:
+    """Conexão SMTP autenticada com o horário do último uso."""
+
+    def __init__(self, server):
+        self.server = server
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.messages = 0
+
+
+class SmtpConnectionPool:
+    """
+    Conexões SMTP autenticadas mantidas abertas entre mensagens e entre campanhas.
+    Uma thread envia NOOP às conexões ociosas para que o servidor não as derrube;
+    conexões que não respondem, ou que já enviaram `max_messages`, são refeitas.
+    """
+
+    def __init__(self, smtp_config, size=2, keepalive_interval=30, max_messages=0, connect=connect_smtp):
+        self.smtp_config = smtp_config
+        self.size = max(1, size)
+        self.keepalive_interval = keepalive_interval
+        self.max_messages = max_messages
+        self._connect = connect
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._keepalive_thread = None
+
+    def start(self, warm=True):
+        """Abre as conexões antecipadamente e inicia o keep-alive."""
+        if warm:
+            connections = []
+            for _ in range(self.size):
+                try:
+                    connections.append(self.acquire(timeout=0))
+                except Exception as e:
+                    print(f"Não foi possível abrir conexão SMTP: {e}")
+                    break
+            for connection in connections:
+                self.release(connection)
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name='smtp-keepalive', daemon=True)
+        self._keepalive_thread.start()
+
+    def acquire(self, timeout=None):
+        """Retorna uma conexão livre, abrindo uma nova se o limite permitir."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Pool de conexões encerrado.")
+                if self._idle:
+                    return self._idle.pop()
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Nenhuma conexão SMTP disponível.")
+                self._cond.wait(remaining)
+
+        # A conexão é aberta fora do lock: login pode levar alguns segundos
+        try:
+            return PooledConnection(self._connect(self.smtp_config))
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, connection, broken=False):
+        """Devolve a conexão ao pool. Conexões com erro são fechadas."""
+        connection.last_used = time.monotonic()
+        if not broken and self.max_messages and connection.messages >= self.max_messages:
+            broken = True
+        with self._cond:
+            if broken or self._closed:
+                self._open -= 1
+            else:
+                self._idle.append(connection)
+            self._cond.notify()
+        if broken or self._closed:
+            _quit(connection)
+
+    def send(self, msg, on_result=None, signer=None, body_key=None):
+        """
+        Envia uma mensagem por uma conexão do pool, refazendo a conexão uma vez
+        se o servidor a tiver derrubado. `signer` e `body_key` seguem para
+        deliver_message (assinatura DKIM). Retorna True se a mensagem foi aceita.
+        """
+        from core.email_sender import deliver_message
+
+        for attempt in range(2):
+            connection = self.acquire()
+            try:
+                accepted = deliver_message(connection.server, msg, on_result, signer, body_key)
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code == 421 and not attempt:
+                    # 421: o servidor está encerrando a conexão (ex.: limite de mensagens por conexão)
+                    self.release(connection, broken=True)
+                    continue
+                # Erro 4xx/5xx na transação: o smtplib já enviou RSET, a conexão continua válida
+                self.release(connection)
+                if on_result:
+                    error = e.smtp_error.decode(errors='replace') if isinstance(e.smtp_error, bytes) else str(e.smtp_error)
+                    on_result(msg['To'], False, f"{e.smtp_code} {error}", msg['Message-ID'])
+                return False
+            except (smtplib.SMTPServerDisconnected, OSError):
+                self.release(connection, broken=True)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self.release(connection, broken=True)
+                raise
+            connection.messages += 1
+            self.release(connection)
+            return accepted
+
+    def _keepalive_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.keepalive_interval)
+                if self._closed:
+                    return
+                now = time.monotonic()
+                stale = [c for c in self._idle if now - c.last_used >= self.keepalive_interval]
+                for connection in stale:
+                    self._idle.remove(connection)
+            for connection in stale:
+                try:
+                    code, _ = connection.server.noop()
+                    healthy = code == 250
+                except Exception:
+                    healthy = False
+                self.release(connection, broken=not healthy)
+
+    def transcripts(self):
+        """Transcrição SMTP recente de cada conexão ociosa (as em uso estão no meio de um envio)."""
+        with self._cond:
+            idle = list(self._idle)
+        return [c.server.transcript.format() for c in idle if getattr(c.server, 'transcript', None) is not None]
+
+    def stats(self):
+        with self._cond:
+            return {'open': self._open, 'idle': len(self._idle), 'size': self.size}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for connection in idle:
+            _quit(connection)
+
+
+def _quit(connection):
+    try:
+        connection.server.quit()
+    except Exception:
+        try:
+            connection.server.close()
+        except Exception:
+            pass
@@ -0,0 +1,141 @@
+import os
+import time
+import itertools
+import threading
+from collections import deque
+
+DEFAULT_MAX_LINES = 100
+MAX_LINE_CHARS = 500
+MAX_RECENT_DUMPS = 20
+
+_REDACTED = '<credenciais omitidas>'
+_connection_ids = itertools.count(1)
+
+
+class SmtpTranscript:
+    """
+    Últimos comandos e respostas de uma conexão SMTP, em um buffer circular.
+
+    O registro só guarda referências (a decodificação e a formatação ficam para
+    o dump), então pode ficar ligado em produção. Credenciais do AUTH são
+    substituídas já no registro e o conteúdo das mensagens vira só o tamanho.
+    """
+
+    __slots__ = ('label', 'lines', '_in_auth', '_in_data')
+
+    def __init__(self, label='', max_lines=DEFAULT_MAX_LINES):
+        self.label = label
+        self.lines = deque(maxlen=max_lines)
+        self._in_auth = False
+        self._in_data = False
+
+    def sent(self, data):
+        if self._in_data:
+            # Depois do 354, o smtplib envia a mensagem inteira em uma única chamada
+            self._in_data = False
+            data = f'<conteúdo da mensagem: {len(data)} bytes>'
+        elif self._in_auth:
+            data = _REDACTED
+        elif data[:5].upper() in ('AUTH ', b'AUTH '):
+            mechanism = data.split()[1]
+            if isinstance(mechanism, bytes):
+                mechanism = mechanism.decode('ascii', 'replace')
+            data = f'AUTH {mechanism} {_REDACTED}'
+            self._in_auth = True
+        self.lines.append((time.time(), 'C', data))
+
+    def received(self, code, message):
+        if self._in_auth and code != 334:
+            self._in_auth = False
+        elif code == 354:
+            self._in_data = True
+        self.lines.append((time.time(), 'S', (code, message)))
+
+    def note(self, text):
+        self.lines.append((time.time(), '*', text))
+
+    def format(self, reason=''):
+        title = f'--- Transcrição SMTP ({self.label})' + (f': {reason}' if reason else '') + ' ---'
+        output = [title]
+        for timestamp, direction, data in list(self.lines):
+            clock = time.strftime('%H:%M:%S', time.localtime(timestamp)) + f'.{int(timestamp % 1 * 1000):03d}'
+            if direction == 'S':
+                code, message = data
+                if isinstance(message, bytes):
+                    message = message.decode('utf-8', 'replace')
+                # Respostas de várias linhas (ex.: EHLO) voltam unidas por \n
+                for line in message.split('\n') or ['']:
+                    output.append(f'{clock} S: {code} {_clip(line)}')
+                continue
+            if isinstance(data, bytes):
+                data = data.decode('utf-8', 'replace')
+            output.append(f'{clock} {direction}: {_clip(data.rstrip())}')
+        return '\n'.join(output)
+
+
+def _clip(text):
+    return text if len(text) <= MAX_LINE_CHARS else text[:MAX_LINE_CHARS] + '…'
+
+
+def record_transcript(server, address='', max_lines=DEFAULT_MAX_LINES):
+    """Passa a registrar os comandos e respostas da conexão em server.transcript."""
+    transcript = SmtpTranscript(f'conexão {next(_connection_ids)}' + (f', {address}' if address else ''), max_lines)
+    send, getreply = server.send, server.getreply
+
+    def recording_send(data):
+        transcript.sent(data)
+        return send(data)
+
+    def recording_getreply():
+        try:
+            code, message = getreply()
+        except Exception as e:
+            transcript.note(f'{type(e).__name__}: {e}')
+            raise
+        transcript.received(code, message)
+        return code, message
+
+    server.send = recording_send
+    server.getreply = recording_getreply
+    server.transcript = transcript
+    return transcript
+
+
+class TranscriptLog:
+    """
+    Destino das transcrições despejadas em falhas: o console, os últimos
+    MAX_RECENT_DUMPS em memória (GET /transcripts no serviço) e, com `dump_dir`,
+    o arquivo smtp_transcripts.log.
+    """
+
+    def __init__(self):
+        self.dump_dir = None
+        self._recent = deque(maxlen=MAX_RECENT_DUMPS)
+        self._lock = threading.Lock()
+
+    def dump(self, server, reason):
+        """Despeja a transcrição da conexão. Retorna o texto, ou None se a conexão não tem transcrição."""
+        transcript = getattr(server, 'transcript', None)
+        if transcript is None:
+            return None
+        text = transcript.format(reason)
+        print(text)
+        with self._lock:
+            self._recent.append({'time': time.time(), 'connection': transcript.label,
+                                 'reason': reason, 'transcript': text})
+            if self.dump_dir:
+                try:
+                    os.makedirs(self.dump_dir, exist_ok=True)
+                    with open(os.path.join(self.dump_dir, 'smtp_transcripts.log'), 'a', encoding='utf-8') as f:
+                        f.write(time.strftime('%Y-%m-%d %H:%M:%S ') + text + '\n\n')
+                except OSError as e:
+                    print(f"Não foi possível gravar a transcrição SMTP: {e}")
+        return text
+
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
+
+
+# Instância usada pelo envio (email_sender, pool e serviço)
+transcripts = TranscriptLog()
@@ -0,0 +1,298 @@
+import os
+import mmap
+import time
+import struct
+import hashlib
+import threading
+import numpy as np
+
+# Motivos de supressão (armazenados como bits, um endereço pode ter vários)
+UNSUBSCRIBED = 0x01
+BOUNCED = 0x02
+SENT = 0x04
+
+_INDEX_MAGIC = b'MFSUPIX1'
+_BLOOM_MAGIC = b'MFSUPBF1'
+_HEADER = struct.Struct('<8sQ')            # magic, quantidade de registros
+_BLOOM_HEADER = struct.Struct('<8sQI')     # magic, bits, funções de hash
+_BITS_PER_ENTRY = 10
+_NUM_HASHES = 7
+_COMPACT_THRESHOLD = 50000
+
+
+def normalize_email(email):
+    """Normaliza um endereço para comparação (sem espaços, minúsculo)."""
+    return email.strip().lower()
+
+
+def _digest(email):
+    """Retorna a chave de 64 bits de um endereço."""
+    d = hashlib.blake2b(normalize_email(email).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(d, 'little')
+
+
+def _bloom_positions(keys, num_bits, num_hashes):
+    # Double hashing com as duas metades da chave: o filtro pode ser
+    # reconstruído apenas a partir das chaves do índice.
+    h1 = keys & np.uint64(0xFFFFFFFF)
+    h2 = (keys >> np.uint64(32)) | np.uint64(1)
+    m = np.uint64(num_bits)
+    for i in range(num_hashes):
+        yield (h1 + np.uint64(i) * h2) % m
+
+
+def _lookup_sorted(sorted_keys, sorted_stamps, sorted_flags, keys):
+    """Busca vetorizada de várias chaves em um conjunto ordenado."""
+    stamps = np.zeros(len(keys), dtype='<u4')
+    flags = np.zeros(len(keys), dtype='u1')
+    if len(sorted_keys) and len(keys):
+        pos = np.searchsorted(sorted_keys, keys)
+        pos[pos == len(sorted_keys)] = 0
+        hit = sorted_keys[pos] == keys
+        stamps[hit] = sorted_stamps[pos[hit]]
+        flags[hit] = sorted_flags[pos[hit]]
+    return stamps, flags
+
+
+class SuppressionStore:
+    """
+    Lista local de supressão (descadastros, bounces e envios recentes).
+
+    Os endereços são guardados como hashes de 64 bits em um índice ordenado no disco,
+    lido via mmap. Um filtro de Bloom na frente do índice descarta a maioria dos
+    candidatos antes da busca. Novas entradas vão para um journal (append-only) e são
+    incorporadas ao índice em `compact()`.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_file = os.path.join(directory, 'index.bin')
+        self.bloom_file = os.path.join(directory, 'bloom.bin')
+        self.journal_file = os.path.join(directory, 'journal.log')
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_arrays = None
+        self._journal = None
+        self._index_fp = None
+        self._index_map = None
+        self._keys = self._stamps = self._flags = None
+        self._bloom_bits = None
+        self._bloom_hashes = _NUM_HASHES
+
+        self._open_index()
+        self._load_journal()
+
+    # --- Leitura ---
+
+    def _open_index(self):
+        if not os.path.exists(self.index_file) or os.path.getsize(self.index_file) <= _HEADER.size:
+            return
+
+        self._index_fp = open(self.index_file, 'rb')
+        self._index_map = mmap.mmap(self._index_fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._index_map, 0)
+        if magic != _INDEX_MAGIC:
+            print(f"Índice de supressão inválido, ignorando: {self.index_file}")
+            self._close_index()
+            return
+
+        offset = _HEADER.size
+        self._keys = np.frombuffer(self._index_map, dtype='<u8', count=count, offset=offset)
+        offset += count * 8
+        self._stamps = np.frombuffer(self._index_map, dtype='<u4', count=count, offset=offset)
+        offset += count * 4
+        self._flags = np.frombuffer(self._index_map, dtype='u1', count=count, offset=offset)
+
+        try:
+            with open(self.bloom_file, 'rb') as f:
+                magic, num_bits, num_hashes = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+                if magic == _BLOOM_MAGIC:
+                    self._bloom_bits = np.frombuffer(f.read(), dtype='u1')
+                    self._bloom_hashes = num_hashes
+        except (OSError, struct.error) as e:
+            print(f"Filtro de Bloom indisponível, usando apenas o índice: {e}")
+
+    def _close_index(self):
+        # As views numpy precisam ser liberadas antes de fechar o mmap
+        self._keys = self._stamps = self._flags = None
+        self._bloom_bits = None
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_map = None
+        if self._index_fp is not None:
+            self._index_fp.close()
+            self._index_fp = None
+
+    def _load_journal(self):
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, 'r', encoding='ascii') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 3:
+                    continue
+                self._merge_pending(int(parts[0], 16), int(parts[1]), int(parts[2]))
+
+    def _merge_pending(self, key, ts, flags):
+        old_ts, old_flags = self._pending.get(key, (0, 0))
+        self._pending[key] = (max(old_ts, ts), old_flags | flags)
+        self._pending_arrays = None
+
+    def _get_pending_arrays(self):
+        if self._pending_arrays is None:
+            items = sorted(self._pending.items())
+            self._pending_arrays = (
+                np.fromiter((k for k, _ in items), dtype='<u8', count=len(items)),
+                np.fromiter((v[0] for _, v in items), dtype='<u4', count=len(items)),
+                np.fromiter((v[1] for _, v in items), dtype='u1', count=len(items)),
+            )
+        return self._pending_arrays
+
+    def _lookup_many(self, keys):
+        stamps = np.zeros(len(keys), dtype='<u4')
+        flags = np.zeros(len(keys), dtype='u1')
+
+        if self._keys is not None and len(self._keys):
+            candidates = np.ones(len(keys), dtype=bool)
+            if self._bloom_bits is not None:
+                num_bits = len(self._bloom_bits) * 8
+                for pos in _bloom_positions(keys, num_bits, self._bloom_hashes):
+                    byte = self._bloom_bits[pos >> np.uint64(3)]
+                    candidates &= ((byte >> (pos & np.uint64(7)).astype('u1')) & 1).astype(bool)
+            found_stamps, found_flags = _lookup_sorted(self._keys, self._stamps, self._flags, keys[candidates])
+            stamps[candidates] = found_stamps
+            flags[candidates] = found_flags
+
+        if self._pending:
+            p_stamps, p_flags = _lookup_sorted(*self._get_pending_arrays(), keys)
+            np.maximum(stamps, p_stamps, out=stamps)
+            np.bitwise_or(flags, p_flags, out=flags)
+        return stamps, flags
+
+    def __len__(self):
+        """Endereços distintos registrados (no índice, no journal ou em ambos)."""
+        with self._lock:
+            indexed = len(self._keys) if self._keys is not None else 0
+            if not self._pending:
+                return indexed
+            p_keys = self._get_pending_arrays()[0]
+            if not indexed:
+                return len(p_keys)
+            # Reenvios e bounces de quem já está no índice não contam duas vezes
+            pos = np.minimum(np.searchsorted(self._keys, p_keys), indexed - 1)
+            repeated = int(np.count_nonzero(self._keys[pos] == p_keys))
+            return indexed + len(p_keys) - repeated
+
+    def is_suppressed(self, email, recent_days=0):
+        kept, _ = self.filter_recipients([email], recent_days)
+        return not kept
+
+    def filter_recipients(self, emails, recent_days=0):
+        """
+        Remove da lista os endereços suprimidos em uma única passagem.
+        Se recent_days > 0, também remove quem recebeu um envio nos últimos N dias.
+        Retorna (emails mantidos, quantidade removida).
+        """
+        emails = list(emails)
+        keys = np.fromiter((_digest(e) for e in emails), dtype='<u8', count=len(emails))
+        with self._lock:
+            stamps, flags = self._lookup_many(keys)
+
+        suppressed = (flags & (UNSUBSCRIBED | BOUNCED)) != 0
+        if recent_days:
+            cutoff = int(time.time() - recent_days * 86400)
+            suppressed |= ((flags & SENT) != 0) & (stamps >= cutoff)
+
+        kept = [e for e, s in zip(emails, suppressed.tolist()) if not s]
+        return kept, len(emails) - len(kept)
+
+    # --- Escrita ---
+
+    def add(self, email, reason, timestamp=None):
+        """Registra um endereço no journal com o motivo informado."""
+        self.add_many([email], reason, timestamp)
+
+    def add_many(self, emails, reason, timestamp=None):
+        ts = int(timestamp if timestamp is not None else time.time())
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.journal_file, 'a', encoding='ascii')
+            lines = []
+            for email in emails:
+                if not email or not email.strip():
+                    continue
+                key = _digest(email)
+                self._merge_pending(key, ts, reason)
+                lines.append(f"{key:016x} {ts} {reason}\n")
+            self._journal.writelines(lines)
+            self._journal.flush()
+            needs_compact = len(self._pending) >= _COMPACT_THRESHOLD
+        if needs_compact:
+            self.compact()
+
+    def record_delivery(self, recipient, success, response='', message_id=None):
+        """
+        Atualiza a lista a partir do resultado de um envio: sucesso conta como envio
+        recente; recusas permanentes (5xx) do servidor contam como bounce.
+        """
+        if success:
+            self.add(recipient, SENT)
+        elif str(response).strip().startswith('5'):
+            self.add(recipient, BOUNCED)
+
+    def compact(self):
+        """Incorpora o journal ao índice ordenado e reconstrói o filtro de Bloom."""
+        with self._lock:
+            if not self._pending:
+                return
+            p_keys, p_stamps, p_flags = self._get_pending_arrays()
+            if self._keys is not None:
+                all_keys = np.concatenate([self._keys, p_keys])
+                all_stamps = np.concatenate([self._stamps, p_stamps])
+                all_flags = np.concatenate([self._flags, p_flags])
+            else:
+                all_keys, all_stamps, all_flags = p_keys, p_stamps, p_flags
+
+            order = np.argsort(all_keys, kind='stable')
+            all_keys, all_stamps, all_flags = all_keys[order], all_stamps[order], all_flags[order]
+            keys, starts = np.unique(all_keys, return_index=True)
+            stamps = np.maximum.reduceat(all_stamps, starts)
+            flags = np.bitwise_or.reduceat(all_flags, starts)
+
+            num_bits = max(64, len(keys) * _BITS_PER_ENTRY)
+            num_bits += -num_bits % 8
+            bloom = np.zeros(num_bits // 8, dtype='u1')
+            for pos in _bloom_positions(keys, num_bits, _NUM_HASHES):
+                bits = np.left_shift(np.uint8(1), (pos & np.uint64(7)).astype('u1'))
+                np.bitwise_or.at(bloom, pos >> np.uint64(3), bits)
+
+            with open(self.index_file + '.tmp', 'wb') as out:
+                out.write(_HEADER.pack(_INDEX_MAGIC, len(keys)))
+                out.write(keys.astype('<u8').tobytes())
+                out.write(stamps.astype('<u4').tobytes())
+                out.write(flags.astype('u1').tobytes())
+            with open(self.bloom_file + '.tmp', 'wb') as out:
+                out.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, num_bits, _NUM_HASHES))
+                out.write(bloom.tobytes())
+
+            del all_keys, all_stamps, all_flags, order
+            self._close_index()
+            os.replace(self.index_file + '.tmp', self.index_file)
+            os.replace(self.bloom_file + '.tmp', self.bloom_file)
+
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            os.remove(self.journal_file)
+            self._pending = {}
+            self._pending_arrays = None
+            self._open_index()
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self._close_index()
@@ -0,0 +1,59 @@
+import os
+
+from core.html_compiler import HtmlCompileCache, build_export_document, build_send_document
+from core.css_inliner import inline_css
+from core.html_minifier import minify_html
+from core.tracing import tracer
+
+PROJECT_EXTENSION = '.mf'
+TARGET_EXPORT = 'export'
+TARGET_SEND = 'send'
+
+
+def build_email_html(raw_html, target=TARGET_SEND, bg_color=None, minify=True, cache=None):
+    """
+    Gera o HTML final a partir do HTML bruto do editor (conteúdo de um .mf).
+    target='send' produz o corpo da mensagem (CSS inlinado), target='export' o
+    documento completo salvo por "Exportar para HTML".
+    """
+    with tracer.span('render', 'render', {'target': target}):
+        clean_html = cache.compile(raw_html) if cache is not None else HtmlCompileCache().compile(raw_html)
+        if target == TARGET_EXPORT:
+            html = build_export_document(clean_html)
+        else:
+            with tracer.span('inline_css', 'render'):
+                html = inline_css(build_send_document(clean_html, bg_color))
+        if not minify:
+            return html
+        with tracer.span('minify', 'render'):
+            return minify_html(html)
+
+
+def load_project(filepath):
+    """Lê o HTML bruto de um projeto .mf."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def find_projects(directory, recursive=False):
+    """Lista os projetos .mf de uma pasta, em ordem alfabética."""
+    projects = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        projects.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(PROJECT_EXTENSION))
+        if not recursive:
+            break
+    return projects
+
+
+def build_project(filepath, output_path, target=TARGET_EXPORT, bg_color=None, minify=True, cache=None):
+    """Compila um projeto .mf e grava o resultado. Retorna (sucesso, mensagem, tamanho em bytes)."""
+    try:
+        html = build_email_html(load_project(filepath), target, bg_color, minify, cache)
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        return True, f"{filepath} -> {output_path}", len(html.encode('utf-8'))
+    except Exception as e:
+        return False, f"Erro ao compilar {filepath}: {e}", 0
@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+
+ENV_VAR = 'MAILFORGE_TRACE'
+DEFAULT_MAX_EVENTS = 200_000
+
+
+class _NullSpan:
+    """Span usado com o tracer desligado: não registra nada."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'category', 'args', 'started')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        self.tracer._record(self.name, self.category, self.started, ended - self.started, self.args)
+        return False
+
+
+class Tracer:
+    """
+    Registra trechos (spans) do envio por thread e processo e grava no formato
+    Trace Event do Chrome, que abre no Perfetto (ui.perfetto.dev) e em chrome://tracing.
+
+    Os eventos ficam em um buffer circular de `max_events`: em campanhas longas
+    o arquivo traz o trecho mais recente, sem crescer sem limite.
+    Desligado (padrão), span() devolve um objeto que não faz nada.
+    """
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        self.enabled = False
+        self.path = None
+        self._events = deque(maxlen=max_events)
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def enable(self, path=None, max_events=None):
+        """Liga o tracer. Com `path`, o arquivo é gravado ao encerrar o processo."""
+        if max_events:
+            self._events = deque(self._events, maxlen=max_events)
+        if path and self.path is None:
+            atexit.register(self._write_at_exit)
+        self.path = path or self.path
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, category='mailforge', args=None):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def _record(self, name, category, started_ns, duration_ns, args):
+        tid = threading.get_native_id()
+        if tid not in self._threads:
+            with self._lock:
+                self._threads[tid] = threading.current_thread().name
+        # deque.append é atômico: o caminho quente não usa lock
+        self._events.append((name, category, started_ns, duration_ns, tid, args))
+
+    def clear(self):
+        self._events.clear()
+
+    def events(self):
+        """Eventos no formato Trace Event (ts e dur em microssegundos)."""
+        pid = os.getpid()
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': f'MailForge ({pid})'}},
+        ]
+        with self._lock:
+            threads = dict(self._threads)
+        for tid, thread_name in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+        for name, category, started_ns, duration_ns, tid, args in list(self._events):
+            event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': started_ns / 1000, 'dur': duration_ns / 1000}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return events
+
+    def write(self, path=None):
+        """Grava o arquivo .json do trace. Retorna o caminho."""
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        partial = path + '.tmp'
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f)
+        os.replace(partial, path)
+        return path
+
+    def _write_at_exit(self):
+        if self.path and self._events:
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Não foi possível gravar o trace em {self.path}: {e}")
+
+
+def trace_smtp_commands(server, connection=None):
+    """
+    Registra MAIL, RCPT e DATA de uma conexão smtplib como spans filhos do envio
+    (o intervalo antes do MAIL é a serialização da mensagem).
+    """
+    if not tracer.enabled:
+        return server
+    args = {'connection': connection} if connection is not None else None
+    for command in ('mail', 'rcpt', 'data'):
+        method = getattr(server, command)
+
+        def traced(*a, _method=method, _name=command.upper(), **kw):
+            with tracer.span(_name, 'smtp', args):
+                return _method(*a, **kw)
+
+        setattr(server, command, traced)
+    return server
+
+
+# Instância usada pelo aplicativo; MAILFORGE_TRACE=<arquivo.json> liga o tracer
+tracer = Tracer()
+if os.environ.get(ENV_VAR):
+    tracer.enable(os.environ[ENV_VAR])
@@ -0,0 +1 @@
+"""Ferramentas de linha de comando do MailForge (sem interface gráfica)."""
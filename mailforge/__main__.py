@@ -0,0 +1,6 @@
+import sys
+
+from mailforge.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,474 @@
+"""
+Benchmarks reprodutíveis dos trechos mais pesados do MailForge, com dados sintéticos
+gerados a partir de uma semente fixa:
+
+- clean_html: compilação do HTML do editor (10 a 2.000 componentes) e o HTML final de envio
+- images: process_images_in_html com muitas imagens locais, com o cache de otimização
+  vazio (tudo reprocessado) e já preenchido
+- mime: montagem e serialização da mensagem com anexos de vários tamanhos
+- excel: get_emails_from_excel em planilhas de 10 mil a 1 milhão de linhas
+- send: envio de ponta a ponta contra o SMTP local (mailforge.testing)
+
+O resultado é um JSON; com --baseline, cada caso é comparado à execução de
+referência e o comando termina com código 1 se algum ficar mais lento que o limite.
+
+    python -m mailforge.benchmarks -o bench.json
+    python -m mailforge.benchmarks --baseline bench.json --threshold 0.15
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+EXIT_ERROR = 2
+
+DEFAULT_THRESHOLD = 0.10
+RESULTS_VERSION = 1
+
+# Tamanhos de cada suíte por perfil
+PROFILES = {
+    'quick': {
+        'clean_html': [10, 200], 'images': [10, 100], 'mime': [0, 100_000, 1_000_000],
+        'excel': [10_000], 'send': [200],
+    },
+    'default': {
+        'clean_html': [10, 100, 500, 2000], 'images': [10, 100, 500], 'mime': [0, 100_000, 1_000_000, 10_000_000],
+        'excel': [10_000, 100_000], 'send': [1000],
+    },
+    'full': {
+        'clean_html': [10, 100, 500, 2000], 'images': [10, 100, 500, 2000],
+        'mime': [0, 100_000, 1_000_000, 10_000_000], 'excel': [10_000, 100_000, 1_000_000], 'send': [1000, 5000],
+    },
+}
+
+_PLACEHOLDER = '<div class="placeholder-text" style="color: #999; font-style: italic;">Arraste componentes para esta coluna</div>'
+_WORDS = ('oferta', 'cliente', 'novidade', 'produto', 'desconto', 'evento', 'inscrição', 'confira', 'hoje', 'você')
+
+
+# --- Dados sintéticos ---
+
+def generate_template(components, seed=0, image_paths=None):
+    """
+    HTML do editor (innerHTML da área de edição, como salvo no .mf) com `components`
+    componentes dos mesmos tipos e estilos que o EmailEditor cria, incluindo colunas aninhadas.
+    """
+    rng = random.Random(seed)
+    images = list(image_paths or ['https://via.placeholder.com/600x150.png'])
+
+    def sentence():
+        return ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(4, 14))).capitalize()
+
+    def component(i, depth):
+        kind = rng.choice(('text', 'text', 'text', 'image', 'button', 'spacer', 'divider',
+                           'columns', 'columns', 'rows', 'center', 'social', 'video', 'html'))
+        if depth >= 2 and kind in ('columns', 'rows', 'center'):
+            kind = 'text'
+        cid = f'comp-{seed}-{i}-{depth}'
+        if kind == 'text':
+            return (f'<div class="editable-component" data-id="{cid}" data-type="text" style="height: 50px;">'
+                    f'<span class="text-content">{sentence()} <b>{rng.choice(_WORDS)}</b> &amp; {sentence()}</span></div>')
+        if kind == 'image':
+            return (f'<div style="text-align: left;"><img src="{rng.choice(images)}" alt="Imagem" '
+                    f'class="editable-component" data-id="{cid}" data-type="image" style="width: 300px;"></div>')
+        if kind == 'button':
+            return (f'<div style="text-align: center;"><a href="https://exemplo.com.br/?c={i}" class="editable-component" '
+                    f'data-id="{cid}" data-type="button" style="display:inline-block; padding: 12px 25px; '
+                    f'background-color: #3498db; color: white; text-decoration: none; border-radius: 5px; '
+                    f'font-weight: bold;">{rng.choice(_WORDS).capitalize()}</a></div>')
+        if kind == 'spacer':
+            return f'<div class="editable-component" data-id="{cid}" data-type="spacer" style="height: 20px; font-size: 1px;"> </div>'
+        if kind == 'divider':
+            return (f'<hr class="editable-component" data-id="{cid}" data-type="divider" '
+                    f'style="border: 0; border-top: 1px solid #ccc; margin: 20px 0;">')
+        if kind in ('columns', 'rows'):
+            count = rng.choice((2, 3))
+            names = {2: 'two', 3: 'three'}
+            cells = ''.join(
+                f'<div class="{"column" if kind == "columns" else "row"} drop-column" style="flex: 1; min-width: 150px; '
+                f'min-height: 50px; border: 1px dashed #ccc; padding: 10px;">'
+                f'{component(i * 10 + c, depth + 1) if rng.random() < 0.8 else _PLACEHOLDER}</div>'
+                for c in range(count)
+            )
+            direction = '' if kind == 'columns' else ' flex-direction: column;'
+            return (f'<div class="editable-component" data-id="{cid}" data-type="{names[count]}-{kind}" '
+                    f'style="display: flex; flex-wrap: wrap;{direction} gap: 20px; margin-bottom: 20px;">{cells}</div>')
+        if kind == 'center':
+            return (f'<div class="editable-component drop-column" data-id="{cid}" data-type="center" style="display: flex; '
+                    f'flex-direction: column; justify-content: center; align-items: center; padding: 15px; '
+                    f'border: 1px solid transparent; background-color: transparent; width: 100%; height: 100%; '
+                    f'min-height: 50px; box-sizing: border-box;">{component(i * 10 + 1, depth + 1)}</div>')
+        if kind == 'social':
+            links = ''.join(
+                f'<a href="https://{network}.com" target="_blank" style="display: inline-block; margin: 0 10px;" '
+                f'class="social-icon" data-network="{network}"><img src="{rng.choice(images)}" width="32" height="32" '
+                f'alt="{network}" style="border: none;"></a>'
+                for network in ('facebook', 'instagram', 'linkedin')
+            )
+            return (f'<div class="editable-component" data-id="{cid}" data-type="social" '
+                    f'style="text-align: center; margin: 20px 0;">{links}</div>')
+        if kind == 'video':
+            return (f'<div class="editable-component" data-id="{cid}" data-type="video" style="margin: 20px 0; text-align: center;">'
+                    f'<div style="position: relative; padding-bottom: 56.25%; height: 0; overflow: hidden; max-width: 100%;">'
+                    f'<img src="https://via.placeholder.com/600x338.png" alt="Thumbnail do vídeo" style="position: absolute; '
+                    f'top: 0; left: 0; width: 100%; height: 100%;" data-video-url="https://www.youtube.com/embed/x" '
+                    f'class="video-thumbnail"></div><p style="margin-top: 10px; font-style: italic; color: #666;">'
+                    f'{sentence()}</p></div>')
+        code = f'<table width="100%"><tr><td style="padding: 8px;">{sentence()}</td></tr></table>'
+        escaped = code.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
+        return (f'<div class="editable-component" data-id="{cid}" data-type="html" data-raw-html="{escaped}" '
+                f'style="margin: 20px 0; border: 1px dashed #ccc; padding: 15px;">'
+                f'<div class="html-content-view" style="font-family: monospace; white-space: pre-wrap;">{code}</div></div>')
+
+    return '\n'.join(component(i, 0) for i in range(components))
+
+
+def generate_files(directory, count, size, extension, seed=0):
+    """Cria `count` arquivos de `size` bytes aleatórios (reaproveitados entre execuções)."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'bench_{size}_{i}{extension}')
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            with open(path, 'wb') as f:
+                f.write(rng.randbytes(size))
+        paths.append(path)
+    return paths
+
+
+def generate_images(directory, count, width=1600, height=500, seed=0):
+    """
+    Cria `count` PNGs decodificáveis, maiores que a largura do email (o otimizador
+    redimensiona e regrava todos), com gradiente e formas aleatórias como um banner.
+    """
+    from PIL import Image, ImageDraw
+
+    os.makedirs(directory, exist_ok=True)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'bench_{width}x{height}_{i}.png')
+        if not os.path.exists(path):
+            # Uma semente por imagem: a mesma imagem é gerada mesmo que só ela falte
+            rng = random.Random(seed * 1_000_003 + i)
+            colors = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+            image = Image.composite(Image.new('RGB', (width, height), colors[0]),
+                                    Image.new('RGB', (width, height), colors[1]), gradient)
+            draw = ImageDraw.Draw(image)
+            for _ in range(12):
+                x, y = rng.randrange(width), rng.randrange(height)
+                draw.ellipse((x, y, x + rng.randint(20, 300), y + rng.randint(20, 200)),
+                             fill=tuple(rng.randrange(256) for _ in range(3)))
+            image.save(path, 'PNG')
+        paths.append(path)
+    return paths
+
+
+def bench_image_optimizer(directory):
+    """Otimizador com o cache e o armazenamento de imagens em `directory`, fora da pasta de configuração."""
+    from core.image_optimizer import ImageOptimizer
+    from core.asset_store import AssetStore
+
+    return ImageOptimizer(cache_dir=os.path.join(directory, 'image_cache'),
+                          asset_store=AssetStore(os.path.join(directory, 'assets')))
+
+
+def generate_workbook(path, rows, seed=0):
+    """Planilha com as colunas Nome, Email e Arquivo (gerada uma vez e reaproveitada)."""
+    if os.path.exists(path):
+        return path
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Destinatarios')
+    sheet.append(['Nome', 'Email', 'Arquivo'])
+    for i in range(rows):
+        name = rng.choice(_WORDS)
+        # Algumas células vazias e repetidas, como nas listas reais
+        email = '' if i % 97 == 0 else f'{name}.{i % (rows - rows // 50)}@exemplo{i % 7}.com.br'
+        sheet.append([name.capitalize(), email, f'boleto_{i}.pdf'])
+    partial = path + '.tmp'
+    workbook.save(partial)
+    os.replace(partial, path)
+    return path
+
+
+# --- Suítes ---
+# Cada suíte gera casos (nome, parâmetros, função medida, repetições); a preparação fica fora da medição.
+
+def suite_clean_html(sizes, context):
+    from core.html_compiler import clean_html_for_sending, build_send_document
+    from core.css_inliner import CssInliner
+    from core.html_minifier import minify_html
+
+    for components in sizes:
+        raw_html = generate_template(components, seed=components)
+        params = {'components': components, 'bytes': len(raw_html)}
+        repeat = 3 if components >= 1000 else 7
+        yield f'clean_html[{components}]', params, lambda raw_html=raw_html: clean_html_for_sending(raw_html), repeat
+
+        # Compilação + CSS inline + minificação sem os caches: o HTML que vai para o envio
+        def send_html(raw_html=raw_html):
+            html = build_send_document(clean_html_for_sending(raw_html))
+            return minify_html(CssInliner().inline(html))
+
+        yield f'send_html[{components}]', params, send_html, repeat
+
+
+def suite_images(sizes, context):
+    import shutil
+    from core.email_sender import process_images_in_html
+
+    # Caches descartáveis dentro da pasta de dados, apagados no fim
+    runs_dir = os.path.join(context['data_dir'], 'image_runs')
+    shutil.rmtree(runs_dir, ignore_errors=True)
+    os.makedirs(runs_dir)
+    context['cleanup'].append(lambda: shutil.rmtree(runs_dir, ignore_errors=True))
+
+    for count in sizes:
+        paths = generate_images(os.path.join(context['data_dir'], 'images'), count)
+        html = generate_template(count, seed=count, image_paths=paths)
+        html += ''.join(f'<img src="{path}" alt="">' for path in paths)
+        params = {'images': count, 'image_px': '1600x500'}
+
+        def cold(html=html):
+            # Cache vazio a cada execução: mede a decodificação, o redimensionamento e a regravação
+            return process_images_in_html(html, bench_image_optimizer(tempfile.mkdtemp(dir=runs_dir)))
+
+        yield f'process_images[{count}]', params, cold, 3
+
+        # O aquecimento do measure() preenche o cache; as execuções medidas só o consultam
+        warm_optimizer = bench_image_optimizer(tempfile.mkdtemp(dir=runs_dir))
+        yield f'process_images_cached[{count}]', params, \
+            lambda html=html: process_images_in_html(html, warm_optimizer), 5
+
+
+def suite_mime(sizes, context):
+    from core.email_sender import prepare_shared_parts, build_message
+
+    html = generate_template(100, seed=1)
+    for size in sizes:
+        attachments = generate_files(os.path.join(context['data_dir'], 'attachments'), 1, size, '.pdf') if size else []
+        body, shared_parts = prepare_shared_parts(html, attachments, context['image_optimizer'])
+
+        def run(body=body, shared_parts=shared_parts):
+            msg = build_message('remetente@exemplo.com.br', 'cliente@exemplo.com.br', 'Benchmark', body, shared_parts)
+            return msg.as_bytes()
+
+        yield f'mime[{size}]', {'attachment_bytes': size}, run, 3 if size >= 10_000_000 else 9
+
+
+def suite_excel(sizes, context):
+    try:
+        from core.excel_reader import get_emails_from_excel
+    except ImportError as e:
+        print(f"Suíte excel ignorada: {e}", file=sys.stderr)
+        return
+
+    for rows in sizes:
+        path = generate_workbook(os.path.join(context['data_dir'], f'recipients_{rows}.xlsx'), rows)
+        yield f'excel[{rows}]', {'rows': rows}, lambda path=path: get_emails_from_excel(path), 1 if rows >= 1_000_000 else 3
+
+
+def suite_send(sizes, context):
+    from mailforge.testing import SmtpSink
+    from core.email_sender import send_email, prepare_shared_parts, build_message
+    from core.smtp_pool import SmtpConnectionPool
+
+    html = generate_template(100, seed=2)
+    sink = SmtpSink(keep_messages=0, latency={'DATA': context['send_latency']}).start()
+    context['cleanup'].append(sink.stop)
+    smtp_config = sink.smtp_config()
+
+    for count in sizes:
+        recipients = [f'cliente{i}@exemplo.com.br' for i in range(count)]
+        yield (f'send_email[{count}]', {'messages': count, 'data_latency_s': context['send_latency']},
+               lambda recipients=recipients: send_email(smtp_config, recipients, 'Benchmark', html,
+                                                        image_optimizer=context['image_optimizer']), 1)
+
+        def pooled(recipients=recipients, connections=4):
+            from concurrent.futures import ThreadPoolExecutor
+            pool = SmtpConnectionPool(smtp_config, size=connections, keepalive_interval=60)
+            body, shared_parts = prepare_shared_parts(html, None, context['image_optimizer'])
+            try:
+                with ThreadPoolExecutor(connections) as executor:
+                    list(executor.map(lambda r: pool.send(build_message(
+                        smtp_config['user'], r, 'Benchmark', body, shared_parts)), recipients))
+            finally:
+                pool.close()
+
+        yield (f'send_pool4[{count}]', {'messages': count, 'connections': 4, 'data_latency_s': context['send_latency']},
+               pooled, 1)
+
+
+SUITES = {
+    'clean_html': suite_clean_html,
+    'images': suite_images,
+    'mime': suite_mime,
+    'excel': suite_excel,
+    'send': suite_send,
+}
+
+
+# --- Medição e comparação ---
+
+def measure(func, repeat):
+    """Executa `func` uma vez para aquecer e mais `repeat` vezes; retorna os tempos em segundos."""
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(timings, params):
+    median = statistics.median(timings)
+    result = {
+        'median_s': round(median, 6),
+        'min_s': round(min(timings), 6),
+        'max_s': round(max(timings), 6),
+        'runs': len(timings),
+        'params': params,
+    }
+    items = params.get('messages') or params.get('rows') or params.get('components') or params.get('images')
+    if items and median:
+        result['items_per_second'] = round(items / median, 1)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Compara as medianas com as da execução de referência. Retorna {caso: comparação}."""
+    comparison = {}
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if not reference or not reference.get('median_s'):
+            continue
+        ratio = result['median_s'] / reference['median_s']
+        comparison[name] = {
+            'baseline_s': reference['median_s'],
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1 + threshold,
+        }
+    return comparison
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(suites, profile='default', data_dir=None, send_latency=0.001, repeat=None, log=None):
+    """Executa as suítes informadas e retorna o documento de resultados."""
+    sizes = PROFILES[profile]
+    context = {
+        'data_dir': data_dir or os.path.join(tempfile.gettempdir(), 'mailforge-bench'),
+        'send_latency': send_latency,
+        'cleanup': [],
+    }
+    # Nenhuma suíte grava no cache de imagens da pasta de configuração do usuário
+    context['image_optimizer'] = bench_image_optimizer(context['data_dir'])
+    results = {}
+    try:
+        for suite in suites:
+            for name, params, func, default_repeat in SUITES[suite](sizes[suite], context):
+                timings = measure(func, repeat or default_repeat)
+                results[name] = summarize(timings, params)
+                if log:
+                    log(name, results[name])
+    finally:
+        for cleanup in context['cleanup']:
+            cleanup()
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'profile': profile,
+        'git': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m mailforge.benchmarks',
+                                     description="Benchmarks dos trechos críticos do MailForge.")
+    parser.add_argument('suites', nargs='*', metavar='SUITE',
+                        help=f"Suítes a executar ({', '.join(SUITES)}; padrão: todas).")
+    parser.add_argument('--profile', choices=list(PROFILES), default='default',
+                        help="Tamanhos dos dados: quick, default ou full (inclui planilha de 1 milhão de linhas).")
+    parser.add_argument('-o', '--output', help="Arquivo JSON de resultados (padrão: stdout).")
+    parser.add_argument('--baseline', help="Resultados de referência para comparar.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Aumento da mediana considerado regressão (0.10 = 10%%).")
+    parser.add_argument('--update-baseline', action='store_true', help="Grava os resultados no arquivo de --baseline.")
+    parser.add_argument('--repeat', type=int, help="Repetições por caso (padrão: depende do caso).")
+    parser.add_argument('--data-dir', help="Pasta dos dados gerados (padrão: pasta temporária, reaproveitada).")
+    parser.add_argument('--send-latency', type=float, default=0.001,
+                        help="Latência do SMTP local na resposta ao DATA, em segundos.")
+    args = parser.parse_args(argv)
+    unknown = [suite for suite in args.suites if suite not in SUITES]
+    if unknown:
+        parser.error(f"suíte desconhecida: {', '.join(unknown)}")
+
+    # Permite rodar a partir de qualquer pasta
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+
+    baseline = None
+    if args.baseline and not args.update_baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao ler a referência: {e}", file=sys.stderr)
+            return EXIT_ERROR
+
+    def log(name, result):
+        print(f"{name:<28} {result['median_s'] * 1000:>10.2f} ms  (min {result['min_s'] * 1000:.2f}, "
+              f"{result['runs']} execuções)", file=sys.stderr, flush=True)
+
+    document = run_benchmarks(args.suites or list(SUITES), args.profile, args.data_dir,
+                              args.send_latency, args.repeat, log)
+
+    exit_code = EXIT_OK
+    if baseline is not None:
+        document['baseline'] = {'git': baseline.get('git'), 'created': baseline.get('created'),
+                                'threshold': args.threshold}
+        document['comparison'] = compare(document['results'], baseline, args.threshold)
+        for name, item in document['comparison'].items():
+            mark = 'REGRESSÃO' if item['regression'] else 'ok'
+            print(f"{name:<28} {item['ratio']:>6.2f}x da referência  {mark}", file=sys.stderr)
+        if any(item['regression'] for item in document['comparison'].values()):
+            exit_code = EXIT_REGRESSION
+
+    output = json.dumps(document, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.update_baseline and args.baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,472 @@
+import os
+import sys
+import json
+import time
+import functools
+import contextlib
+import argparse
+from datetime import datetime
+
+# Os módulos do core são importados dentro de cada comando: o CLI roda em
+# servidores e no cron, e não deve carregar nada além do necessário (nem PySide6).
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_ERROR = 2
+
+
+def _build_outputs(inputs, output, recursive):
+    """Resolve os pares (projeto, arquivo de saída) a partir dos argumentos."""
+    from core.template_builder import find_projects
+
+    pairs = []
+    for path in inputs:
+        if os.path.isdir(path):
+            out_dir = output or path
+            for project in find_projects(path, recursive):
+                relative = os.path.relpath(project, path)
+                pairs.append((project, os.path.join(out_dir, os.path.splitext(relative)[0] + '.html')))
+        elif len(inputs) == 1 and output and not os.path.isdir(output):
+            pairs.append((path, output))
+        else:
+            name = os.path.splitext(os.path.basename(path))[0] + '.html'
+            pairs.append((path, os.path.join(output or os.path.dirname(path), name)))
+    return pairs
+
+
+def cmd_build(args):
+    from core.html_compiler import HtmlCompileCache
+    from core.template_builder import build_project
+
+    pairs = _build_outputs(args.inputs, args.output, args.recursive)
+    if not pairs:
+        print("Nenhum projeto .mf encontrado.", file=sys.stderr)
+        return EXIT_ERROR
+
+    # Um único cache para o lote: componentes repetidos entre templates são compilados uma vez
+    cache = HtmlCompileCache()
+    failures = 0
+    for project, output_path in pairs:
+        ok, message, size = build_project(project, output_path, args.target, args.bg_color, not args.no_minify, cache)
+        if not ok:
+            failures += 1
+            print(message, file=sys.stderr)
+            continue
+        kb = round(size / 1024, 1)
+        print(f"{message} ({kb} KB)")
+        if args.budget_kb and kb > args.budget_kb:
+            print(f"Aviso: {output_path} tem {kb} KB, acima do orçamento de {args.budget_kb} KB.", file=sys.stderr)
+    return EXIT_ERROR if failures else EXIT_OK
+
+
+def _emit(stream, event, **data):
+    """Escreve um evento JSON por linha (fácil de acompanhar em logs e scripts)."""
+    print(json.dumps(dict(event=event, **data), ensure_ascii=False), file=stream, flush=True)
+
+
+def cmd_send(args):
+    # O stdout fica reservado aos eventos JSON; mensagens dos módulos do core vão para o stderr
+    events = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.metrics:
+            from core.metrics import metrics
+            metrics.enable()
+        try:
+            return _send(args, functools.partial(_emit, events))
+        finally:
+            if args.metrics:
+                json_path, prom_path = metrics.write(args.metrics)
+                print(f"Métricas gravadas em {json_path} e {prom_path}.", file=sys.stderr)
+
+
+def _send(args, emit):
+    from core.smtp_credentials import load_smtp_config
+    from core.recipient_parser import load_recipients_file
+    from core.template_builder import load_project, build_email_html, TARGET_SEND
+    from core.html_minifier import check_size_budget
+
+    started = time.monotonic()
+    schedule_options = {
+        'start_at': args.start_at, 'window': args.window,
+        'rate_per_minute': args.rate_per_minute, 'daily_limit': args.daily_limit,
+    }
+    image_options = {'optimize': not args.no_optimize_images, 'webp': args.webp,
+                     'fetch_remote': args.fetch_remote_images, 'embed_max_kb': args.embed_max_kb}
+    tracker = None
+    if args.track_url:
+        from core.link_tracking import Tracker
+        try:
+            tracker = Tracker.from_dict({'base_url': args.track_url, 'clicks': not args.no_track_clicks,
+                                         'opens': not args.no_track_opens,
+                                         'unsubscribe_mailto': args.unsubscribe_mailto})
+        except (OSError, ValueError) as e:
+            print(str(e), file=sys.stderr)
+            return EXIT_ERROR
+    schedule = None
+    if any(schedule_options.values()):
+        from core.send_schedule import SendSchedule
+        try:
+            schedule = SendSchedule.from_dict(schedule_options)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return EXIT_ERROR
+
+    try:
+        smtp_config, source = load_smtp_config(args.credentials)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_ERROR
+    # Pelo serviço de envio, as credenciais usadas são as do serviço
+    if not args.daemon and (not smtp_config['user'] or not smtp_config['password']):
+        print(f"Credenciais de email não configuradas ({source}).", file=sys.stderr)
+        return EXIT_ERROR
+
+    recipients, recipient_attachments, message = load_recipients_file(args.recipients, args.column, args.attachment_column)
+    if recipients is None:
+        print(message, file=sys.stderr)
+        return EXIT_ERROR
+    print(message, file=sys.stderr)
+
+    personalizer = None
+    if args.personalized_images and not args.daemon:
+        # Pelo serviço, a especificação e a planilha são lidas e renderizadas lá
+        from core.recipient_parser import load_recipient_rows
+        from core.personalized_images import ImagePersonalizer
+        rows, message = load_recipient_rows(args.recipients, args.column)
+        if rows is None:
+            print(message, file=sys.stderr)
+            return EXIT_ERROR
+        try:
+            personalizer = ImagePersonalizer.load(args.personalized_images, rows)
+        except (OSError, ValueError) as e:
+            print(f"Erro na especificação das imagens personalizadas: {e}", file=sys.stderr)
+            return EXIT_ERROR
+
+    try:
+        raw_html = load_project(args.project)
+    except OSError as e:
+        print(f"Erro ao ler o projeto: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    # Um .html já compilado é enviado como está
+    html_body = raw_html if args.project.lower().endswith(('.html', '.htm')) else build_email_html(raw_html, TARGET_SEND, args.bg_color)
+
+    within_budget, size_message = check_size_budget(html_body, args.budget_kb)
+    if not within_budget:
+        print(f"Aviso: {size_message}", file=sys.stderr)
+
+    missing = [path for path in args.attach if not os.path.isfile(path)]
+    if missing:
+        print(f"Anexo não encontrado: {', '.join(missing)}", file=sys.stderr)
+        return EXIT_ERROR
+
+    from core.config_manager import ConfigManager
+    config_manager = ConfigManager()
+    suppressed = 0
+    suppression_store = None
+    if not args.no_suppression:
+        from core.suppression import SuppressionStore
+        suppression_store = SuppressionStore(config_manager.get_suppression_dir())
+        recipients, suppressed = suppression_store.filter_recipients(recipients, args.recent_days)
+
+    total = len(recipients)
+    emit('start', total=total, suppressed=suppressed, subject=args.subject, smtp_source=source,
+         schedule=schedule.to_dict() if schedule else None)
+    if args.dry_run or not total:
+        emit('summary', total=total, sent=0, failed=0, suppressed=suppressed, dry_run=args.dry_run,
+              elapsed_s=round(time.monotonic() - started, 3))
+        return EXIT_OK
+
+    if args.daemon:
+        if suppression_store is not None:
+            suppression_store.close()
+        payload = {
+            'subject': args.subject,
+            'html': html_body,
+            'recipients': recipients,
+            'recipient_attachments': recipient_attachments,
+            'attachments': [os.path.abspath(path) for path in args.attach],
+            # A lista já foi filtrada aqui; o serviço apenas registra os resultados
+            'filter_suppressed': False,
+            'priority': args.priority,
+            'schedule': schedule_options if schedule else None,
+            'images': image_options,
+            'tracking': tracker.to_dict() if tracker else None,
+        }
+        if args.personalized_images:
+            payload.update({'personalized_images': os.path.abspath(args.personalized_images),
+                            'recipients_file': os.path.abspath(args.recipients), 'column': args.column})
+        return _follow_daemon_job(config_manager.config_dir, payload, suppressed, emit, started)
+
+    from core.email_sender import send_email
+    from core.delivery_report import DeliveryLog
+    from core.image_optimizer import ImageOptimizer
+    from core.remote_assets import RemoteAssetFetcher
+
+    log_name = datetime.now().strftime('envio_%Y%m%d_%H%M%S.csv')
+    # O id opaco de cada destinatário no log liga cliques e descadastros ao endereço
+    delivery_log = DeliveryLog(os.path.join(config_manager.config_dir, 'delivery_logs', log_name),
+                               tracker.recipient_ids(recipients) if tracker else None)
+    counts = {'sent': 0, 'failed': 0}
+
+    def on_result(recipient, sent, response, message_id=None):
+        counts['sent' if sent else 'failed'] += 1
+        delivery_log.record(recipient, sent, response, message_id)
+        if suppression_store is not None:
+            suppression_store.record_delivery(recipient, sent, response, message_id)
+        emit('result', index=counts['sent'] + counts['failed'], total=total, recipient=recipient,
+              success=sent, response=str(response), message_id=message_id)
+
+    try:
+        success, message = send_email(
+            smtp_config, recipients, args.subject, html_body, args.attach,
+            on_result=on_result,
+            recipient_attachments=recipient_attachments,
+            schedule=schedule,
+            image_optimizer=ImageOptimizer.from_dict(image_options),
+            remote_fetcher=RemoteAssetFetcher.from_dict(image_options),
+            personalizer=personalizer,
+            tracker=tracker
+        )
+    finally:
+        delivery_log.close()
+        if suppression_store is not None:
+            suppression_store.close()
+
+    emit('summary', total=total, sent=counts['sent'], failed=counts['failed'], suppressed=suppressed,
+          success=success, message=message, delivery_log=delivery_log.path,
+          elapsed_s=round(time.monotonic() - started, 3))
+    if not success:
+        return EXIT_ERROR
+    return EXIT_PARTIAL if counts['failed'] else EXIT_OK
+
+
+def _follow_daemon_job(config_dir, payload, suppressed, emit, started):
+    """Envia a campanha ao serviço e repassa o progresso no mesmo formato do envio direto."""
+    from core.daemon_client import find_daemon, DaemonError
+
+    client = find_daemon(config_dir)
+    if client is None:
+        print("O serviço de envio não está rodando (inicie com 'mailforge daemon').", file=sys.stderr)
+        return EXIT_ERROR
+    try:
+        job = client.submit(payload)
+        emit('queued', job_id=job['id'], total=job['total'])
+        index = 0
+        for event in client.follow(job['id']):
+            if event['event'] == 'result':
+                index += 1
+                emit('result', index=index, total=job['total'], recipient=event['recipient'],
+                     success=event['success'], response=event['response'], message_id=event['message_id'])
+            elif event['event'] == 'finished':
+                job = event
+    except DaemonError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_ERROR
+
+    success = job['status'] == 'done'
+    emit('summary', total=job['total'], sent=job['sent'], failed=job['failed'], suppressed=suppressed,
+         success=success, message=job['message'], delivery_log=job['delivery_log'], job_id=job['id'],
+         elapsed_s=round(time.monotonic() - started, 3))
+    if not success:
+        return EXIT_ERROR
+    return EXIT_PARTIAL if job['failed'] else EXIT_OK
+
+
+def cmd_daemon(args):
+    from core.smtp_credentials import load_smtp_config
+    from core.config_manager import ConfigManager
+    from core.suppression import SuppressionStore
+    from core.sender_daemon import SenderDaemon
+    from core.dkim_signer import signer_for
+
+    config_manager = ConfigManager()
+    try:
+        smtp_config, source = load_smtp_config(args.credentials, config_manager)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_ERROR
+    if not smtp_config['user'] or not smtp_config['password']:
+        print(f"Credenciais de email não configuradas ({source}).", file=sys.stderr)
+        return EXIT_ERROR
+
+    if args.metrics:
+        from core.metrics import metrics
+        metrics.enable()
+
+    try:
+        signer = signer_for(smtp_config)
+    except (OSError, ValueError) as e:
+        # Chave ilegível ou configuração DKIM incompleta
+        print(f"Erro na configuração do DKIM: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    suppression_store = SuppressionStore(config_manager.get_suppression_dir())
+    try:
+        daemon = SenderDaemon(
+            smtp_config, config_manager.config_dir, port=args.port,
+            connections=args.connections, keepalive_interval=args.keepalive,
+            suppression_store=suppression_store, rate_per_minute=args.rate_per_minute,
+            reserved_connections=args.reserved_connections, reserved_rate=args.reserved_rate,
+            signer=signer
+        )
+    except (OSError, ValueError) as e:
+        suppression_store.close()
+        print(f"Não foi possível criar o serviço de envio: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    try:
+        daemon.start()
+    except OSError as e:
+        # Porta em uso ou pasta de configuração sem permissão de escrita
+        suppression_store.close()
+        print(f"Não foi possível iniciar o serviço de envio: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    print(f"Serviço de envio em http://{daemon.host}:{daemon.port} ({args.connections} conexões, {smtp_config['user']}).",
+          file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    finally:
+        suppression_store.close()
+    return EXIT_OK
+
+
+def cmd_jobs(args):
+    from core.config_manager import ConfigManager
+    from core.daemon_client import find_daemon, DaemonError
+
+    client = find_daemon(ConfigManager().config_dir)
+    if client is None:
+        print("O serviço de envio não está rodando.", file=sys.stderr)
+        return EXIT_ERROR
+    try:
+        result = client.cancel(args.cancel) if args.cancel else client.jobs()
+    except DaemonError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_ERROR
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return EXIT_OK
+
+
+def build_parser():
+    from core.html_minifier import DEFAULT_BUDGET_KB
+    from core.profiling import snapshot_interval, DEFAULT_SNAPSHOT_EVERY
+
+    parser = argparse.ArgumentParser(prog='mailforge', description="MailForge sem interface gráfica.")
+    parser.add_argument('--trace', metavar='ARQUIVO',
+                        help="Grava um trace (compilação, codificação e SMTP por thread) para o Perfetto/chrome://tracing.")
+    parser.add_argument('--profile', action='store_true',
+                        help="Executa o comando sob o cProfile (relatórios .pstats e .txt em --report-dir).")
+    parser.add_argument('--trace-malloc', action='store_true',
+                        help="Liga o tracemalloc para investigar o crescimento da memória (ver --snapshot-every).")
+    parser.add_argument('--snapshot-every', type=snapshot_interval, default=DEFAULT_SNAPSHOT_EVERY, metavar='N',
+                        help=f"Com --trace-malloc, um snapshot a cada N mensagens (padrão {DEFAULT_SNAPSHOT_EVERY}).")
+    parser.add_argument('--report-dir', help="Pasta dos relatórios de --profile/--trace-malloc (padrão: config/profiles).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="Compila projetos .mf em HTML de email.")
+    build.add_argument('inputs', nargs='+', help="Arquivos .mf ou pastas (modo em lote).")
+    build.add_argument('-o', '--output', help="Arquivo de saída, ou pasta de saída no modo em lote.")
+    build.add_argument('--target', choices=['export', 'send'], default='export',
+                       help="'export' gera o documento completo; 'send' gera o corpo enviado (CSS inlinado).")
+    build.add_argument('--bg-color', help="Cor de fundo do corpo (apenas --target send).")
+    build.add_argument('--no-minify', action='store_true', help="Não minifica o HTML gerado.")
+    build.add_argument('-r', '--recursive', action='store_true', help="Procura projetos nas subpastas.")
+    build.add_argument('--budget-kb', type=float, default=DEFAULT_BUDGET_KB,
+                       help="Avisa quando o HTML passa deste tamanho (0 desativa).")
+    build.set_defaults(func=cmd_build)
+
+    send = commands.add_parser(
+        'send', help="Envia um projeto para uma lista de destinatários.",
+        description="Envia um projeto .mf (ou um .html compilado). O progresso e o resumo são "
+                    "escritos no stdout como JSON, um evento por linha. Códigos de saída: "
+                    "0 sucesso, 1 algum destinatário falhou, 2 erro de configuração ou de envio."
+    )
+    send.add_argument('project', help="Projeto .mf ou HTML já compilado.")
+    send.add_argument('--recipients', required=True, help="Planilha (.xlsx), CSV com cabeçalho ou texto com um email por linha.")
+    send.add_argument('--subject', required=True, help="Assunto do email.")
+    send.add_argument('--attach', action='append', default=[], help="Anexo comum a todos (pode repetir).")
+    send.add_argument('--column', default='Email', help="Coluna com os emails (planilha/CSV).")
+    send.add_argument('--attachment-column', help="Coluna com o anexo individual de cada destinatário.")
+    send.add_argument('--credentials', help="Arquivo .env ou .json com as credenciais SMTP. "
+                                            "Sem ele, usa EMAIL_REMETENTE/EMAIL_PASSWORD do ambiente ou a configuração do aplicativo.")
+    send.add_argument('--bg-color', help="Cor de fundo do corpo.")
+    send.add_argument('--recent-days', type=int, default=0, help="Pula quem recebeu um envio nos últimos N dias.")
+    send.add_argument('--no-suppression', action='store_true', help="Não consulta nem atualiza a lista de supressão.")
+    send.add_argument('--budget-kb', type=float, default=DEFAULT_BUDGET_KB, help="Avisa quando o corpo passa deste tamanho.")
+    send.add_argument('--dry-run', action='store_true', help="Prepara tudo e lista os totais, sem enviar.")
+    send.add_argument('--daemon', action='store_true', help="Envia pela fila do serviço em segundo plano ('mailforge daemon').")
+    send.add_argument('--priority', choices=['high', 'bulk'], default='bulk',
+                      help="Fila no serviço (--daemon): high para envios transacionais, bulk para campanhas.")
+    send.add_argument('--start-at', help="Começa a enviar nesta data/hora (AAAA-MM-DD HH:MM, horário local).")
+    send.add_argument('--window', help="Envia só dentro desta janela diária (ex.: 08:00-18:00), "
+                                       "espaçando as mensagens pelo período e pausando fora dele.")
+    send.add_argument('--rate-per-minute', type=float, default=0, help="Limite de envios por minuto do provedor.")
+    send.add_argument('--daily-limit', type=int, default=0, help="Limite de envios por dia (ou por janela) do provedor.")
+    send.add_argument('--no-optimize-images', action='store_true',
+                      help="Envia as imagens locais como estão, sem redimensionar nem regravar.")
+    send.add_argument('--webp', choices=['off', 'if-smaller', 'always'], default='off',
+                      help="Usa WebP nas imagens otimizadas: nunca (padrão, o Outlook não exibe), "
+                           "quando fica menor, ou sempre.")
+    send.add_argument('--fetch-remote-images', action='store_true',
+                      help="Baixa as imagens http(s) uma vez e as embute quando pequenas; as maiores continuam como link.")
+    send.add_argument('--embed-max-kb', type=float, default=200,
+                      help="Tamanho máximo (já otimizada) de uma imagem remota embutida (padrão 200 KB).")
+    send.add_argument('--personalized-images', metavar='SPEC.json',
+                      help="Gera uma imagem por destinatário a partir das colunas da planilha "
+                           "(marcadores personalized:<nome> no HTML).")
+    send.add_argument('--track-url', metavar='URL',
+                      help="Endereço do servidor de rastreamento: reescreve os links, inclui o pixel de abertura "
+                           "e os cabeçalhos List-Unsubscribe, com um token assinado por destinatário.")
+    send.add_argument('--no-track-clicks', action='store_true', help="Com --track-url, não reescreve os links.")
+    send.add_argument('--no-track-opens', action='store_true', help="Com --track-url, não inclui o pixel de abertura.")
+    send.add_argument('--unsubscribe-mailto', metavar='EMAIL',
+                      help="Endereço de descadastro por email incluído no List-Unsubscribe.")
+    send.add_argument('--metrics', metavar='PREFIXO',
+                      help="Mede o tempo de cada etapa e grava PREFIXO.json e PREFIXO.prom (formato do Prometheus).")
+    send.set_defaults(func=cmd_send)
+
+    daemon = commands.add_parser('daemon', help="Inicia o serviço de envio em segundo plano.",
+                                 description="Mantém conexões SMTP autenticadas abertas e executa as campanhas "
+                                             "enviadas pelo aplicativo ou por 'mailforge send --daemon'.")
+    daemon.add_argument('--credentials', help="Arquivo .env ou .json com as credenciais SMTP.")
+    daemon.add_argument('--port', type=int, default=0, help="Porta em localhost (padrão: escolhida automaticamente).")
+    daemon.add_argument('--connections', type=int, default=2, help="Conexões SMTP simultâneas.")
+    daemon.add_argument('--keepalive', type=float, default=30, help="Intervalo do NOOP nas conexões ociosas (segundos).")
+    daemon.add_argument('--rate-per-minute', type=float, default=0,
+                        help="Limite de envios por minuto somando as duas filas (padrão: sem limite).")
+    daemon.add_argument('--reserved-connections', type=int, default=1,
+                        help="Conexões que a fila bulk não usa, reservadas para a high.")
+    daemon.add_argument('--reserved-rate', type=float, default=0.2,
+                        help="Fração do limite de envios guardada para a fila high (0 a 1).")
+    daemon.add_argument('--metrics', action='store_true',
+                        help="Mede o tempo de cada etapa do envio e expõe em GET /metrics (formato do Prometheus; "
+                             "autenticação Bearer com o token de config/daemon.token).")
+    daemon.set_defaults(func=cmd_daemon)
+
+    jobs = commands.add_parser('jobs', help="Lista as campanhas do serviço de envio.")
+    jobs.add_argument('--cancel', metavar='ID', help="Cancela a campanha informada.")
+    jobs.set_defaults(func=cmd_jobs)
+    return parser
+
+
+def main(argv=None):
+    # Permite "python -m mailforge" a partir de qualquer pasta
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        from core.tracing import tracer
+        tracer.enable()
+    if args.profile or args.trace_malloc:
+        from core.profiling import profiler, MODE_SESSION
+        profiler.start(args.report_dir, profile=MODE_SESSION if args.profile else None,
+                       trace_malloc=args.trace_malloc, snapshot_every=args.snapshot_every)
+    try:
+        return args.func(args)
+    finally:
+        if args.trace:
+            print(f"Trace gravado em {tracer.write(args.trace)}.", file=sys.stderr)
+        if args.profile or args.trace_malloc:
+            for report in profiler.stop():
+                print(f"Relatório de diagnóstico: {report}", file=sys.stderr)
@@ -0,0 +1,539 @@
+"""
+Servidor SMTP local (sink) para testes de carga e de regressão do envio, sem
+serviços externos: aceita as mensagens e as descarta (ou guarda as últimas).
+
+Suporta STARTTLS ou TLS implícito com certificado autoassinado, AUTH PLAIN/LOGIN,
+PIPELINING, CHUNKING (BDAT) e 8BITMIME, e permite injetar latência por comando,
+erros 4xx/5xx, limite de mensagens por conexão e quedas de conexão.
+
+Uso em testes:
+
+    with SmtpSink(tempfail_rate=0.01) as sink:
+        send_email(sink.smtp_config(), ...)
+        print(sink.stats())
+
+Ou como servidor avulso: python -m mailforge.testing --port 2525 --tls starttls
+"""
+import os
+import ssl
+import sys
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+from collections import deque
+
+TLS_STARTTLS = 'starttls'
+TLS_IMPLICIT = 'implicit'
+
+DEFAULT_MAX_MESSAGE_SIZE = 50 * 1024 * 1024
+_IDLE_TIMEOUT = 300
+
+
+def generate_self_signed_cert(directory=None, hostname='localhost'):
+    """Gera um certificado autoassinado (válido por 1 ano). Retorna (certfile, keyfile)."""
+    import datetime
+    import ipaddress
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName(hostname), x509.IPAddress(ipaddress.ip_address('127.0.0.1'))
+        ]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+
+    directory = directory or tempfile.mkdtemp(prefix='mailforge-sink-')
+    certfile = os.path.join(directory, 'sink-cert.pem')
+    keyfile = os.path.join(directory, 'sink-key.pem')
+    with open(certfile, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return certfile, keyfile
+
+
+class _Disconnect(Exception):
+    """Encerra a sessão sem resposta (queda injetada ou pedida pelo cliente)."""
+
+
+class _Session:
+    """Uma conexão SMTP. Roda inteiramente no loop asyncio do sink."""
+
+    def __init__(self, sink, reader, writer, tls_active):
+        self.sink = sink
+        self.reader = reader
+        self.writer = writer
+        self.tls_active = tls_active
+        self.authenticated = False
+        self.greeted = False
+        self.messages = 0
+        self._reset()
+
+    def _reset(self):
+        self.mail_from = None
+        self.recipients = []
+        self.chunks = []
+
+    async def reply(self, line, command=None):
+        if command is not None:
+            await self.sink._delay(command)
+        self.writer.write(line.encode('ascii') + b'\r\n')
+        await self.writer.drain()
+
+    async def run(self):
+        sink = self.sink
+        await sink._delay('CONNECT')
+        await self.reply(f"220 {sink.hostname} ESMTP MailForge sink")
+        while True:
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), _IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await self.reply("421 4.4.2 Idle timeout")
+                return
+            if not line:
+                return
+            sink._count('commands')
+            verb, _, arg = line.decode('utf-8', 'replace').rstrip('\r\n').partition(' ')
+            handler = getattr(self, 'smtp_' + verb.upper(), None)
+            if handler is None:
+                await self.reply("500 5.5.2 Command not recognized")
+                continue
+            if await handler(arg.strip()) is False:
+                return
+
+    # --- Comandos ---
+
+    async def smtp_EHLO(self, arg):
+        sink = self.sink
+        self.greeted = True
+        self._reset()
+        lines = [f"{sink.hostname} Hello {arg or 'client'}", "PIPELINING", "8BITMIME", "CHUNKING",
+                 f"SIZE {sink.max_message_size}"]
+        if sink._tls_context is not None and sink.tls == TLS_STARTTLS and not self.tls_active:
+            lines.append("STARTTLS")
+        if self.tls_active or not sink.require_tls:
+            lines.append("AUTH PLAIN LOGIN")
+        lines.append("ENHANCEDSTATUSCODES")
+        text = '\r\n'.join(f"250-{l}" for l in lines[:-1]) + f"\r\n250 {lines[-1]}"
+        await self.reply(text, 'EHLO')
+
+    async def smtp_HELO(self, arg):
+        self.greeted = True
+        self._reset()
+        await self.reply(f"250 {self.sink.hostname}", 'HELO')
+
+    async def smtp_STARTTLS(self, arg):
+        sink = self.sink
+        if sink._tls_context is None or sink.tls != TLS_STARTTLS or self.tls_active:
+            await self.reply("454 4.7.0 TLS not available", 'STARTTLS')
+            return
+        await self.reply("220 2.0.0 Ready to start TLS", 'STARTTLS')
+        await self.writer.start_tls(sink._tls_context)
+        self.tls_active = True
+        # RFC 3207: o cliente recomeça do EHLO
+        self.greeted = False
+        self.authenticated = False
+        self._reset()
+        sink._count('tls_upgrades')
+
+    async def smtp_AUTH(self, arg):
+        sink = self.sink
+        if sink.require_tls and not self.tls_active:
+            await self.reply("530 5.7.0 Must issue a STARTTLS command first", 'AUTH')
+            return
+        mechanism, _, initial = arg.partition(' ')
+        mechanism = mechanism.upper()
+        try:
+            if mechanism == 'PLAIN':
+                if not initial:
+                    await self.reply("334 ")
+                    initial = (await self.reader.readline()).decode('ascii').strip()
+                _, user, password = base64.b64decode(initial).decode('utf-8').split('\0')
+            elif mechanism == 'LOGIN':
+                if initial:
+                    user = base64.b64decode(initial).decode('utf-8')
+                else:
+                    await self.reply("334 VXNlcm5hbWU6")
+                    user = base64.b64decode((await self.reader.readline()).strip()).decode('utf-8')
+                await self.reply("334 UGFzc3dvcmQ6")
+                password = base64.b64decode((await self.reader.readline()).strip()).decode('utf-8')
+            else:
+                await self.reply("504 5.5.4 Unrecognized authentication type", 'AUTH')
+                return
+        except (ValueError, UnicodeDecodeError):
+            await self.reply("501 5.5.2 Cannot decode response", 'AUTH')
+            return
+
+        if sink.users is None or sink.users.get(user) == password:
+            self.authenticated = True
+            sink._count('auth_success')
+            await self.reply("235 2.7.0 Authentication successful", 'AUTH')
+        else:
+            sink._count('auth_failure')
+            await self.reply("535 5.7.8 Authentication credentials invalid", 'AUTH')
+
+    async def smtp_MAIL(self, arg):
+        sink = self.sink
+        if not self.greeted:
+            await self.reply("503 5.5.1 Send EHLO first", 'MAIL')
+            return
+        if sink.require_auth and not self.authenticated:
+            await self.reply("530 5.7.0 Authentication required", 'MAIL')
+            return
+        if sink.max_messages_per_connection and self.messages >= sink.max_messages_per_connection:
+            sink._count('capped')
+            await self.reply("421 4.7.0 Too many messages on this connection, closing", 'MAIL')
+            return False
+        self._reset()
+        self.mail_from = arg[5:].strip() if arg.upper().startswith('FROM:') else arg
+        await self.reply("250 2.1.0 OK", 'MAIL')
+
+    async def smtp_RCPT(self, arg):
+        if self.mail_from is None:
+            await self.reply("503 5.5.1 Need MAIL command", 'RCPT')
+            return
+        self.recipients.append(arg[3:].strip() if arg.upper().startswith('TO:') else arg)
+        await self.reply("250 2.1.5 OK", 'RCPT')
+
+    async def smtp_DATA(self, arg):
+        if not self.recipients:
+            await self.reply("503 5.5.1 Need RCPT command", 'DATA')
+            return
+        await self.reply("354 End data with <CR><LF>.<CR><LF>")
+        # Lê em blocos até o terminador; "x.\r\n" no fim de uma linha também casa, então confere o final
+        data = b''
+        while not (data == b'.\r\n' or data.endswith(b'\r\n.\r\n')):
+            chunk = await self.reader.readuntil(b'.\r\n')
+            data += chunk
+        data = data[:-3]
+        if data.startswith(b'..'):
+            data = data[1:]
+        await self._finish_message(data.replace(b'\r\n..', b'\r\n.'), 'DATA')
+
+    async def smtp_BDAT(self, arg):
+        parts = arg.split()
+        try:
+            size = int(parts[0])
+        except (IndexError, ValueError):
+            await self.reply("501 5.5.4 Syntax: BDAT <size> [LAST]", 'BDAT')
+            return
+        chunk = await self.reader.readexactly(size)
+        if not self.recipients:
+            await self.reply("503 5.5.1 Need RCPT command", 'BDAT')
+            return
+        self.chunks.append(chunk)
+        if len(parts) > 1 and parts[1].upper() == 'LAST':
+            data, self.chunks = b''.join(self.chunks), []
+            await self._finish_message(data, 'BDAT')
+        else:
+            await self.reply(f"250 2.0.0 {size} octets received", 'BDAT')
+
+    async def _finish_message(self, data, command):
+        sink = self.sink
+        outcome = sink._roll()
+        if outcome == 'disconnect':
+            sink._count('disconnects')
+            raise _Disconnect()
+        if len(data) > sink.max_message_size:
+            sink._count('permfail')
+            await self.reply("552 5.3.4 Message size exceeds fixed limit", command)
+        elif outcome == 'tempfail':
+            sink._count('tempfail')
+            await self.reply("451 4.3.0 Injected temporary failure", command)
+        elif outcome == 'permfail':
+            sink._count('permfail')
+            await self.reply("554 5.6.0 Injected permanent failure", command)
+        else:
+            self.messages += 1
+            sink._accept(self.mail_from, self.recipients, data)
+            await self.reply(f"250 2.0.0 OK queued as {sink.stats_counter('messages')}", command)
+        self._reset()
+
+    async def smtp_RSET(self, arg):
+        self._reset()
+        await self.reply("250 2.0.0 OK", 'RSET')
+
+    async def smtp_NOOP(self, arg):
+        await self.reply("250 2.0.0 OK", 'NOOP')
+
+    async def smtp_VRFY(self, arg):
+        await self.reply("252 2.1.5 Cannot VRFY user", 'VRFY')
+
+    async def smtp_QUIT(self, arg):
+        await self.reply("221 2.0.0 Bye", 'QUIT')
+        return False
+
+
+class SmtpSink:
+    """
+    Servidor SMTP de teste rodando num loop asyncio em uma thread própria.
+
+    - tls: None (só texto puro), 'starttls' ou 'implicit' (como a porta 465);
+      sem certfile/keyfile é gerado um certificado autoassinado.
+    - users: {usuário: senha} aceitos no AUTH; None aceita qualquer credencial.
+    - latency: segundos por comando ({'EHLO': 0.01, 'DATA': 0.05, 'CONNECT': 0.1, '*': 0})
+      ou um número aplicado a todos.
+    - tempfail_rate / permfail_rate / disconnect_rate: probabilidade de cada mensagem
+      receber 451, 554 ou ter a conexão derrubada no fim dos dados.
+    - max_messages_per_connection: depois disso o MAIL recebe 421 e a conexão é fechada.
+    - keep_messages: quantas mensagens recebidas guardar em `messages`.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, tls=TLS_STARTTLS, certfile=None, keyfile=None,
+                 users=None, require_auth=False, require_tls=False, latency=None,
+                 tempfail_rate=0.0, permfail_rate=0.0, disconnect_rate=0.0,
+                 max_messages_per_connection=0, max_message_size=DEFAULT_MAX_MESSAGE_SIZE,
+                 keep_messages=1000, seed=None, hostname='localhost'):
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.users = users
+        self.require_auth = require_auth
+        self.require_tls = require_tls
+        self.latency = latency if isinstance(latency, dict) else {'*': latency or 0}
+        self.tempfail_rate = tempfail_rate
+        self.permfail_rate = permfail_rate
+        self.disconnect_rate = disconnect_rate
+        self.max_messages_per_connection = max_messages_per_connection
+        self.max_message_size = max_message_size
+        self.hostname = hostname
+        self.messages = deque(maxlen=keep_messages) if keep_messages else None
+        self.on_message = None
+        self._random = random.Random(seed)
+        self._tls_context = None
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._startup_error = None
+        self._lock = threading.Lock()
+        self._stats = {'active_connections': 0}
+        self.reset_stats()
+
+    # --- Ciclo de vida ---
+
+    def start(self):
+        if self.tls:
+            if not self.certfile:
+                self.certfile, self.keyfile = generate_self_signed_cert(hostname=self.hostname)
+            self._tls_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            self._tls_context.load_cert_chain(self.certfile, self.keyfile)
+
+        self._thread = threading.Thread(target=self._run, name='smtp-sink', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(asyncio.start_server(
+                # O corpo do DATA é lido até o terminador de uma vez: o limite do buffer é o da mensagem
+                self._handle, self.host, self.port, limit=self.max_message_size + 1024,
+                ssl=self._tls_context if self.tls == TLS_IMPLICIT else None,
+            ))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as e:
+            self._startup_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self._shutdown())
+            self._loop.close()
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def stop(self):
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def smtp_config(self, user='sink@example.com', password='sink'):
+        """smtp_config apontando para o sink, no formato usado por send_email/connect_smtp."""
+        return {'host': self.host, 'port': self.port, 'user': user, 'password': password}
+
+    # --- Sessões ---
+
+    async def _handle(self, reader, writer):
+        self._count('connections')
+        self._count('active_connections')
+        session = _Session(self, reader, writer, tls_active=self.tls == TLS_IMPLICIT)
+        try:
+            await session.run()
+        except (_Disconnect, ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ssl.SSLError):
+            pass
+        except asyncio.CancelledError:
+            # stop() com sessões abertas: termina a tarefa normalmente
+            pass
+        finally:
+            self._count('active_connections', -1)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError, asyncio.CancelledError):
+                pass
+
+    async def _delay(self, command):
+        seconds = self.latency.get(command, self.latency.get('*', 0))
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    def _roll(self):
+        """Sorteia o destino da mensagem: None (aceita), 'tempfail', 'permfail' ou 'disconnect'."""
+        if not (self.tempfail_rate or self.permfail_rate or self.disconnect_rate):
+            return None
+        value = self._random.random()
+        for outcome, rate in (('disconnect', self.disconnect_rate), ('tempfail', self.tempfail_rate),
+                              ('permfail', self.permfail_rate)):
+            if value < rate:
+                return outcome
+            value -= rate
+        return None
+
+    def _accept(self, mail_from, recipients, data):
+        with self._lock:
+            self._stats['messages'] += 1
+            self._stats['recipients'] += len(recipients)
+            self._stats['bytes'] += len(data)
+            now = time.monotonic()
+            if self._stats['first_message'] is None:
+                self._stats['first_message'] = now
+            self._stats['last_message'] = now
+        if self.messages is not None:
+            self.messages.append((mail_from, list(recipients), data))
+        if self.on_message is not None:
+            self.on_message(mail_from, recipients, data)
+
+    # --- Contadores ---
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats_counter(self, key):
+        with self._lock:
+            return self._stats[key]
+
+    def reset_stats(self):
+        with self._lock:
+            # Conexões abertas não são zeradas: continuam abertas depois do reset
+            active = self._stats['active_connections']
+            self._stats = dict.fromkeys((
+                'connections', 'tls_upgrades', 'auth_success', 'auth_failure', 'commands',
+                'messages', 'recipients', 'bytes', 'tempfail', 'permfail', 'disconnects', 'capped',
+            ), 0)
+            self._stats['active_connections'] = active
+            self._stats['first_message'] = None
+            self._stats['last_message'] = None
+            self._started = time.monotonic()
+        if self.messages is not None:
+            self.messages.clear()
+
+    def stats(self):
+        """Contadores desde o início (ou o último reset_stats) e a vazão de mensagens."""
+        with self._lock:
+            stats = dict(self._stats)
+            elapsed = time.monotonic() - self._started
+        first, last = stats.pop('first_message'), stats.pop('last_message')
+        busy = (last - first) if first is not None and last > first else 0.0
+        stats['elapsed_s'] = round(elapsed, 3)
+        stats['messages_per_second'] = round(stats['messages'] / elapsed, 2) if elapsed else 0.0
+        # Vazão entre a primeira e a última mensagem, sem o tempo ocioso antes e depois
+        stats['busy_messages_per_second'] = round((stats['messages'] - 1) / busy, 2) if busy else 0.0
+        stats['bytes_per_second'] = round(stats['bytes'] / elapsed, 1) if elapsed else 0.0
+        return stats
+
+
+def _parse_latency(values):
+    latency = {}
+    for value in values:
+        command, _, seconds = value.rpartition('=')
+        latency[command.upper() or '*'] = float(seconds)
+    return latency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m mailforge.testing',
+                                     description="Servidor SMTP local que descarta as mensagens, para testes de carga.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--tls', choices=['none', TLS_STARTTLS, TLS_IMPLICIT], default=TLS_STARTTLS)
+    parser.add_argument('--certfile', help="Certificado PEM (padrão: autoassinado gerado na hora).")
+    parser.add_argument('--keyfile', help="Chave privada PEM do certificado.")
+    parser.add_argument('--user', action='append', default=[], metavar='USUARIO:SENHA',
+                        help="Credencial aceita no AUTH (pode repetir; padrão: aceita qualquer uma).")
+    parser.add_argument('--require-auth', action='store_true', help="Recusa MAIL antes do AUTH.")
+    parser.add_argument('--latency', action='append', default=[], metavar='[COMANDO=]SEGUNDOS',
+                        help="Atraso antes da resposta (ex.: DATA=0.05, CONNECT=0.2 ou 0.001 para todos).")
+    parser.add_argument('--tempfail-rate', type=float, default=0.0, help="Fração das mensagens recusadas com 451.")
+    parser.add_argument('--permfail-rate', type=float, default=0.0, help="Fração das mensagens recusadas com 554.")
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help="Fração das mensagens em que a conexão cai.")
+    parser.add_argument('--max-messages-per-connection', type=int, default=0)
+    parser.add_argument('--seed', type=int, help="Semente para a injeção de falhas (reprodutível).")
+    parser.add_argument('--stats-interval', type=float, default=5, help="Intervalo dos contadores no stderr (segundos).")
+    args = parser.parse_args(argv)
+
+    users = None
+    if args.user:
+        users = dict(value.split(':', 1) for value in args.user)
+    sink = SmtpSink(
+        args.host, args.port, None if args.tls == 'none' else args.tls, args.certfile, args.keyfile,
+        users=users, require_auth=args.require_auth, latency=_parse_latency(args.latency),
+        tempfail_rate=args.tempfail_rate, permfail_rate=args.permfail_rate, disconnect_rate=args.disconnect_rate,
+        max_messages_per_connection=args.max_messages_per_connection, keep_messages=0, seed=args.seed,
+    ).start()
+    print(f"SMTP sink em {sink.host}:{sink.port} (TLS: {args.tls}). Ctrl+C para encerrar.", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            print(json.dumps(sink.stats()), file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.stop()
+        print(json.dumps(sink.stats()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,29 @@
 # main.py
 import sys
 import os
+import argparse
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 from PySide6.QtGui import QIcon
 from ui.main_window import MainWindow
 from core.resource_path import get_resource_path
+from core.profiling import profiler, PROFILE_MODES, MODE_SESSION, DEFAULT_SNAPSHOT_EVERY, snapshot_interval
+
+
+def parse_diagnostic_args(argv):
+    """Opções de diagnóstico; o restante da linha de comando segue para o Qt."""
+    parser = argparse.ArgumentParser(prog='MailForge', add_help=False)
+    parser.add_argument('--profile', nargs='?', const=MODE_SESSION, choices=PROFILE_MODES,
+                        help="cProfile da sessão inteira ou de cada campanha enviada.")
+    parser.add_argument('--trace-malloc', action='store_true', help="Liga o tracemalloc (ver --snapshot-every).")
+    parser.add_argument('--snapshot-every', type=snapshot_interval, default=DEFAULT_SNAPSHOT_EVERY, metavar='N',
+                        help="Com --trace-malloc, um snapshot a cada N mensagens.")
+    return parser.parse_known_args(argv)
 
 if __name__ == "__main__":
+    # Necessário no executável do PyInstaller: a otimização de imagens usa um pool de processos
+    multiprocessing.freeze_support()
+
     # Garante que os caminhos relativos para assets funcionem
     # independentemente de onde o script é executado
     try:
@@ -17,7 +34,13 @@ if __name__ == "__main__":
         # Se não estiver em um executável, usa o diretório do script
         os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
-    app = QApplication(sys.argv)
+    diagnostics, qt_argv = parse_diagnostic_args(sys.argv[1:])
+    if diagnostics.profile or diagnostics.trace_malloc:
+        # Relatórios em config/profiles: funciona também no executável gerado pelo build_exe.py
+        profiler.start(profile=diagnostics.profile, trace_malloc=diagnostics.trace_malloc,
+                       snapshot_every=diagnostics.snapshot_every)
+
+    app = QApplication(sys.argv[:1] + qt_argv)
 
     # Definir o ícone do aplicativo usando get_resource_path
     icon_path = get_resource_path(os.path.join('assets', 'app_icon.ico'))
@@ -38,4 +61,8 @@ if __name__ == "__main__":
     window.setWindowIcon(QIcon(icon_path))
     window.show()
 
-    sys.exit(app.exec())
\ No newline at end of file
+    exit_code = app.exec()
+    if profiler.enabled:
+        for report in profiler.stop():
+            print("Relatório de diagnóstico:", report)
+    sys.exit(exit_code)
\ No newline at end of file
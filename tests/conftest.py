@@ -0,0 +1,5 @@
+import os
+import sys
+
+# core/ e mailforge/ são importados a partir da raiz do repositório, como no main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
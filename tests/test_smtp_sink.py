@@ -0,0 +1,117 @@
+"""
+Testes de regressão do envio contra o SmtpSink (mailforge.testing), sem servidor externo.
+Rodar da raiz do repositório: python -m pytest -q
+"""
+import re
+import base64
+import hashlib
+
+import pytest
+
+from mailforge.testing import SmtpSink
+from core.email_sender import connect_smtp, build_message, send_email
+from core.smtp_pool import SmtpConnectionPool
+
+HTML = '<html><body><p>Olá,  mundo!</p></body></html>'
+
+
+@pytest.fixture
+def sink():
+    with SmtpSink(max_messages_per_connection=1) as server:
+        yield server
+
+
+def test_pool_resends_after_421_on_connection_cap(sink):
+    config = sink.smtp_config()
+    pool = SmtpConnectionPool(config, size=1)
+    results = []
+    try:
+        for i in range(3):
+            msg = build_message(config['user'], f'destino{i}@example.com', 'Teste 421', HTML, [])
+            assert pool.send(msg, on_result=lambda *result: results.append(result[:2]))
+    finally:
+        pool.close()
+
+    # Cada conexão aceita uma mensagem: a segunda e a terceira recebem 421 e são reenviadas
+    assert [recipients for _, recipients, _ in sink.messages] == [[f'<destino{i}@example.com>'] for i in range(3)]
+    assert results == [(f'destino{i}@example.com', True) for i in range(3)]
+    assert sink.stats()['capped'] == 2
+
+
+def test_transcript_omits_credentials(sink):
+    password = 'S3nha-Secreta-123'
+    config = sink.smtp_config(password=password)
+    server = connect_smtp(config)
+    try:
+        text = server.transcript.format()
+    finally:
+        server.quit()
+
+    plain = base64.b64encode(f"\0{config['user']}\0{password}".encode()).decode()
+    assert 'AUTH PLAIN <credenciais omitidas>' in text
+    for secret in (password, plain, base64.b64encode(password.encode()).decode()):
+        assert secret not in text
+
+
+# --- DKIM: verificação independente do core.dkim_signer (RFC 6376, relaxed/relaxed) ---
+
+def _relaxed_body(body):
+    lines = [re.sub(rb'[ \t]+', b' ', line).rstrip(b' \t') for line in body.split(b'\r\n')]
+    while lines and not lines[-1]:
+        lines.pop()
+    return b''.join(line + b'\r\n' for line in lines)
+
+
+def _relaxed_header(name, value):
+    return name.strip().lower() + ':' + re.sub(r'[ \t]+', ' ', value.replace('\r\n', '')).strip()
+
+
+def _verify_dkim(data, public_key):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    header_block, body = data.split(b'\r\n\r\n', 1)
+    headers = []
+    for line in header_block.decode('utf-8').split('\r\n'):
+        if line[:1] in (' ', '\t'):
+            headers[-1][1] += '\r\n' + line
+        else:
+            headers.append(line.split(':', 1))
+    signature_value = next(value for name, value in headers if name.lower() == 'dkim-signature')
+    tags = dict(tag.strip().split('=', 1) for tag in signature_value.split(';') if tag.strip())
+    tags = {key: re.sub(r'\s+', '', value) for key, value in tags.items()}
+
+    assert tags['c'] == 'relaxed/relaxed' and tags['a'] == 'rsa-sha256'
+    if base64.b64encode(hashlib.sha256(_relaxed_body(body)).digest()).decode() != tags['bh']:
+        return False
+
+    latest = {name.strip().lower(): (name, value) for name, value in headers}
+    signed = ''.join(_relaxed_header(*latest[name.lower()]) + '\r\n' for name in tags['h'].split(':'))
+    signed += _relaxed_header('DKIM-Signature', re.sub(r'(^|;)(\s*b=)[^;]*', r'\1\2', signature_value))
+    try:
+        public_key.verify(base64.b64decode(tags['b']), signed.encode(), padding.PKCS1v15(), hashes.SHA256())
+    except Exception:
+        return False
+    return True
+
+
+def test_signed_message_verifies_on_receipt(sink, tmp_path):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_file = tmp_path / 'dkim.pem'
+    key_file.write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                           serialization.NoEncryption()))
+    config = dict(sink.smtp_config(), dkim_domain='example.com', dkim_selector='mf', dkim_key_file=str(key_file))
+
+    success, message = send_email(config, ['destino@example.com'], 'Assinado  com DKIM', HTML)
+    assert success, message
+
+    (_, _, data), = sink.messages
+    assert data.startswith(b'DKIM-Signature:')
+    assert _verify_dkim(data, key.public_key())
+    # Espaços a mais não contam (relaxed); alterar o assunto ou o corpo invalida a assinatura
+    assert _verify_dkim(data.replace(b'Assinado  com', b'Assinado com'), key.public_key())
+    assert not _verify_dkim(data.replace(b'Assinado', b'Alterado'), key.public_key())
+    assert not _verify_dkim(data + b'texto acrescentado\r\n', key.public_key())
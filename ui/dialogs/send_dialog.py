@@ -1,11 +1,27 @@
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QFormLayout, QLineEdit, 
-                             QPushButton, QTabWidget, QWidget, QPlainTextEdit,
+                             QPushButton, QTabWidget, QWidget,
                              QListWidget, QFileDialog, QMessageBox, QLabel, QSpinBox,
-                             QHBoxLayout, QGroupBox)
-from core.excel_reader import get_emails_from_excel
+                             QHBoxLayout, QGroupBox, QCheckBox)
+from PySide6.QtCore import QTimer
+from core.excel_reader import get_emails_from_excel, get_recipients_from_excel
 from core.email_sender import send_email
 from core.config_manager import ConfigManager
+from core.suppression import SuppressionStore, UNSUBSCRIBED
+from core.recipient_parser import parse_email_list
+from core.delivery_report import DeliveryLog, export_delivery_status
+from core.html_minifier import check_size_budget, DEFAULT_BUDGET_KB
+from core.daemon_client import find_daemon
+from core.metrics import metrics
+from core.profiling import profiler
+from core.smtp_transcript import transcripts
+from core.smtp_credentials import load_smtp_config, DKIM_FIELDS
+from core.sender_daemon import FINISHED_STATUSES, JOB_PREPARING, PRIORITY_HIGH, PRIORITY_BULK
+from ui.widgets.recipient_list import RecipientListView, BackgroundTask, BulkPasteEdit
 import os
+from datetime import datetime
+
+# Até quantos destinatários o envio vai pela fila prioritária do serviço
+HIGH_PRIORITY_MAX_RECIPIENTS = 5
 
 class SendDialog(QDialog):
     def __init__(self, html_content, parent=None):
@@ -22,6 +38,19 @@ class SendDialog(QDialog):
         self.email_password = email_config.get('password', '')
         self.smtp_host = "smtp.gmail.com"  # Valor padrão para Gmail
         self.smtp_port = 587  # Valor padrão para Gmail
+        # DKIM das variáveis DKIM_DOMAIN, DKIM_SELECTOR e DKIM_KEY_FILE (as mesmas do CLI)
+        try:
+            smtp_defaults, _ = load_smtp_config(config_manager=config_manager)
+        except ValueError as e:
+            # SMTP_PORT inválida não impede o envio daqui, que usa a porta padrão
+            print(f"Aviso: {e}")
+            smtp_defaults = {key: os.environ.get(key.upper(), '') for key in DKIM_FIELDS}
+        self.dkim_config = {key: smtp_defaults.get(key, '') for key in DKIM_FIELDS}
+
+        # Lista local de supressão (descadastros, bounces e envios recentes)
+        self.config_manager = config_manager
+        self.suppression_store = SuppressionStore(config_manager.get_suppression_dir())
+        self._tasks = set()
 
         self.layout = QVBoxLayout(self)
 
@@ -43,11 +72,13 @@ class SendDialog(QDialog):
         
         self.smtp_layout.addRow("Assunto:", self.subject_edit)
         self.smtp_layout.addRow(self.email_info)
+        self.smtp_layout.addRow(QLabel(self._dkim_status_text()))
 
         # Recipients
         self.tabs = QTabWidget()
         self.setup_manual_tab()
         self.setup_excel_tab()
+        self.setup_suppression_section()
         
         # Seção de Anexos
         self.setup_attachments_section()
@@ -60,16 +91,25 @@ class SendDialog(QDialog):
         self.layout.addWidget(self.smtp_group)
         self.layout.addWidget(QLabel("<b>Destinatários</b>"))
         self.layout.addWidget(self.tabs)
+        self.layout.addWidget(self.suppression_group)
         self.layout.addWidget(QLabel("<b>Anexos</b>"))
         self.layout.addWidget(self.attachments_group)
+        self.setup_daemon_option()
+        if self.daemon_check is not None:
+            self.layout.addWidget(self.daemon_check)
         self.layout.addWidget(self.send_button)
 
     def setup_manual_tab(self):
         widget = QWidget()
         layout = QVBoxLayout(widget)
         layout.addWidget(QLabel("Digite ou cole os emails, um por linha:"))
-        self.manual_emails_edit = QPlainTextEdit()
+        self.manual_emails_edit = BulkPasteEdit()
+        self.manual_emails_edit.bulk_pasted.connect(self.load_pasted_emails)
+        self.manual_status_label = QLabel("Listas grandes coladas são carregadas na lista abaixo.")
+        self.pasted_email_list = RecipientListView()
         layout.addWidget(self.manual_emails_edit)
+        layout.addWidget(self.manual_status_label)
+        layout.addWidget(self.pasted_email_list)
         self.tabs.addTab(widget, "Digitar Manualmente")
 
     def setup_excel_tab(self):
@@ -77,30 +117,173 @@ class SendDialog(QDialog):
         layout = QVBoxLayout(widget)
         self.load_excel_button = QPushButton("Carregar Planilha Excel")
         self.load_excel_button.clicked.connect(self.load_from_excel)
-        self.excel_email_list = QListWidget()
+        self.excel_email_list = RecipientListView()
         self.excel_status_label = QLabel("Nenhum arquivo carregado.")
+        self.recipient_attachments = {}
+        self.excel_filepath = None
+
+        # Coluna opcional com o arquivo individual de cada destinatário (ex.: boleto, certificado)
+        self.attachment_column_edit = QLineEdit()
+        self.attachment_column_edit.setPlaceholderText("Coluna com anexo individual (opcional)")
         
+        # Imagens geradas por destinatário com as colunas da planilha (marcadores personalized:<nome>)
+        self.personalized_spec = None
+        self.personalized_button = QPushButton("Imagens Personalizadas (JSON)...")
+        self.personalized_button.clicked.connect(self.select_personalized_spec)
+        self.personalized_label = QLabel("Sem imagens personalizadas.")
+
+        layout.addWidget(self.attachment_column_edit)
+        layout.addWidget(self.personalized_button)
+        layout.addWidget(self.personalized_label)
         layout.addWidget(self.load_excel_button)
         layout.addWidget(self.excel_status_label)
         layout.addWidget(self.excel_email_list)
         self.tabs.addTab(widget, "Importar de Excel")
 
+    def select_personalized_spec(self):
+        filepath, _ = QFileDialog.getOpenFileName(self, "Especificação das Imagens Personalizadas", "", "JSON (*.json)")
+        self.personalized_spec = filepath or None
+        self.personalized_label.setText(
+            f"Imagens personalizadas: {os.path.basename(filepath)}" if filepath else "Sem imagens personalizadas."
+        )
+
+    def _load_personalizer(self):
+        """ImagePersonalizer da especificação escolhida, com as colunas da planilha. Retorna (personalizer, erro)."""
+        from core.recipient_parser import load_recipient_rows
+        from core.personalized_images import ImagePersonalizer
+        rows, message = load_recipient_rows(self.excel_filepath)
+        if rows is None:
+            return None, message
+        try:
+            return ImagePersonalizer.load(self.personalized_spec, rows), None
+        except (OSError, ValueError) as e:
+            return None, f"Erro na especificação das imagens personalizadas: {e}"
+
+    def _run_in_background(self, func, args, on_result, on_error):
+        """Executa func fora da thread da interface; mantém a referência até terminar."""
+        task = BackgroundTask(func, *args, parent=self)
+        task.result_ready.connect(on_result)
+        task.failed.connect(on_error)
+        task.finished.connect(lambda: self._tasks.discard(task))
+        self._tasks.add(task)
+        task.start()
+
     def load_from_excel(self):
         filepath, _ = QFileDialog.getOpenFileName(self, "Abrir Planilha", "", "Arquivos Excel (*.xlsx *.xls)")
         if filepath:
-            emails, message = get_emails_from_excel(filepath)
-            self.excel_status_label.setText(message)
-            if emails:
-                self.excel_email_list.clear()
-                self.excel_email_list.addItems(emails)
-            else:
-                QMessageBox.warning(self, "Erro ao Ler Planilha", message)
+            self.load_excel_button.setEnabled(False)
+            self.excel_status_label.setText("Carregando planilha...")
+            self._loading_excel_filepath = filepath
+            self._run_in_background(
+                self._read_excel_recipients,
+                (filepath, self.attachment_column_edit.text().strip() or None, self.recent_days_spin.value()),
+                self._on_excel_loaded, self._on_excel_failed
+            )
+
+    def _read_excel_recipients(self, filepath, attachment_column, recent_days):
+        # Executado em segundo plano: leitura da planilha e filtro de supressão
+        emails, attachments, message = get_recipients_from_excel(filepath, attachment_column=attachment_column)
+        if emails:
+            emails, removed = self.suppression_store.filter_recipients(emails, recent_days)
+            if removed:
+                message += f" {removed} removidos pela lista de supressão."
+        return emails, attachments, message
+
+    def _on_excel_loaded(self, result):
+        emails, attachments, message = result
+        self.load_excel_button.setEnabled(True)
+        self.excel_status_label.setText(message)
+        if emails:
+            self.excel_email_list.set_emails(emails)
+            self.recipient_attachments = attachments
+            self.excel_filepath = self._loading_excel_filepath
+        else:
+            QMessageBox.warning(self, "Erro ao Ler Planilha", message)
+
+    def _on_excel_failed(self, error):
+        self.load_excel_button.setEnabled(True)
+        self.excel_status_label.setText("Falha ao carregar a planilha.")
+        QMessageBox.warning(self, "Erro ao Ler Planilha", error)
+
+    def load_pasted_emails(self, text):
+        """Processa uma colagem grande em segundo plano e acrescenta à lista."""
+        self.manual_status_label.setText("Processando emails colados...")
+        self._run_in_background(
+            self._parse_pasted_emails, (text, list(self.pasted_email_list.emails()), self.recent_days_spin.value()),
+            self._on_pasted_parsed, lambda error: self.manual_status_label.setText(f"Erro ao processar: {error}")
+        )
+
+    def _parse_pasted_emails(self, text, existing, recent_days):
+        # Executado em segundo plano: parsing, deduplicação e filtro de supressão
+        emails, invalid = parse_email_list(text)
+        emails, removed = self.suppression_store.filter_recipients(emails, recent_days)
+        known = {e.lower() for e in existing}
+        added = [e for e in emails if e.lower() not in known]
+        return existing + added, len(added), invalid, removed
+
+    def _on_pasted_parsed(self, result):
+        emails, added, invalid, removed = result
+        self.pasted_email_list.set_emails(emails)
+        message = f"{added} emails adicionados."
+        if invalid:
+            message += f" {invalid} entradas inválidas ignoradas."
+        if removed:
+            message += f" {removed} removidos pela lista de supressão."
+        self.manual_status_label.setText(message)
     
     def get_recipients(self):
         if self.tabs.currentIndex() == 0: # Manual
-            return self.manual_emails_edit.toPlainText().splitlines()
+            emails = [e for e in self.manual_emails_edit.toPlainText().splitlines() if e.strip()]
+            emails, _ = self.suppression_store.filter_recipients(emails, self.recent_days_spin.value())
+            # O mesmo endereço digitado e colado recebe uma única mensagem
+            seen = set()
+            recipients = []
+            for email in emails + self.pasted_email_list.emails():
+                key = email.strip().lower()
+                if key not in seen:
+                    seen.add(key)
+                    recipients.append(email)
+            return recipients
         else: # Excel
-            return [self.excel_email_list.item(i).text() for i in range(self.excel_email_list.count())]
+            return self.excel_email_list.emails()
+
+    def setup_suppression_section(self):
+        self.suppression_group = QGroupBox("Lista de Supressão")
+        layout = QFormLayout(self.suppression_group)
+
+        settings = self.config_manager.load_settings()
+        self.recent_days_spin = QSpinBox()
+        self.recent_days_spin.setRange(0, 365)
+        self.recent_days_spin.setSuffix(" dias")
+        self.recent_days_spin.setSpecialValueText("Desativado")
+        self.recent_days_spin.setValue(settings.get('suppression_recent_days', 0))
+        self.recent_days_spin.valueChanged.connect(
+            lambda days: self.config_manager.save_settings(suppression_recent_days=days)
+        )
+
+        self.suppression_count_label = QLabel()
+        self.import_suppression_button = QPushButton("Importar Descadastros...")
+        self.import_suppression_button.clicked.connect(self.import_suppression_list)
+        self._update_suppression_label()
+
+        layout.addRow("Ignorar quem recebeu nos últimos:", self.recent_days_spin)
+        layout.addRow(self.suppression_count_label, self.import_suppression_button)
+
+    def _update_suppression_label(self):
+        self.suppression_count_label.setText(f"{len(self.suppression_store)} endereços registrados")
+
+    def import_suppression_list(self):
+        """Importa uma planilha de descadastros/bounces para a lista de supressão."""
+        filepath, _ = QFileDialog.getOpenFileName(self, "Importar Descadastros", "", "Arquivos Excel (*.xlsx *.xls)")
+        if filepath:
+            emails, message = get_emails_from_excel(filepath)
+            if not emails:
+                QMessageBox.warning(self, "Erro ao Ler Planilha", message)
+                return
+            self.suppression_store.add_many(emails, UNSUBSCRIBED)
+            self.suppression_store.compact()
+            self._update_suppression_label()
+            QMessageBox.information(self, "Lista de Supressão", f"{len(emails)} endereços importados.")
 
     def setup_attachments_section(self):
         self.attachments_group = QGroupBox()
@@ -166,10 +349,61 @@ class SendDialog(QDialog):
                 QMessageBox.warning(self, "Campos Incompletos", "Por favor, preencha o assunto e adicione pelo menos um destinatário.")
                 return
 
+        if not self.confirm_body_size():
+            return
+        # Opcionais: entram depois da verificação dos campos obrigatórios
+        smtp_config.update(self.dkim_config)
+
         self.send_button.setEnabled(False)
         self.send_button.setText("Enviando...")
 
-        success, message = send_email(smtp_config, recipients, subject, self.html_content, attachments)
+        # Anexos individuais e imagens personalizadas só se aplicam à lista importada da planilha
+        from_excel = self.tabs.currentIndex() == 1
+        recipient_attachments = self.recipient_attachments if from_excel else None
+        personalized = from_excel and self.excel_filepath and self.personalized_spec
+
+        if self.daemon_check is not None and self.daemon_check.isChecked():
+            self.send_via_daemon(recipients, subject, attachments, recipient_attachments,
+                                 self.personalized_spec if personalized else None)
+            return
+
+        personalizer = None
+        if personalized:
+            personalizer, error = self._load_personalizer()
+            if personalizer is None:
+                QMessageBox.critical(self, "Erro no Envio", error)
+                self.send_button.setEnabled(True)
+                self.send_button.setText("Enviar Emails")
+                return
+
+        # Resultados por destinatário: lista de supressão e log de entrega
+        log_name = datetime.now().strftime('envio_%Y%m%d_%H%M%S.csv')
+        delivery_log = DeliveryLog(os.path.join(self.config_manager.config_dir, 'delivery_logs', log_name))
+        # Falhas de protocolo gravam a transcrição SMTP da conexão em delivery_logs/smtp_transcripts.log
+        transcripts.dump_dir = os.path.dirname(delivery_log.path)
+
+        def on_result(recipient, sent, response, message_id=None):
+            self.suppression_store.record_delivery(recipient, sent, response, message_id)
+            delivery_log.record(recipient, sent, response, message_id)
+
+        try:
+            with profiler.campaign(log_name[:-4]):
+                success, message = send_email(
+                    smtp_config, recipients, subject, self.html_content, attachments,
+                    on_result=on_result,
+                    recipient_attachments=recipient_attachments,
+                    personalizer=personalizer
+                )
+        finally:
+            delivery_log.close()
+            if metrics.enabled:
+                # Com MAILFORGE_METRICS=1, os tempos de cada etapa ficam ao lado dos logs de entrega
+                metrics.write(os.path.join(self.config_manager.config_dir, 'metrics', log_name[:-4]))
+                metrics.reset()
+        self._update_suppression_label()
+
+        if self.tabs.currentIndex() == 1 and self.excel_filepath:
+            self.offer_status_export(delivery_log.path)
 
         if success:
             QMessageBox.information(self, "Envio Concluído", message)
@@ -179,6 +413,121 @@ class SendDialog(QDialog):
             self.send_button.setEnabled(True)
             self.send_button.setText("Enviar Emails")
         
+    def _dkim_status_text(self):
+        """Mostra se as mensagens enviadas daqui saem assinadas com DKIM."""
+        if all(self.dkim_config.values()):
+            return f"<b>DKIM:</b> {self.dkim_config['dkim_selector']}._domainkey.{self.dkim_config['dkim_domain']}"
+        if any(self.dkim_config.values()):
+            return ("<font color='red'>⚠️ DKIM incompleto: defina DKIM_DOMAIN, DKIM_SELECTOR "
+                    "e DKIM_KEY_FILE.</font>")
+        return ("<font color='gray'>DKIM não configurado: as mensagens saem sem assinatura "
+                "(defina DKIM_DOMAIN, DKIM_SELECTOR e DKIM_KEY_FILE).</font>")
+
+    def setup_daemon_option(self):
+        """Oferece enviar pelo serviço em segundo plano quando ele estiver rodando."""
+        self.daemon_client = find_daemon(self.config_manager.config_dir)
+        self.daemon_check = None
+        self._daemon_job_id = None
+        self._daemon_timer = None
+        self._daemon_polling = False
+        if self.daemon_client is not None:
+            self.daemon_check = QCheckBox("Enviar pelo serviço em segundo plano (conexões já autenticadas)")
+            self.daemon_check.setChecked(True)
+
+    def send_via_daemon(self, recipients, subject, attachments, recipient_attachments, personalized_spec=None):
+        payload = {
+            'subject': subject,
+            'html': self.html_content,
+            'recipients': recipients,
+            'recipient_attachments': recipient_attachments or {},
+            'attachments': attachments,
+            # A lista já foi filtrada ao carregar; o serviço registra os resultados
+            'filter_suppressed': False,
+            # Envios de teste/pontuais não esperam atrás das campanhas na fila
+            'priority': PRIORITY_HIGH if len(recipients) <= HIGH_PRIORITY_MAX_RECIPIENTS else PRIORITY_BULK,
+        }
+        if personalized_spec:
+            # O serviço lê as colunas da planilha e renderiza as imagens na preparação
+            payload.update({'personalized_images': personalized_spec, 'recipients_file': self.excel_filepath})
+        # Chamadas HTTP fora da thread da interface: o diálogo não congela esperando o serviço
+        self._run_in_background(self.daemon_client.submit, (payload,), self._on_daemon_submitted, self._on_daemon_failed)
+
+    def _on_daemon_submitted(self, job):
+        self._daemon_job_id = job['id']
+        self._daemon_polling = False
+        self._daemon_timer = QTimer(self)
+        self._daemon_timer.timeout.connect(self._poll_daemon_job)
+        self._daemon_timer.start(500)
+
+    def _on_daemon_failed(self, error):
+        if self._daemon_timer is not None:
+            self._daemon_timer.stop()
+        QMessageBox.critical(self, "Erro no Envio", error)
+        self.send_button.setEnabled(True)
+        self.send_button.setText("Enviar Emails")
+
+    def _poll_daemon_job(self):
+        # Uma consulta por vez: com o serviço lento, os ticks seguintes são ignorados
+        if self._daemon_polling:
+            return
+        self._daemon_polling = True
+        self._run_in_background(self.daemon_client.job, (self._daemon_job_id,),
+                                self._on_daemon_job, self._on_daemon_failed)
+
+    def _on_daemon_job(self, job):
+        self._daemon_polling = False
+        if not self._daemon_timer.isActive():
+            return
+        if job['status'] == JOB_PREPARING:
+            self.send_button.setText("Preparando imagens e links...")
+            return
+        self.send_button.setText(f"Enviando... {job['sent'] + job['failed']} de {job['total']}")
+        if job['status'] not in FINISHED_STATUSES:
+            return
+        self._daemon_timer.stop()
+
+        if self.tabs.currentIndex() == 1 and self.excel_filepath and job['delivery_log']:
+            self.offer_status_export(job['delivery_log'])
+
+        if job['status'] == 'done':
+            QMessageBox.information(self, "Envio Concluído", job['message'])
+            self.accept()
+        else:
+            QMessageBox.critical(self, "Erro no Envio", job['message'])
+            self.send_button.setEnabled(True)
+            self.send_button.setText("Enviar Emails")
+
+    def confirm_body_size(self):
+        """Avisa quando o corpo passa do orçamento de tamanho configurado (html_size_budget_kb)."""
+        budget_kb = self.config_manager.load_settings().get('html_size_budget_kb', DEFAULT_BUDGET_KB)
+        within_budget, message = check_size_budget(self.html_content, budget_kb)
+        if within_budget:
+            return True
+        answer = QMessageBox.question(
+            self, "Email Acima do Tamanho", f"{message}\n\nDeseja enviar mesmo assim?"
+        )
+        return answer == QMessageBox.Yes
+
+    def offer_status_export(self, log_path):
+        """Oferece gravar o status de entrega de cada linha junto à planilha original."""
+        answer = QMessageBox.question(
+            self, "Status de Entrega",
+            "Deseja salvar a planilha com o status de entrega de cada destinatário?"
+        )
+        if answer != QMessageBox.Yes:
+            return
+        base, _ = os.path.splitext(self.excel_filepath)
+        output_path, _ = QFileDialog.getSaveFileName(
+            self, "Salvar Status de Entrega", f"{base}_status.xlsx",
+            "Planilha Excel (*.xlsx);;CSV (*.csv);;Parquet (*.parquet)"
+        )
+        if output_path:
+            ok, message = export_delivery_status(self.excel_filepath, log_path, output_path)
+            if ok:
+                QMessageBox.information(self, "Status de Entrega", message)
+            else:
+                QMessageBox.warning(self, "Status de Entrega", message)
+        
     def open_config_dialog(self):
         """Abre o diálogo de configurações de email"""
         from ui.dialogs.config_dialog import ConfigDialog
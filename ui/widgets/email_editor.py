@@ -8,6 +8,7 @@ from PySide6.QtWebEngineCore import QWebEnginePage
 from PySide6.QtWebEngineWidgets import QWebEngineView
 from PySide6.QtWebChannel import QWebChannel
 from core.resource_path import get_resource_path
+from core.asset_store import default_asset_store
 
 # Objeto ponte para comunicação entre Python e JavaScript
 class Bridge(QObject):
@@ -495,6 +496,12 @@ class EmailEditor(QWebEngineView):
         )
         
         if file_path:
+            # Guarda uma cópia no armazenamento de imagens: o projeto não depende do arquivo
+            # original e a mesma imagem usada em vários projetos ocupa o disco uma vez só
+            try:
+                _, file_path = default_asset_store().import_file(file_path)
+            except OSError as e:
+                print(f"Não foi possível copiar a imagem para o armazenamento: {e}")
             # Converte para URL local
             file_url = QUrl.fromLocalFile(file_path).toString()
             # Atualiza o componente com a nova imagem
@@ -206,6 +206,9 @@ class PropertiesPanel(QWidget):
         self.image_alt_edit.textChanged.connect(lambda t: self.emit_change("alt", t))
         self.upload_image_btn = QPushButton("Carregar Imagem do Computador")
         self.upload_image_btn.clicked.connect(self.request_image_upload)
+        # Marcador personalized:<nome>: no envio, cada destinatário recebe a sua imagem
+        self.personalized_image_btn = QPushButton("Usar Imagem Personalizada")
+        self.personalized_image_btn.clicked.connect(self.set_personalized_image)
         
         # Adicionar controles de tamanho para imagem
         self.image_size_group = QGroupBox("Tamanho da Imagem")
@@ -256,6 +259,7 @@ class PropertiesPanel(QWidget):
         self.image_layout.addRow(self.image_size_group)
         self.image_layout.addRow("Alinhamento:", self.image_align_layout)
         self.image_layout.addRow(self.upload_image_btn)
+        self.image_layout.addRow(self.personalized_image_btn)
         self.image_layout.addRow(self.image_bg_color_btn)
         self.stacked_widget.addWidget(self.image_props)
 
@@ -923,6 +927,22 @@ class PropertiesPanel(QWidget):
         if self.current_component_id:
             self.upload_image.emit(self.current_component_id)
             
+    def set_personalized_image(self):
+        """Troca a imagem pelo marcador de uma imagem da especificação de imagens personalizadas."""
+        from PySide6.QtWidgets import QInputDialog
+        from core.personalized_images import PLACEHOLDER_SCHEME
+        if not self.current_component_id:
+            return
+        current = self.image_src_edit.text()
+        name, ok = QInputDialog.getText(
+            self, "Imagem Personalizada",
+            "Nome da imagem na especificação (JSON) escolhida no envio:",
+            text=current[len(PLACEHOLDER_SCHEME):] if current.startswith(PLACEHOLDER_SCHEME) else ''
+        )
+        name = name.strip()
+        if ok and name:
+            self.image_src_edit.setText(PLACEHOLDER_SCHEME + name)
+
     def load_custom_font(self):
         from PySide6.QtWidgets import QFileDialog
         file_path, _ = QFileDialog.getOpenFileName(
@@ -0,0 +1,165 @@
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QListView, QLineEdit, QLabel, QPlainTextEdit
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QThread, QTimer, Signal
+
+# Espera depois da última tecla antes de filtrar a lista
+SEARCH_DEBOUNCE_MS = 250
+
+
+class RecipientListModel(QAbstractListModel):
+    """
+    Modelo de lista apoiado em uma lista Python simples.
+    A view só pede os itens visíveis, então milhões de endereços não criam
+    um objeto de item por linha como o QListWidget.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._emails = []
+        self._lowered = []
+        # Índices das linhas que passam no filtro; None quando não há filtro
+        self._rows = None
+        self._filter = ""
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._emails) if self._rows is None else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            row = index.row()
+            return self._emails[row if self._rows is None else self._rows[row]]
+        return None
+
+    def set_emails(self, emails):
+        self.beginResetModel()
+        self._emails = list(emails)
+        # Cópia em minúsculas feita uma vez, não a cada busca
+        self._lowered = [e.lower() for e in self._emails]
+        self._rows = None
+        self._apply_filter(self._filter)
+        self.endResetModel()
+
+    def clear(self):
+        self.set_emails([])
+
+    def emails(self):
+        """Retorna a lista completa (sem filtro de busca)."""
+        return self._emails
+
+    def set_filter(self, text):
+        needle = text.strip().lower()
+        if needle == self._filter:
+            return
+        self.beginResetModel()
+        self._apply_filter(needle)
+        self.endResetModel()
+
+    def _apply_filter(self, needle):
+        lowered = self._lowered
+        if not needle:
+            self._rows = None
+        elif self._rows is not None and self._filter and self._filter in needle:
+            # Busca refinada (mais letras digitadas): só as linhas que já passavam
+            self._rows = [i for i in self._rows if needle in lowered[i]]
+        else:
+            self._rows = [i for i, e in enumerate(lowered) if needle in e]
+        self._filter = needle
+
+    def total_count(self):
+        return len(self._emails)
+
+    def visible_count(self):
+        return len(self._emails) if self._rows is None else len(self._rows)
+
+
+class RecipientListView(QWidget):
+    """Lista virtualizada de destinatários com busca e contagem."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.model = RecipientListModel(self)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Buscar destinatário...")
+        self.search_edit.setClearButtonEnabled(True)
+        # Filtra só quando a digitação para, não a cada tecla
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self._search_timer.timeout.connect(self._on_search)
+        self.search_edit.textChanged.connect(lambda _text: self._search_timer.start())
+
+        self.list_view = QListView()
+        # Itens de mesma altura permitem à view calcular o layout sem medir cada linha
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setLayoutMode(QListView.Batched)
+        self.list_view.setModel(self.model)
+
+        self.count_label = QLabel()
+
+        header = QHBoxLayout()
+        header.addWidget(self.search_edit)
+        header.addWidget(self.count_label)
+        layout.addLayout(header)
+        layout.addWidget(self.list_view)
+        self._update_count()
+
+    def set_emails(self, emails):
+        self.model.set_emails(emails)
+        self._update_count()
+
+    def clear(self):
+        self.set_emails([])
+
+    def emails(self):
+        return self.model.emails()
+
+    def _on_search(self):
+        self.model.set_filter(self.search_edit.text())
+        self._update_count()
+
+    def _update_count(self):
+        total = self.model.total_count()
+        visible = self.model.visible_count()
+        if visible != total:
+            self.count_label.setText(f"{visible} de {total}")
+        else:
+            self.count_label.setText(f"{total} destinatários")
+
+
+class BackgroundTask(QThread):
+    """Executa uma função fora da thread da interface e emite o resultado."""
+    result_ready = Signal(object)
+    failed = Signal(str)
+
+    def __init__(self, func, *args, parent=None):
+        super().__init__(parent)
+        self._func = func
+        self._args = args
+
+    def run(self):
+        try:
+            self.result_ready.emit(self._func(*self._args))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class BulkPasteEdit(QPlainTextEdit):
+    """
+    Editor de texto que desvia colagens grandes para processamento em segundo plano,
+    em vez de inserir centenas de milhares de linhas no documento.
+    """
+    bulk_pasted = Signal(str)
+    BULK_PASTE_LINES = 1000
+
+    def insertFromMimeData(self, source):
+        if source.hasText():
+            text = source.text()
+            if text.count('\n') >= self.BULK_PASTE_LINES:
+                self.bulk_pasted.emit(text)
+                return
+        super().insertFromMimeData(source)